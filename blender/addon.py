@@ -1,10 +1,11 @@
 import bpy
 
 
-from .exporter import ExportAnmXfbin, menu_export
+from .export_operator import ExportAnmXfbin, ExportCollectionItem, menu_export, register_collection_cache, unregister_collection_cache
 
 
 classes = (
+    ExportCollectionItem,
     ExportAnmXfbin,
 )
 
@@ -14,10 +15,12 @@ def register():
         bpy.utils.register_class(c)
 
     bpy.types.TOPBAR_MT_file_export.append(menu_export)
+    register_collection_cache()
 
 
 def unregister():
     for c in classes:
         bpy.utils.unregister_class(c)
    
-    bpy.types.TOPBAR_MT_file_export.remove(menu_export)
\ No newline at end of file
+    bpy.types.TOPBAR_MT_file_export.remove(menu_export)
+    unregister_collection_cache()
\ No newline at end of file
@@ -0,0 +1,207 @@
+import numpy as np
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Plain data read from Blender on the main thread. Nothing in here may reference bpy or
+# xfbin_lib objects, so a snapshot can be encoded on a worker thread.
+
+# Frame -> values of one property, with None for channels that have no key on that frame
+FrameValues = Dict[int, List[Optional[float]]]
+
+# Frames sampled or converted at a time. Long animations are processed in blocks of this size,
+# so the temporary arrays stay the same size whatever the frame count.
+BLOCK_SIZE = 4096
+
+
+def iter_blocks(count: int, block_size: int = BLOCK_SIZE) -> Iterator[slice]:
+	"""Yield the slices that split count rows into blocks of at most block_size rows."""
+	for start in range(0, count, block_size):
+		yield slice(start, min(start + block_size, count))
+
+
+class ChannelArrays:
+	"""Keys of a property with several channels on a shared frame axis, NaN where a channel has no key."""
+
+	def __init__(self, frames: np.ndarray, values: np.ndarray):
+		# (N,) whole frames in ascending order and (N, channel count) values
+		self.frames = frames
+		self.values = values
+
+	@classmethod
+	def empty(cls, channel_count: int) -> 'ChannelArrays':
+		return cls(np.empty(0, dtype=np.int64), np.empty((0, channel_count)))
+
+	def __len__(self) -> int:
+		return len(self.frames)
+
+
+class CoordSnapshot:
+	"""Keyframes of one animated bone."""
+
+	def __init__(self, bone_name: str, rest_location: Tuple[float, ...], rest_rotation: Tuple[float, ...], rest_scale: Tuple[float, ...]):
+		self.bone_name = bone_name
+
+		# Edit bone transform relative to the parent, rotation is a wxyz quaternion
+		self.rest_location = rest_location
+		self.rest_rotation = rest_rotation
+		self.rest_scale = rest_scale
+
+		self.location: FrameValues = {}
+
+		# 'rotation_quaternion', 'rotation_euler' or None if the bone has no rotation curves
+		self.rotation_mode: Optional[str] = None
+		self.rotation: FrameValues = {}
+
+		self.scale: Optional[FrameValues] = None
+
+		# (frame, value) of each opacity keyframe
+		self.opacity: Optional[List[Tuple[float, float]]] = None
+
+		# Samples on every frame each track was read from, keyed by track index, before the keys are simplified,
+		# resampled or collapsed. Only filled when fidelity is measured.
+		self.references: Dict[int, ChannelArrays] = {}
+
+
+class MaterialSnapshot:
+	"""Tracks of one material, in the order they are written."""
+
+	def __init__(self, name: str):
+		self.name = name
+
+		# (track index, NuccAnmKeyFormat name, (N,) values of frames 0 to N - 1)
+		self.tracks: List[Tuple[int, str, np.ndarray]] = []
+
+		# Samples on every frame each track was read from, keyed by track index, before they are resampled.
+		# Only filled when fidelity is measured.
+		self.references: Dict[int, ChannelArrays] = {}
+
+
+class ArmatureSnapshot:
+	def __init__(self, name: str, chunk_path: str, bone_names: List[str], bone_parents: List[int], models: List[str], materials: List[str]):
+		self.name = name
+		self.chunk_path = chunk_path
+		self.bone_names = bone_names
+
+		# Index of each bone's parent in bone_names, -1 for root bones
+		self.bone_parents = bone_parents
+		self.models = models
+		self.materials = materials
+
+		self.coords: List[CoordSnapshot] = []
+		self.material_entries: List[MaterialSnapshot] = []
+
+
+class CameraSnapshot:
+	def __init__(self, name: str, path: str, other_index: int, fov: float, sensor_width: float):
+		self.name = name
+		self.path = path
+
+		# Index of the entry among the camera, light and ambient entries of the chunk
+		self.other_index = other_index
+		self.fov = fov
+		self.sensor_width = sensor_width
+
+		# False if the camera has no action and no evaluated motion, in which case it gets no entry
+		self.animated = False
+
+		self.translations = ChannelArrays.empty(3)
+		self.quaternions = ChannelArrays.empty(4)
+		self.eulers = ChannelArrays.empty(3)
+		self.lenses = ChannelArrays.empty(1)
+
+		# Samples on every frame each track was read from, keyed by track index, see CoordSnapshot
+		self.references: Dict[int, ChannelArrays] = {}
+
+
+class LightDircSnapshot:
+	def __init__(self, name: str, path: str, other_index: int, color: Tuple[float, ...], energy: float, rotation: Tuple[float, ...]):
+		self.name = name
+		self.path = path
+		self.other_index = other_index
+		self.color = color
+		self.energy = energy
+		self.rotation = rotation
+
+		self.animated = False
+		self.frame_end = 0
+
+		# Sampled on every frame up to frame_end, empty if the property is not animated
+		self.colors = ChannelArrays.empty(3)
+		self.energies = ChannelArrays.empty(1)
+		self.rotations_euler = ChannelArrays.empty(3)
+		self.rotations_quat = ChannelArrays.empty(4)
+
+		# Light data used for properties without animation
+		self.default_color: Tuple[float, ...] = (1.0, 1.0, 1.0)
+		self.default_energy = 0.0
+		self.default_euler: Tuple[float, ...] = (0.0, 0.0, 0.0)
+
+		# Samples on every frame each track was read from, keyed by track index, see CoordSnapshot
+		self.references: Dict[int, ChannelArrays] = {}
+
+
+class LightPointSnapshot:
+	def __init__(self, name: str, path: str, other_index: int, color: Tuple[float, ...], energy: float, location: Tuple[float, ...], radius: float, cutoff: float):
+		self.name = name
+		self.path = path
+		self.other_index = other_index
+		self.color = color
+		self.energy = energy
+		self.location = location
+		self.radius = radius
+		self.cutoff = cutoff
+
+		self.animated = False
+
+		self.colors = ChannelArrays.empty(3)
+		self.intensities = ChannelArrays.empty(1)
+		self.ranges = ChannelArrays.empty(1)
+		self.attenuations = ChannelArrays.empty(1)
+		self.locations = ChannelArrays.empty(3)
+
+		self.default_color: Tuple[float, ...] = (1.0, 1.0, 1.0)
+		self.default_energy = 0.0
+		self.default_location: Tuple[float, ...] = (0.0, 0.0, 0.0)
+		self.default_range = 0.0
+		self.default_attenuation = 0.0
+
+		# Samples on every frame each track was read from, keyed by track index, see CoordSnapshot
+		self.references: Dict[int, ChannelArrays] = {}
+
+
+class AmbientSnapshot:
+	def __init__(self, other_index: int, color: Tuple[float, ...]):
+		self.other_index = other_index
+		self.color = color
+
+		self.animated = False
+		self.frame_end = 0
+
+		self.colors = ChannelArrays.empty(3)
+
+		# Samples on every frame each track was read from, keyed by track index, see CoordSnapshot
+		self.references: Dict[int, ChannelArrays] = {}
+
+
+class FogSnapshot:
+	def __init__(self, frames: np.ndarray, rows: np.ndarray):
+		# (N,) frames and (N, 6) density, color r, g, b, start and end on each of them
+		self.frames = frames
+		self.rows = rows
+
+
+class ChunkSnapshot:
+	"""Everything needed to encode the page of one animation chunk."""
+
+	def __init__(self, name: str, path: str, is_looped: bool, frame_count: int):
+		self.name = name
+		self.path = path
+		self.is_looped = is_looped
+		self.frame_count = frame_count
+
+		self.armatures: List[ArmatureSnapshot] = []
+		self.cameras: List[CameraSnapshot] = []
+		self.lightdircs: List[LightDircSnapshot] = []
+		self.lightpoints: List[LightPointSnapshot] = []
+		self.ambient: Optional[AmbientSnapshot] = None
+		self.fog: Optional[FogSnapshot] = None
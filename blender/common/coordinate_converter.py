@@ -1,12 +1,10 @@
 import math
+import numpy as np
 
 from mathutils import  Quaternion, Euler, Vector
-from typing import Tuple, List, Any
-from bpy.types import Armature
+from typing import Callable, Tuple, List, Any, Optional, Sequence
 from mathutils import Matrix
 
-from ..common.armature_props import AnmArmature
-from ..common.bone_props import get_edit_matrix
 from ...xfbin.xfbin_lib import NuccAnmKeyFormat, NuccAnmKey, TrackHeader
 
 
@@ -183,4 +181,133 @@ def convert_light_values(data_path, values, key_format = None, frame = 0) -> Nuc
 		case _:
 			raise ValueError(f"Unsupported data path: {data_path}")
 
-	return values
\ No newline at end of file
+	return values
+
+# Batched conversion of camera and light keys. Each converter takes an (N, k) array of Blender values,
+# one row per key, and returns the encoded (N, m) array, which make_key turns into NuccAnmKey objects.
+def invert_quaternions(quaternions: np.ndarray) -> np.ndarray:
+	"""Invert (N, 4) wxyz quaternions and reorder them to xyzw."""
+	inverted = quaternions / np.sum(quaternions * quaternions, axis=1, keepdims=True)
+	return np.stack([-inverted[:, 1], -inverted[:, 2], -inverted[:, 3], inverted[:, 0]], axis=1)
+
+def eulers_to_quaternions(eulers: np.ndarray) -> np.ndarray:
+	"""Convert (N, 3) XYZ eulers in radians to (N, 4) wxyz quaternions, same as Euler.to_quaternion."""
+	cx, cy, cz = np.cos(eulers / 2).T
+	sx, sy, sz = np.sin(eulers / 2).T
+	return np.stack([
+		cx * cy * cz + sx * sy * sz,
+		sx * cy * cz - cx * sy * sz,
+		cx * sy * cz + sx * cy * sz,
+		cx * cy * sz - sx * sy * cz,
+	], axis=1)
+
+def quaternion_to_matrix(quaternion: Sequence[float]) -> np.ndarray:
+	"""Return the 3x3 rotation matrix of a wxyz quaternion."""
+	w, x, y, z = np.asarray(quaternion, dtype=np.float64) / np.linalg.norm(quaternion)
+	return np.array([
+		[1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+		[2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+		[2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)],
+	])
+
+def multiply_quaternions(quaternion: Sequence[float], quaternions: np.ndarray) -> np.ndarray:
+	"""Return quaternion @ quaternions[i] for (N, 4) wxyz quaternions."""
+	aw, ax, ay, az = quaternion
+	bw, bx, by, bz = quaternions.T
+	return np.stack([
+		aw * bw - ax * bx - ay * by - az * bz,
+		aw * bx + ax * bw + ay * bz - az * by,
+		aw * by - ax * bz + ay * bw + az * bx,
+		aw * bz + ax * by - ay * bx + az * bw,
+	], axis=1)
+
+
+# Takes the key frame in hundredths of a frame and the encoded values of one key
+KeyMaker = Callable[[int, List[Any]], NuccAnmKey]
+
+class KeyConverter:
+	def __init__(self, convert: Callable[..., np.ndarray], make_key: KeyMaker, quantize: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+		# convert returns the exact values in the units of the key format, quantize rounds them to what is stored
+		self.convert = convert
+		self.make_key = make_key
+		self.quantize = quantize
+
+	def encode(self, values: np.ndarray, **params) -> np.ndarray:
+		converted = self.convert(values, **params)
+		return self.quantize(converted) if self.quantize else converted
+
+
+_vec3 = lambda frame, value: NuccAnmKey.Vec3(tuple(value))
+_vec3_linear = lambda frame, value: NuccAnmKey.Vec3Linear(frame, tuple(value))
+_vec4_linear = lambda frame, value: NuccAnmKey.Vec4Linear(frame, tuple(value))
+_short_vec4 = lambda frame, value: NuccAnmKey.ShortVec4(tuple(value))
+_color = lambda frame, value: NuccAnmKey.Color(tuple(value))
+_float = lambda frame, value: NuccAnmKey.Float(value[0])
+_float_linear = lambda frame, value: NuccAnmKey.FloatLinear(frame, value[0])
+
+_translate = lambda values, **_: values * 100
+_to_color = lambda values, **_: values * 255
+_truncate = lambda values: values.astype(np.int64)
+_identity = lambda values, **_: values
+
+
+# (data_path, key_format) -> KeyConverter. Stored as a list because the key formats are compared by value.
+KEY_CONVERTERS: List[Tuple[str, NuccAnmKeyFormat, KeyConverter]] = []
+
+def register_key_converter(data_paths: List[str], key_formats: List[NuccAnmKeyFormat], convert: Callable[..., np.ndarray], make_key: KeyMaker,
+						   quantize: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+	for data_path in data_paths:
+		for key_format in key_formats:
+			KEY_CONVERTERS.append((data_path, key_format, KeyConverter(convert, make_key, quantize)))
+
+def get_key_converter(data_path: str, key_format: NuccAnmKeyFormat) -> KeyConverter:
+	converter = next((c for path, fmt, c in KEY_CONVERTERS if path == data_path and fmt == key_format), None)
+	if not converter:
+		raise ValueError(f"Unsupported data path: {data_path} with key format {key_format}")
+	return converter
+
+# Camera keys
+register_key_converter(['location'], [NuccAnmKeyFormat.Vector3Linear], _translate, _vec3_linear)
+register_key_converter(['rotation_quaternion'], [NuccAnmKeyFormat.QuaternionLinear],
+					   lambda values, **_: invert_quaternions(values), _vec4_linear)
+register_key_converter(['rotation_euler'], [NuccAnmKeyFormat.QuaternionLinear],
+					   lambda values, **_: invert_quaternions(eulers_to_quaternions(values)), _vec4_linear)
+register_key_converter(['fov'], [NuccAnmKeyFormat.FloatLinear],
+					   lambda values, sensor_width, **_: np.degrees(2 * np.arctan((0.5 * sensor_width) / values)), _float_linear)
+
+# Light and ambient keys
+register_key_converter(['location'], [NuccAnmKeyFormat.Vector3Fixed, NuccAnmKeyFormat.Vector3Table], _translate, _vec3)
+register_key_converter(['rotation_quaternion'], [NuccAnmKeyFormat.QuaternionShortTable],
+					   lambda values, **_: invert_quaternions(values) * QUAT_COMPRESS, _short_vec4, _truncate)
+register_key_converter(['rotation_euler'], [NuccAnmKeyFormat.QuaternionShortTable],
+					   lambda values, **_: invert_quaternions(eulers_to_quaternions(values)) * QUAT_COMPRESS, _short_vec4, _truncate)
+register_key_converter(['xfbin_scene.lightdir_color', 'xfbin_scene.lightpoint_color0', 'xfbin_scene.ambient_color'],
+					   [NuccAnmKeyFormat.ColorRGBTable], _to_color, _color, _truncate)
+register_key_converter(['xfbin_scene.lightdir_intensity', 'xfbin_scene.lightpoint_intensity0'],
+					   [NuccAnmKeyFormat.FloatLinear, NuccAnmKeyFormat.FloatTable, NuccAnmKeyFormat.FloatFixed], _identity, _float)
+register_key_converter(['xfbin_scene.lightpoint_range0'],
+					   [NuccAnmKeyFormat.FloatLinear, NuccAnmKeyFormat.FloatTable, NuccAnmKeyFormat.FloatFixed],
+					   lambda values, **_: np.round(values) * 100, _float)
+register_key_converter(['xfbin_scene.lightpoint_attenuation0'],
+					   [NuccAnmKeyFormat.FloatLinear, NuccAnmKeyFormat.FloatTable, NuccAnmKeyFormat.FloatFixed],
+					   lambda values, **_: np.round(values), _float)
+register_key_converter(['xfbin_scene.ambient_intensity'], [NuccAnmKeyFormat.FloatTable], _identity, _float)
+register_key_converter(['xfbin_scene.lightdir_rotation'], [NuccAnmKeyFormat.EulerXYZFixed], lambda values, **_: np.radians(values), _vec3)
+
+# Bone keys, relative to the rest transform of the bone
+register_key_converter(['pose.bones.location'], [NuccAnmKeyFormat.Vector3Linear],
+					   lambda values, rest_location, rest_rotation, **_: (rest_location + values @ quaternion_to_matrix(rest_rotation).T) * 100, _vec3_linear)
+register_key_converter(['pose.bones.location'], [NuccAnmKeyFormat.Vector3Fixed],
+					   lambda values, rest_location, rest_rotation, **_: (rest_location + values @ quaternion_to_matrix(rest_rotation).T) * 100, _vec3)
+register_key_converter(['pose.bones.rotation_quaternion'], [NuccAnmKeyFormat.QuaternionLinear],
+					   lambda values, rest_rotation, **_: invert_quaternions(multiply_quaternions(rest_rotation, values)), _vec4_linear)
+register_key_converter(['pose.bones.rotation_euler'], [NuccAnmKeyFormat.EulerXYZFixed],
+					   lambda values, **_: np.degrees(values), _vec3)
+register_key_converter(['pose.bones.scale'], [NuccAnmKeyFormat.Vector3Linear],
+					   lambda values, rest_scale, **_: values * rest_scale, _vec3_linear)
+register_key_converter(['pose.bones.scale'], [NuccAnmKeyFormat.Vector3Fixed],
+					   lambda values, rest_scale, **_: values * rest_scale, _vec3)
+register_key_converter(['opacity'], [NuccAnmKeyFormat.FloatLinear], _identity, _float_linear)
+
+# Material keys
+register_key_converter(['material'], [NuccAnmKeyFormat.FloatTable, NuccAnmKeyFormat.FloatFixed], _identity, _float)
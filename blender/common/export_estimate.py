@@ -0,0 +1,129 @@
+from typing import Dict, List
+
+from .export_stats import ENTRY_HEADER_SIZE, estimate_track_bytes
+
+
+# Approximate seconds per operation of a full export, tune them to match the timings of real exports
+COST_MODEL: Dict[str, float] = {
+	# Reading one keyframe of a bone or camera F-Curve
+	'keyframe_read': 4e-6,
+	# One fcurve.evaluate call of a sampled material or light curve
+	'curve_sample': 2e-6,
+	# One scene.frame_set and depsgraph evaluation while baking bones or cameras
+	'frame_evaluation': 4e-3,
+	# Converting and encoding one key
+	'key_encode': 1.5e-6,
+	# Writing one byte of the XFBIN
+	'byte_write': 5e-9,
+}
+
+# A sampled curve covering this many times the chunk's frame count is flagged as a runaway range
+OUTLIER_RANGE_FACTOR = 4
+
+# A chunk predicted this many times larger than the median chunk is flagged
+OUTLIER_SIZE_FACTOR = 4
+
+
+class ChunkEstimate:
+	"""Predicted work and output of one animation chunk, counted without reading any key values."""
+
+	def __init__(self, name: str, frame_count: int):
+		self.name = name
+		self.frame_count = frame_count
+
+		# What was found in the scene: fcurves, keyframes, bones, materials, cameras, lights...
+		self.counts: Dict[str, int] = {}
+
+		# Number of each COST_MODEL operation
+		self.operations: Dict[str, int] = dict.fromkeys(COST_MODEL, 0)
+
+		self.keys = 0
+		self.bytes = 0
+		self.warnings: List[str] = []
+
+	def count(self, name: str, amount: int = 1):
+		self.counts[name] = self.counts.get(name, 0) + amount
+
+	def add_entry(self):
+		self.count('entries')
+		self.bytes += ENTRY_HEADER_SIZE
+
+	def add_track(self, key_format: str, key_count: int):
+		self.count('tracks')
+		self.keys += key_count
+		self.bytes += estimate_track_bytes(key_format, key_count)
+		self.operations['key_encode'] += key_count
+
+	def add_sampled_range(self, owner: str, frame_count: int):
+		"""
+		Count a curve sampled on frame_count frames, flagging it if it runs far past the chunk.
+		"""
+		self.count('sampled_frames', frame_count)
+		self.operations['curve_sample'] += frame_count
+
+		if self.frame_count > 0 and frame_count > OUTLIER_RANGE_FACTOR * self.frame_count:
+			self.warnings.append(f'{self.name}: {owner} is sampled on {frame_count} frames, '
+								 f'{frame_count / self.frame_count:.0f}x the chunk length of {self.frame_count}')
+
+	@property
+	def seconds(self) -> float:
+		operations = {**self.operations, 'byte_write': self.bytes}
+		return sum(COST_MODEL[operation] * amount for operation, amount in operations.items())
+
+	def to_dict(self) -> dict:
+		return {
+			'name': self.name,
+			'frame_count': self.frame_count,
+			'counts': self.counts,
+			'operations': self.operations,
+			'keys': self.keys,
+			'bytes': self.bytes,
+			'seconds': self.seconds,
+			'warnings': self.warnings,
+		}
+
+
+class ExportEstimate:
+	def __init__(self, chunks: List[ChunkEstimate]):
+		self.chunks = chunks
+
+		sizes = sorted(chunk.bytes for chunk in chunks)
+		if len(sizes) >= 3:
+			median = sizes[len(sizes) // 2]
+			for chunk in chunks:
+				if median and chunk.bytes > OUTLIER_SIZE_FACTOR * median:
+					chunk.warnings.append(f'{chunk.name}: predicted {chunk.bytes} bytes, {chunk.bytes / median:.0f}x the median chunk')
+
+	@property
+	def keys(self) -> int:
+		return sum(chunk.keys for chunk in self.chunks)
+
+	@property
+	def bytes(self) -> int:
+		return sum(chunk.bytes for chunk in self.chunks)
+
+	@property
+	def seconds(self) -> float:
+		return sum(chunk.seconds for chunk in self.chunks)
+
+	@property
+	def warnings(self) -> List[str]:
+		return [warning for chunk in self.chunks for warning in chunk.warnings]
+
+	def to_dict(self) -> dict:
+		return {
+			'keys': self.keys,
+			'bytes': self.bytes,
+			'seconds': self.seconds,
+			'cost_model': COST_MODEL,
+			'chunks': [chunk.to_dict() for chunk in self.chunks],
+		}
+
+	def summary(self) -> List[str]:
+		lines = [f'Predicted {self.keys} keys, ~{self.bytes} bytes, ~{self.seconds:.1f}s for {len(self.chunks)} chunks']
+
+		for chunk in sorted(self.chunks, key=lambda chunk: chunk.seconds, reverse=True):
+			counts = ', '.join(f'{count} {name}' for name, count in chunk.counts.items())
+			lines.append(f'    {chunk.name}: {chunk.keys} keys, ~{chunk.bytes} bytes, ~{chunk.seconds:.1f}s ({counts})')
+
+		return lines
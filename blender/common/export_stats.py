@@ -0,0 +1,160 @@
+import json
+
+from typing import Dict, List, Optional
+
+
+# Encoded size in bytes of one key of each NuccAnmKeyFormat. Linear keys start with an i32 frame.
+KEY_SIZES: Dict[str, int] = {
+	'Vector3Fixed': 12,
+	'Vector3Linear': 16,
+	'Vector3Table': 12,
+	'EulerXYZFixed': 12,
+	'EulerInterpolated': 12,
+	'QuaternionLinear': 20,
+	'QuaternionShortTable': 8,
+	'FloatFixed': 4,
+	'FloatLinear': 8,
+	'FloatTable': 4,
+	'ColorRGBTable': 3,
+}
+
+# clump index, coord index, entry format and track count
+ENTRY_HEADER_SIZE = 8
+
+# track index, key format, frame count and padding
+TRACK_HEADER_SIZE = 8
+
+
+def format_name(value) -> str:
+	"""Return the member name of a NuccAnmKeyFormat or EntryFormat value."""
+	return str(value).split('.')[-1]
+
+
+def estimate_track_bytes(key_format: str, key_count: int) -> int:
+	"""
+	Return the estimated encoded size of a track, keys are padded to 4 bytes. Unknown formats count as 4 bytes per key.
+	"""
+	size = KEY_SIZES.get(key_format, 4) * key_count
+	return TRACK_HEADER_SIZE + (size + 3) // 4 * 4
+
+
+class TrackStats:
+	def __init__(self, track_index: int, key_format: str, key_count: int):
+		self.track_index = track_index
+		self.key_format = key_format
+		self.key_count = key_count
+		self.bytes = estimate_track_bytes(key_format, key_count)
+
+	def to_dict(self) -> dict:
+		return {
+			'track_index': self.track_index,
+			'key_format': self.key_format,
+			'key_count': self.key_count,
+			'bytes': self.bytes,
+		}
+
+
+class EntryStats:
+	"""Tracks of one exported entry, clump is the armature of coord and material entries."""
+
+	def __init__(self, name: str, entry_format: str, clump: Optional[str], tracks: List[TrackStats]):
+		self.name = name
+		self.entry_format = entry_format
+		self.clump = clump
+		self.tracks = tracks
+
+	@property
+	def key_count(self) -> int:
+		return sum(track.key_count for track in self.tracks)
+
+	@property
+	def bytes(self) -> int:
+		return ENTRY_HEADER_SIZE + sum(track.bytes for track in self.tracks)
+
+	def to_dict(self) -> dict:
+		return {
+			'name': self.name,
+			'entry_format': self.entry_format,
+			'clump': self.clump,
+			'track_count': len(self.tracks),
+			'key_count': self.key_count,
+			'bytes': self.bytes,
+			'tracks': [track.to_dict() for track in self.tracks],
+		}
+
+
+def sum_entries(entries: List[EntryStats]) -> dict:
+	return {
+		'entries': len(entries),
+		'tracks': sum(len(entry.tracks) for entry in entries),
+		'keys': sum(entry.key_count for entry in entries),
+		'bytes': sum(entry.bytes for entry in entries),
+	}
+
+
+def group_entries(entries: List[EntryStats], key) -> Dict[str, dict]:
+	groups: Dict[str, List[EntryStats]] = {}
+	for entry in entries:
+		groups.setdefault(key(entry), []).append(entry)
+
+	return {name: sum_entries(group) for name, group in sorted(groups.items(), key=lambda item: -sum_entries(item[1])['bytes'])}
+
+
+class PageStats:
+	"""Entries written to the animation of one page."""
+
+	def __init__(self, name: str, frame_count: int):
+		self.name = name
+		self.frame_count = frame_count
+		self.entries: List[EntryStats] = []
+
+	def to_dict(self) -> dict:
+		clump_entries = [entry for entry in self.entries if entry.clump is not None]
+
+		return {
+			'name': self.name,
+			'frame_count': self.frame_count,
+			'totals': sum_entries(self.entries),
+			'by_entry_format': group_entries(self.entries, lambda entry: entry.entry_format),
+			'by_clump': group_entries(clump_entries, lambda entry: entry.clump),
+			'entries': [entry.to_dict() for entry in self.entries],
+		}
+
+
+class ExportStats:
+	def __init__(self, pages: List[PageStats]):
+		self.pages = pages
+
+	def to_dict(self) -> dict:
+		entries = [entry for page in self.pages for entry in page.entries]
+
+		return {
+			'totals': sum_entries(entries),
+			'pages': [page.to_dict() for page in self.pages],
+		}
+
+	def write_json(self, json_path: str):
+		with open(json_path, 'w') as f:
+			json.dump(self.to_dict(), f, indent=2)
+
+	def summary(self, top: int = 5) -> List[str]:
+		"""
+		Return one line per page with its totals, followed by its largest entry formats, clumps and entries.
+		"""
+		lines = []
+
+		for page in self.pages:
+			totals = sum_entries(page.entries)
+			lines.append(f'{page.name}: {totals["entries"]} entries, {totals["tracks"]} tracks, '
+						 f'{totals["keys"]} keys, ~{totals["bytes"]} bytes')
+
+			page_dict = page.to_dict()
+			for title, label in (('by_entry_format', 'format'), ('by_clump', 'clump')):
+				for name, group in list(page_dict[title].items())[:top]:
+					lines.append(f'    {label} {name}: {group["entries"]} entries, {group["keys"]} keys, ~{group["bytes"]} bytes')
+
+			for entry in sorted(page.entries, key=lambda entry: entry.bytes, reverse=True)[:top]:
+				tracks = ', '.join(f'{track.track_index}:{track.key_format}x{track.key_count}' for track in entry.tracks)
+				lines.append(f'    {entry.entry_format} {entry.name}: ~{entry.bytes} bytes ({tracks})')
+
+		return lines
@@ -0,0 +1,180 @@
+import numpy as np
+
+from bpy.types import FCurve
+from typing import Dict, Iterable, Sequence, Tuple
+
+from .anm_snapshot import ChannelArrays, iter_blocks
+
+
+def keyframe_arrays(fcurve: FCurve) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Return the frames and values of the keyframe points of fcurve, read with a single foreach_get.
+	"""
+	co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float64)
+	fcurve.keyframe_points.foreach_get('co', co)
+	return co[0::2], co[1::2]
+
+
+def channel_arrays(fcurves: Dict[int, FCurve], channel_count: int) -> ChannelArrays:
+	"""
+	Put the keys of the channels of one property on a shared, sorted frame axis.
+	Keys are snapped to whole frames, channels without a key on a frame are left as NaN.
+	"""
+	keys = {index: keyframe_arrays(fcurve) for index, fcurve in fcurves.items() if index < channel_count}
+	if not keys:
+		return ChannelArrays.empty(channel_count)
+
+	channel_frames = {index: frames.astype(np.int64) for index, (frames, _) in keys.items()}
+	frames = np.unique(np.concatenate(list(channel_frames.values())))
+
+	values = np.full((len(frames), channel_count), np.nan)
+	for index, (_, channel_values) in keys.items():
+		values[np.searchsorted(frames, channel_frames[index]), index] = channel_values
+
+	return ChannelArrays(frames, values)
+
+
+# Bisection steps used to invert the x(t) of a Bezier segment, enough for float precision
+BEZIER_SOLVE_STEPS = 32
+
+
+def _can_sample(fcurve: FCurve) -> bool:
+	"""
+	Return True if sample_fcurve can reproduce fcurve.evaluate exactly.
+	Easing interpolations, modifiers and linear extrapolation fall back to fcurve.evaluate.
+	"""
+	if len(fcurve.keyframe_points) == 0 or len(fcurve.modifiers) or fcurve.extrapolation != 'CONSTANT':
+		return False
+
+	return all(kp.interpolation in ('CONSTANT', 'LINEAR', 'BEZIER') for kp in fcurve.keyframe_points)
+
+
+def _bezier(p0: np.ndarray, p1: np.ndarray, p2: np.ndarray, p3: np.ndarray, t: np.ndarray) -> np.ndarray:
+	u = 1 - t
+	return u * u * u * p0 + 3 * u * u * t * p1 + 3 * u * t * t * p2 + t * t * t * p3
+
+
+def sample_fcurve(fcurve: FCurve, frames: np.ndarray) -> np.ndarray:
+	"""
+	Evaluate fcurve on all frames at once from its keyframe arrays.
+	"""
+	frames = np.asarray(frames, dtype=np.float64)
+
+	if not _can_sample(fcurve):
+		return np.array([fcurve.evaluate(frame) for frame in frames.tolist()], dtype=np.float64)
+
+	points = fcurve.keyframe_points
+	count = len(points)
+
+	co = np.empty(count * 2)
+	left = np.empty(count * 2)
+	right = np.empty(count * 2)
+	points.foreach_get('co', co)
+	points.foreach_get('handle_left', left)
+	points.foreach_get('handle_right', right)
+	co, left, right = co.reshape(-1, 2), left.reshape(-1, 2), right.reshape(-1, 2)
+
+	interpolation = np.array([kp.interpolation for kp in points])
+
+	values = np.empty(len(frames))
+
+	# Constant extrapolation before the first and after the last key
+	before, after = frames <= co[0, 0], frames >= co[-1, 0]
+	values[before] = co[0, 1]
+	values[after] = co[-1, 1]
+
+	inside = ~(before | after)
+	if not inside.any():
+		return values
+
+	x = frames[inside]
+	segment = np.searchsorted(co[:, 0], x, side='right') - 1
+	start, end = co[segment], co[segment + 1]
+	mode = interpolation[segment]
+
+	result = np.where(mode == 'CONSTANT', start[:, 1], 0.0)
+
+	linear = mode == 'LINEAR'
+	t = (x[linear] - start[linear, 0]) / (end[linear, 0] - start[linear, 0])
+	result[linear] = start[linear, 1] + t * (end[linear, 1] - start[linear, 1])
+
+	bezier = mode == 'BEZIER'
+	if bezier.any():
+		p0, p3 = start[bezier], end[bezier]
+		p1, p2 = right[segment[bezier]] - p0, left[segment[bezier] + 1] - p3
+
+		# Shorten handles that overlap in x, the same way Blender keeps the curve a function of x
+		span = p3[:, 0] - p0[:, 0]
+		length = np.abs(p1[:, 0]) + np.abs(p2[:, 0])
+		scale = np.where(length > span, span / np.where(length > 0, length, 1), 1)[:, None]
+		p1, p2 = p0 + p1 * scale, p3 + p2 * scale
+
+		target = x[bezier]
+		lo, hi = np.zeros(len(target)), np.ones(len(target))
+		for _ in range(BEZIER_SOLVE_STEPS):
+			mid = (lo + hi) / 2
+			below = _bezier(p0[:, 0], p1[:, 0], p2[:, 0], p3[:, 0], mid) < target
+			lo, hi = np.where(below, mid, lo), np.where(below, hi, mid)
+
+		result[bezier] = _bezier(p0[:, 1], p1[:, 1], p2[:, 1], p3[:, 1], (lo + hi) / 2)
+
+	values[inside] = result
+	return values
+
+
+def group_fcurves(fcurves: Iterable[FCurve], paths: Sequence[str]) -> Dict[str, Dict[int, FCurve]]:
+	"""
+	Return the F-Curves whose data path ends with one of paths, keyed by path and array index.
+	Later F-Curves replace earlier ones on the same channel.
+	"""
+	groups: Dict[str, Dict[int, FCurve]] = {path: {} for path in paths}
+
+	for fcurve in fcurves:
+		for path in paths:
+			if fcurve.data_path.endswith(path):
+				groups[path][fcurve.array_index] = fcurve
+				break
+
+	return groups
+
+
+def sample_channels(fcurves: Dict[int, FCurve], channel_count: int, frames: np.ndarray) -> ChannelArrays:
+	"""
+	Sample the channels of one property on frames into a single (N, channel count) array, one block of frames at a time.
+	Channels without an F-Curve are left as NaN, a property without any F-Curve has no keys.
+	"""
+	fcurves = {index: fcurve for index, fcurve in fcurves.items() if index < channel_count}
+	if not fcurves:
+		return ChannelArrays.empty(channel_count)
+
+	frames = np.asarray(frames, dtype=np.int64)
+	values = np.full((len(frames), channel_count), np.nan)
+
+	for block in iter_blocks(len(frames)):
+		for index, fcurve in fcurves.items():
+			values[block, index] = sample_fcurve(fcurve, frames[block])
+
+	return ChannelArrays(frames, values)
+
+
+def sample_table(fcurve: FCurve, frame_start: int, frame_end: int) -> np.ndarray:
+	"""Sample fcurve on every frame from frame_start to frame_end, one block of frames at a time."""
+	frames = np.arange(frame_start, frame_end + 1)
+	values = np.empty(len(frames))
+
+	for block in iter_blocks(len(frames)):
+		values[block] = sample_fcurve(fcurve, frames[block])
+
+	return values
+
+
+def sample_reference(fcurves: Dict[int, FCurve], default_values: Sequence[float], frames: np.ndarray) -> ChannelArrays:
+	"""
+	Sample the channels of one property on frames, with default_values for the channels without an F-Curve.
+	Used as the reference fidelity is measured against, a property without any F-Curve has no samples.
+	"""
+	channels = sample_channels(fcurves, len(default_values), frames)
+	if not len(channels):
+		return channels
+
+	return ChannelArrays(channels.frames, np.where(np.isnan(channels.values), np.asarray(default_values, dtype=np.float64), channels.values))
@@ -0,0 +1,182 @@
+import json
+import numpy as np
+
+from typing import Dict, List, Optional
+
+from ...xfbin.xfbin_lib import NuccAnmKeyFormat
+from .coordinate_converter import QUAT_COMPRESS, get_key_converter
+from .export_stats import format_name
+from .resampler import interpolate_linear, normalize_rows
+
+
+# Encoded units per unit of the quantized key formats. Errors are reported in the unscaled units.
+FORMAT_SCALES: Dict[str, float] = {
+	'QuaternionShortTable': QUAT_COMPRESS,
+	'ColorRGBTable': 255,
+}
+
+LINEAR_FORMATS = ('Vector3Linear', 'QuaternionLinear', 'FloatLinear')
+
+QUATERNION_FORMATS = ('QuaternionLinear', 'QuaternionShortTable')
+
+# Largest error allowed per key format, in the units errors are reported in
+DEFAULT_TOLERANCE = 1e-3
+TOLERANCES: Dict[str, float] = {
+	# Truncating to 8 and 16 bits loses up to one step
+	'ColorRGBTable': 1 / 255,
+	'QuaternionShortTable': 2 / QUAT_COMPRESS,
+}
+
+# Frames kept per track in the report
+WORST_FRAMES = 5
+
+
+def reconstruct_track(key_format: str, key_frames: np.ndarray, values: np.ndarray, frames: np.ndarray) -> np.ndarray:
+	"""
+	Return the (len(frames), m) values the game reads from a track on frames, in the units of the errors.
+	key_frames are in hundredths of a frame as stored in the track, frames are whole or fractional frames.
+	"""
+	frames = np.asarray(frames, dtype=np.float64)
+	values = np.asarray(values, dtype=np.float64) / FORMAT_SCALES.get(key_format, 1)
+
+	if key_format in LINEAR_FORMATS:
+		# The null key closing the track is not played
+		played = np.asarray(key_frames) >= 0
+		result = interpolate_linear(np.asarray(key_frames)[played] / 100, values[played], frames, key_format in QUATERNION_FORMATS)
+
+	elif key_format.endswith('Fixed'):
+		result = np.repeat(values[:1], len(frames), axis=0)
+
+	else:
+		# Table keys are played one per frame from frame 0, the last one holds
+		result = values[np.clip(np.rint(frames).astype(np.int64), 0, len(values) - 1)]
+
+	if key_format == 'QuaternionShortTable':
+		result = normalize_rows(result)
+
+	return result
+
+
+def track_errors(key_format: str, reference: np.ndarray, reconstructed: np.ndarray) -> np.ndarray:
+	"""
+	Return the absolute (N, m) difference of two arrays in the units of the errors. q and -q are the same rotation.
+	"""
+	reference = np.asarray(reference, dtype=np.float64) / FORMAT_SCALES.get(key_format, 1)
+
+	if key_format in QUATERNION_FORMATS:
+		reference = normalize_rows(reference)
+		reconstructed = np.where(np.sum(reference * reconstructed, axis=1, keepdims=True) < 0, -reconstructed, reconstructed)
+
+	return np.abs(reconstructed - reference)
+
+
+class TrackSource:
+	"""The values a track was read from on every frame, before its keys were simplified, resampled or collapsed."""
+
+	def __init__(self, data_path: str, frames: np.ndarray, values: np.ndarray, params: dict):
+		self.data_path = data_path
+		self.frames = frames
+		self.values = values
+		self.params = params
+
+
+class TrackFidelity:
+	"""Difference between the source values of one track and what the game reconstructs from it."""
+
+	def __init__(self, name: str, clump: Optional[str], track_index: int, data_path: str, key_format: str, frames: np.ndarray, errors: np.ndarray):
+		self.name = name
+		self.clump = clump
+		self.track_index = track_index
+		self.data_path = data_path
+		self.key_format = key_format
+
+		# Per channel
+		self.max_error = errors.max(axis=0) if len(errors) else np.zeros(errors.shape[1])
+		self.rms_error = np.sqrt(np.mean(errors * errors, axis=0)) if len(errors) else np.zeros(errors.shape[1])
+
+		frame_errors = errors.max(axis=1)
+		worst = np.argsort(frame_errors)[::-1][:WORST_FRAMES]
+		self.worst_frames = [(float(frames[i]), float(frame_errors[i])) for i in worst if frame_errors[i] > 0]
+
+	@property
+	def error(self) -> float:
+		return float(self.max_error.max(initial=0))
+
+	@property
+	def tolerance(self) -> float:
+		return TOLERANCES.get(self.key_format, DEFAULT_TOLERANCE)
+
+	def to_dict(self) -> dict:
+		return {
+			'name': self.name,
+			'clump': self.clump,
+			'track_index': self.track_index,
+			'data_path': self.data_path,
+			'key_format': self.key_format,
+			'max_error': self.max_error.tolist(),
+			'rms_error': self.rms_error.tolist(),
+			'worst_frames': [{'frame': frame, 'error': error} for frame, error in self.worst_frames],
+			'tolerance': self.tolerance,
+		}
+
+
+def measure_track(name: str, clump: Optional[str], track_index: int, key_format: NuccAnmKeyFormat, key_frames: np.ndarray, values: np.ndarray,
+				  source: TrackSource) -> TrackFidelity:
+	"""
+	Compare a track, given as its stored key frames and encoded values, to the values it was read from.
+	The source is converted without quantization and compared on each of its frames, so the error includes
+	everything between the scene and the game: simplification, resampling, collapsing and quantization.
+	"""
+	reference = get_key_converter(source.data_path, key_format).convert(source.values, **source.params)
+
+	format_str = format_name(key_format)
+	reconstructed = reconstruct_track(format_str, key_frames, values, source.frames)
+	errors = track_errors(format_str, reference, reconstructed)
+
+	return TrackFidelity(name, clump, track_index, source.data_path, format_str, source.frames, errors)
+
+
+class FidelityReport:
+	"""Errors of every measured track of an export, grouped by page."""
+
+	def __init__(self):
+		self.pages: Dict[str, List[TrackFidelity]] = {}
+
+	@property
+	def tracks(self) -> List[TrackFidelity]:
+		return [track for tracks in self.pages.values() for track in tracks]
+
+	def failures(self) -> List[TrackFidelity]:
+		return [track for track in self.tracks if track.error > track.tolerance]
+
+	@property
+	def passed(self) -> bool:
+		return not self.failures()
+
+	def to_dict(self) -> dict:
+		return {
+			'passed': self.passed,
+			'max_error': max((track.error for track in self.tracks), default=0),
+			'failures': len(self.failures()),
+			'pages': {name: [track.to_dict() for track in tracks] for name, tracks in self.pages.items()},
+		}
+
+	def write_json(self, json_path: str):
+		with open(json_path, 'w') as f:
+			json.dump(self.to_dict(), f, indent=2)
+
+	def summary(self, top: int = 5) -> List[str]:
+		"""
+		Return the number of tracks over their tolerance followed by the tracks with the largest errors.
+		"""
+		tracks = self.tracks
+		failures = self.failures()
+		lines = [f'{len(tracks)} tracks measured, {len(failures)} over tolerance']
+
+		for track in sorted(tracks, key=lambda track: track.error / track.tolerance, reverse=True)[:top]:
+			frames = ', '.join(f'{frame:g}' for frame, _ in track.worst_frames)
+			owner = f'{track.clump} {track.name}' if track.clump else track.name
+			lines.append(f'    {owner} {track.data_path} ({track.key_format}): max {track.error:.3g}, '
+						 f'rms {float(track.rms_error.max(initial=0)):.3g}, worst frames {frames or "none"}')
+
+		return lines
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import tracemalloc
+
+from time import perf_counter
+from typing import List, Optional
+
+
+# Frames kept per allocation, enough to tell the exporter stages apart
+TRACEBACK_FRAMES = 8
+
+# Allocation sites kept per stage
+TOP_SITES = 10
+
+
+def process_rss() -> Optional[int]:
+	"""
+	Return the resident set size of this process in bytes, or None if it cannot be read on this platform.
+	"""
+	try:
+		import psutil
+		return psutil.Process().memory_info().rss
+	except ImportError:
+		pass
+
+	if sys.platform.startswith('linux'):
+		with open('/proc/self/statm') as f:
+			return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+	if sys.platform == 'win32':
+		import ctypes
+		from ctypes import wintypes
+
+		class ProcessMemoryCounters(ctypes.Structure):
+			_fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+						('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+						('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+						('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+						('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+		counters = ProcessMemoryCounters()
+		counters.cb = ctypes.sizeof(counters)
+		process = ctypes.windll.kernel32.GetCurrentProcess()
+		if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+			return counters.WorkingSetSize
+
+	return None
+
+
+def format_bytes(size: Optional[int]) -> str:
+	if size is None:
+		return 'n/a'
+
+	for unit in ('B', 'KiB', 'MiB'):
+		if abs(size) < 1024:
+			return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+		size /= 1024
+	return f'{size:.2f} GiB'
+
+
+class StageMemory:
+	"""Memory use of one export stage, from the end of the previous stage to the end of this one."""
+
+	def __init__(self, name: str, peak: int, retained: int, rss: Optional[int], rss_delta: Optional[int], elapsed: float, top_sites: List[dict]):
+		self.name = name
+
+		# Highest traced Python memory during the stage, relative to the start of the export
+		self.peak = peak
+
+		# Traced memory still alive at the end of the stage minus what was alive at its start
+		self.retained = retained
+
+		self.rss = rss
+		self.rss_delta = rss_delta
+		self.elapsed = elapsed
+		self.top_sites = top_sites
+
+	def to_dict(self) -> dict:
+		return {
+			'name': self.name,
+			'peak_bytes': self.peak,
+			'retained_bytes': self.retained,
+			'rss_bytes': self.rss,
+			'rss_delta_bytes': self.rss_delta,
+			'seconds': self.elapsed,
+			'top_sites': self.top_sites,
+		}
+
+
+class StageMemoryProfiler:
+	"""
+	Records tracemalloc and process RSS at the stage boundaries of an export.
+	Call start before the first stage, stage at the end of each stage, then finish.
+	"""
+
+	def __init__(self, metadata: dict):
+		self.metadata = metadata
+		self.stages: List[StageMemory] = []
+
+		self.started_tracing = False
+		self.baseline = 0
+		self.current = 0
+		self.snapshot: Optional[tracemalloc.Snapshot] = None
+		self.rss: Optional[int] = None
+		self.time = 0.0
+
+	def start(self):
+		# Another tool may already be tracing, only stop tracing in finish if it was started here
+		if not tracemalloc.is_tracing():
+			tracemalloc.start(TRACEBACK_FRAMES)
+			self.started_tracing = True
+
+		self.baseline = self.current = tracemalloc.get_traced_memory()[0]
+		self.snapshot = self.take_snapshot()
+		self.rss = process_rss()
+		self.time = perf_counter()
+		tracemalloc.reset_peak()
+
+	def take_snapshot(self) -> tracemalloc.Snapshot:
+		# Leave out the allocations of tracemalloc itself and of this module
+		return tracemalloc.take_snapshot().filter_traces([
+			tracemalloc.Filter(False, tracemalloc.__file__),
+			tracemalloc.Filter(False, __file__),
+		])
+
+	def stage(self, name: str):
+		current, peak = tracemalloc.get_traced_memory()
+		snapshot = self.take_snapshot()
+		rss = process_rss()
+		now = perf_counter()
+
+		top_sites = [{
+			'site': str(stat.traceback[0]),
+			'size_diff_bytes': stat.size_diff,
+			'count_diff': stat.count_diff,
+		} for stat in snapshot.compare_to(self.snapshot, 'lineno')[:TOP_SITES] if stat.size_diff > 0]
+
+		self.stages.append(StageMemory(
+			name,
+			peak - self.baseline,
+			current - self.current,
+			rss,
+			rss - self.rss if rss is not None and self.rss is not None else None,
+			now - self.time,
+			top_sites,
+		))
+
+		self.current, self.snapshot, self.rss, self.time = current, snapshot, rss, now
+		tracemalloc.reset_peak()
+
+	def finish(self, json_path: str) -> List[str]:
+		"""
+		Stop tracing, write the report to json_path and return a short summary of it.
+		"""
+		if self.started_tracing:
+			tracemalloc.stop()
+		self.snapshot = None
+
+		peak_stage = max(self.stages, key=lambda stage: stage.peak, default=None)
+		rss_values = [stage.rss for stage in self.stages if stage.rss is not None]
+
+		report = {
+			**self.metadata,
+			'peak_bytes': peak_stage.peak if peak_stage else 0,
+			'peak_stage': peak_stage.name if peak_stage else None,
+			'max_rss_bytes': max(rss_values, default=None),
+			'stages': [stage.to_dict() for stage in self.stages],
+		}
+
+		with open(json_path, 'w') as f:
+			json.dump(report, f, indent=2)
+
+		summary = [f'Memory profile written to {json_path}']
+		if peak_stage:
+			summary.append(f'Peak traced memory {format_bytes(peak_stage.peak)} during {peak_stage.name}, '
+						   f'max RSS {format_bytes(report["max_rss_bytes"])}')
+
+			for stage in sorted(self.stages, key=lambda stage: stage.peak, reverse=True)[:5]:
+				summary.append(f'{stage.name}: peak {format_bytes(stage.peak)}, retained {format_bytes(stage.retained)}, '
+							   f'RSS {format_bytes(stage.rss_delta)}')
+
+		return summary
@@ -0,0 +1,199 @@
+import numpy as np
+
+from bpy.types import Action, Depsgraph, Object
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def get_bones_to_bake(arm_obj: Object) -> List[str]:
+	"""
+	Return the names of the pose bones whose final transform does not come from their F-Curves alone:
+	bones with active constraints, bones in an IK chain and bones with drivers.
+	"""
+	names = set()
+
+	for pose_bone in arm_obj.pose.bones:
+		for constraint in pose_bone.constraints:
+			if constraint.mute or constraint.influence == 0:
+				continue
+
+			names.add(pose_bone.name)
+
+			if constraint.type in ('IK', 'SPLINE_IK'):
+				chain = [pose_bone, *pose_bone.parent_recursive]
+				if constraint.chain_count:
+					chain = chain[:constraint.chain_count]
+
+				names.update(bone.name for bone in chain)
+
+	if arm_obj.animation_data:
+		for driver in arm_obj.animation_data.drivers:
+			if driver.data_path.startswith('pose.bones["'):
+				names.add(driver.data_path.split('"')[1])
+
+	return [pose_bone.name for pose_bone in arm_obj.pose.bones if pose_bone.name in names]
+
+
+def matrices_to_quaternions(matrices: np.ndarray) -> np.ndarray:
+	"""
+	Convert (..., 3, 3) rotation matrices to (..., 4) wxyz quaternions.
+	"""
+	m00, m11, m22 = matrices[..., 0, 0], matrices[..., 1, 1], matrices[..., 2, 2]
+
+	quaternions = np.empty(matrices.shape[:-2] + (4,), dtype=matrices.dtype)
+	quaternions[..., 0] = np.sqrt(np.maximum(0, 1 + m00 + m11 + m22)) / 2
+	quaternions[..., 1] = np.copysign(np.sqrt(np.maximum(0, 1 + m00 - m11 - m22)) / 2, matrices[..., 2, 1] - matrices[..., 1, 2])
+	quaternions[..., 2] = np.copysign(np.sqrt(np.maximum(0, 1 - m00 + m11 - m22)) / 2, matrices[..., 0, 2] - matrices[..., 2, 0])
+	quaternions[..., 3] = np.copysign(np.sqrt(np.maximum(0, 1 - m00 - m11 + m22)) / 2, matrices[..., 1, 0] - matrices[..., 0, 1])
+
+	return quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+
+
+def continuous_quaternions(quaternions: np.ndarray) -> np.ndarray:
+	"""
+	Flip the signs of (F, ..., 4) quaternions so consecutive frames stay in the same hemisphere,
+	otherwise linear keys take the long way around.
+	"""
+	for i in range(1, len(quaternions)):
+		flip = np.sum(quaternions[i - 1] * quaternions[i], axis=-1) < 0
+		quaternions[i, flip] *= -1
+	return quaternions
+
+
+def matrices_to_rotations(matrices: np.ndarray) -> np.ndarray:
+	"""
+	Return the continuous wxyz rotations of (F, ..., 4, 4) transform matrices, with scale removed.
+	"""
+	rotation_scale = matrices[..., :3, :3]
+	return continuous_quaternions(matrices_to_quaternions(rotation_scale / np.linalg.norm(rotation_scale, axis=-2)[..., None, :]))
+
+
+class BakedBones:
+	"""Local transforms of the baked bones of one armature, one row per frame."""
+
+	def __init__(self, frames: np.ndarray, bone_names: List[str], basis: np.ndarray):
+		self.frames = frames
+		self.bone_indices = {name: i for i, name in enumerate(bone_names)}
+
+		self.locations = basis[..., :3, 3]
+
+		self.scales = np.linalg.norm(basis[..., :3, :3], axis=-2)
+		self.rotations = matrices_to_rotations(basis)
+
+	def __contains__(self, bone_name: str) -> bool:
+		return bone_name in self.bone_indices
+
+	def frame_values(self, values: np.ndarray, bone_name: str) -> Dict[int, List[float]]:
+		column = values[:, self.bone_indices[bone_name]]
+		return dict(zip(self.frames.tolist(), column.tolist()))
+
+
+def _to_row_major(flat: np.ndarray) -> np.ndarray:
+	# foreach_get returns matrices column by column
+	return flat.reshape(flat.shape[:-1] + (-1, 4, 4)).swapaxes(-1, -2)
+
+
+def step_frames(context, frames: np.ndarray, read: Callable[[int, Depsgraph], None]):
+	"""
+	Evaluate the depsgraph once per frame and call read(frame index, depsgraph). The caller restores the current frame.
+	"""
+	for i, frame in enumerate(frames):
+		context.scene.frame_set(int(frame))
+		read(i, context.evaluated_depsgraph_get())
+
+
+def bake_scene(context, actions: Dict[Object, Action], bone_range: Optional[Tuple[int, int]],
+			   objs: Sequence[Object] = (), obj_frames: Optional[np.ndarray] = None) -> Tuple[Dict[str, BakedBones], Dict[str, np.ndarray]]:
+	"""
+	Evaluate the scene once per frame with every armature in actions playing its action, and read in the same pass:
+	the local transforms (in the same space as the F-Curves) of the bones that need baking on every frame of bone_range,
+	keyed by armature name, and the (F, 4, 4) world matrices of objs on obj_frames, keyed by object name.
+	bone_range None skips the bones. This changes the current frame and the active actions while it runs, both are restored
+	afterwards, also when it fails.
+	"""
+	bake_bones = {arm_obj.name: get_bones_to_bake(arm_obj) for arm_obj in actions} if bone_range else {}
+	arm_objs = [arm_obj for arm_obj in actions if bake_bones.get(arm_obj.name)]
+
+	bone_frames = np.arange(bone_range[0], bone_range[1] + 1) if arm_objs else np.empty(0, dtype=np.int64)
+	obj_frames = np.asarray(obj_frames if objs and obj_frames is not None else [], dtype=np.int64)
+
+	if not len(bone_frames) and not len(obj_frames):
+		return {}, {}
+
+	# One evaluation per frame read by either
+	frames = np.union1d(bone_frames, obj_frames)
+	bone_rows = np.searchsorted(bone_frames, frames)
+	obj_rows = np.searchsorted(obj_frames, frames)
+	reads_bones = np.isin(frames, bone_frames)
+	reads_objs = np.isin(frames, obj_frames)
+
+	# Armature space pose matrices of every bone, preallocated for the whole frame range
+	pose_buffers = {arm_obj.name: np.empty((len(bone_frames), len(arm_obj.pose.bones) * 16), dtype=np.float32) for arm_obj in arm_objs}
+	matrices = {obj.name: np.empty((len(obj_frames), 4, 4)) for obj in objs}
+
+	def read(i, depsgraph):
+		if reads_bones[i]:
+			for arm_obj in arm_objs:
+				arm_obj.evaluated_get(depsgraph).pose.bones.foreach_get('matrix', pose_buffers[arm_obj.name][bone_rows[i]])
+
+		if reads_objs[i]:
+			for obj in objs:
+				matrices[obj.name][obj_rows[i]] = obj.evaluated_get(depsgraph).matrix_world
+
+	# Every armature plays its action in the chunk while the scene is evaluated, also the ones objs are parented to
+	scene = context.scene
+	current_frame, current_subframe = scene.frame_current, scene.frame_subframe
+	current_actions = {arm_obj: arm_obj.animation_data.action for arm_obj in actions if arm_obj.animation_data}
+
+	try:
+		for arm_obj in current_actions:
+			if arm_obj.animation_data.action != actions[arm_obj]:
+				arm_obj.animation_data.action = actions[arm_obj]
+
+		step_frames(context, frames, read)
+	finally:
+		# Actions first, so the scene is evaluated once more at the current frame with the actions it had
+		try:
+			for arm_obj, action in current_actions.items():
+				if arm_obj.animation_data.action != action:
+					arm_obj.animation_data.action = action
+		finally:
+			scene.frame_set(current_frame, subframe=current_subframe)
+
+	baked: Dict[str, BakedBones] = {}
+
+	for arm_obj in arm_objs:
+		bones = arm_obj.data.bones
+		bone_indices = {bone.name: i for i, bone in enumerate(bones)}
+
+		rest_flat = np.empty(len(bones) * 16, dtype=np.float32)
+		bones.foreach_get('matrix_local', rest_flat)
+		rest = _to_row_major(rest_flat).astype(np.float64)
+		poses = _to_row_major(pose_buffers[arm_obj.name]).astype(np.float64)
+
+		# pose.bones is not guaranteed to follow the order of data.bones, so the rows of each are looked up by name
+		pose_indices = {pose_bone.name: i for i, pose_bone in enumerate(arm_obj.pose.bones)}
+
+		names = bake_bones[arm_obj.name]
+		parent_names = [bones[name].parent.name if bones[name].parent else None for name in names]
+
+		# pose = parent_pose @ parent_rest^-1 @ rest @ basis, so basis = rest^-1 @ parent_rest @ parent_pose^-1 @ pose
+		parent_rest = np.stack([rest[bone_indices[parent]] if parent else np.identity(4) for parent in parent_names])
+		rest_offsets = np.linalg.inv(rest[[bone_indices[name] for name in names]]) @ parent_rest
+
+		parent_poses = np.broadcast_to(np.identity(4), (len(bone_frames), len(names), 4, 4)).copy()
+		has_parent = np.array([parent is not None for parent in parent_names])
+		if has_parent.any():
+			parent_poses[:, has_parent] = poses[:, [pose_indices[parent] for parent in parent_names if parent]]
+
+		basis = rest_offsets[None] @ np.linalg.inv(parent_poses) @ poses[:, [pose_indices[name] for name in names]]
+
+		baked[arm_obj.name] = BakedBones(bone_frames, names, basis)
+
+	return baked, matrices
+
+
+def needs_evaluation(obj: Object) -> bool:
+	"""
+	Return True if the world transform of obj does not come from its own F-Curves alone.
+	"""
+	return bool(obj.parent) or any(not constraint.mute and constraint.influence > 0 for constraint in obj.constraints)
@@ -0,0 +1,365 @@
+import copy
+import numpy as np
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .anm_snapshot import *
+
+
+def normalize_rows(values: np.ndarray) -> np.ndarray:
+	norms = np.linalg.norm(values, axis=1, keepdims=True)
+	return values / np.where(norms == 0, 1, norms)
+
+
+def interpolate_linear(times: np.ndarray, values: np.ndarray, frames: np.ndarray, spherical: bool) -> np.ndarray:
+	"""
+	Evaluate (N, m) keys at times on frames, holding the first and last key outside of them.
+	Quaternions are interpolated along the shortest arc.
+	"""
+	if len(times) == 1:
+		return np.repeat(values, len(frames), axis=0)
+
+	start = np.clip(np.searchsorted(times, frames, side='right') - 1, 0, len(times) - 2)
+	span = times[start + 1] - times[start]
+	t = np.clip((frames - times[start]) / np.where(span == 0, 1, span), 0, 1)[:, None]
+
+	first, last = values[start], values[start + 1]
+	if not spherical:
+		return first + t * (last - first)
+
+	dot = np.sum(first * last, axis=1, keepdims=True)
+	last = np.where(dot < 0, -last, last)
+	dot = np.abs(dot)
+
+	# Nearly equal quaternions fall back to linear interpolation
+	angle = np.arccos(np.clip(dot, -1, 1))
+	sin_angle = np.sin(angle)
+	is_close = sin_angle < 1e-6
+	sin_angle = np.where(is_close, 1, sin_angle)
+
+	a = np.where(is_close, 1 - t, np.sin((1 - t) * angle) / sin_angle)
+	b = np.where(is_close, t, np.sin(t * angle) / sin_angle)
+	return normalize_rows(a * first + b * last)
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+	"""
+	Replace the NaNs of an (N, k) array with the last value above them in the same column, or 0 if there is none.
+	"""
+	rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+	np.maximum.accumulate(rows, axis=0, out=rows)
+
+	return np.nan_to_num(values[rows, np.arange(values.shape[1])])
+
+
+def frame_value_array(frame_values: FrameValues) -> Tuple[List[int], np.ndarray]:
+	"""
+	Return the sorted frames and an (N, k) array of their values. Channels without a key on a frame
+	keep the value of the previous frame, or 0 before their first key. No keys give a (0, 0) array.
+	"""
+	frames = sorted(frame_values)
+	if not frames:
+		return frames, np.empty((0, 0))
+
+	values = np.array([[np.nan if value is None else value for value in frame_values[frame]] for frame in frames], dtype=np.float64)
+
+	return frames, forward_fill(values)
+
+
+def resample_keys(frames: Sequence[float], values: np.ndarray, scale: float, spherical: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Move keys on frames to a frame rate scale times the current one, interpolated from the original keys
+	at the exact time of each target frame (slerp for wxyz quaternions).
+	Keys on every frame, such as tables and baked or sampled tracks, get a key on every target frame between
+	the first and the last. Sparse keys only get a key on each whole target frame one of them lands on.
+	"""
+	frames = np.asarray(frames, dtype=np.float64)
+	if len(frames) == 0:
+		return frames.astype(np.int64), values
+
+	if np.all(np.diff(frames) == 1):
+		target = np.arange(np.rint(frames[0] * scale), np.rint(frames[-1] * scale) + 1).astype(np.int64)
+	else:
+		target = np.unique(np.rint(frames * scale)).astype(np.int64)
+
+	return target, interpolate_linear(frames, np.asarray(values, dtype=np.float64), target / scale, spherical)
+
+
+def resample_frame_values(frame_values: FrameValues, scale: float, spherical: bool = False) -> FrameValues:
+	if not frame_values:
+		return frame_values
+
+	frames, values = frame_value_array(frame_values)
+	target, resampled = resample_keys(frames, values, scale, spherical)
+	return dict(zip(target.tolist(), resampled.tolist()))
+
+
+def resample_channels(channels: ChannelArrays, scale: float, spherical: bool = False) -> ChannelArrays:
+	if not len(channels):
+		return channels
+
+	return ChannelArrays(*resample_keys(channels.frames, forward_fill(channels.values), scale, spherical))
+
+
+def resample_table(values: np.ndarray, scale: float) -> np.ndarray:
+	"""Resample one value per frame from frame 0, N values become round((N - 1) * scale) + 1."""
+	if not len(values):
+		return values
+
+	_, resampled = resample_keys(np.arange(len(values)), values[:, None], scale)
+	return resampled[:, 0]
+
+
+def resample_chunk(chunk: ChunkSnapshot, scale: float):
+	"""
+	Resample every key of a chunk, in place, to a frame rate scale times the one it was read at.
+	The frame count and the last frames of the lights are scaled with it. The fidelity references keep the scene frame rate.
+	"""
+	chunk.frame_count = int(round(chunk.frame_count * scale))
+
+	for armature in chunk.armatures:
+		for coord in armature.coords:
+			coord.location = resample_frame_values(coord.location, scale)
+			coord.rotation = resample_frame_values(coord.rotation, scale, coord.rotation_mode == 'rotation_quaternion')
+			if coord.scale is not None:
+				coord.scale = resample_frame_values(coord.scale, scale)
+
+			if coord.opacity:
+				frames, values = zip(*coord.opacity)
+				frames, values = resample_keys(frames, np.array(values)[:, None], scale)
+				coord.opacity = list(zip(frames.tolist(), values[:, 0].tolist()))
+
+		for material in armature.material_entries:
+			# Fixed tracks only use their first value
+			material.tracks = [(track_index, key_format, values if key_format == 'FloatFixed' else resample_table(values, scale))
+							   for track_index, key_format, values in material.tracks]
+
+	for camera in chunk.cameras:
+		camera.translations = resample_channels(camera.translations, scale)
+		camera.quaternions = resample_channels(camera.quaternions, scale, True)
+		camera.eulers = resample_channels(camera.eulers, scale)
+		camera.lenses = resample_channels(camera.lenses, scale)
+
+	for lightdirc in chunk.lightdircs:
+		lightdirc.frame_end = int(round(lightdirc.frame_end * scale))
+		lightdirc.colors = resample_channels(lightdirc.colors, scale)
+		lightdirc.energies = resample_channels(lightdirc.energies, scale)
+		lightdirc.rotations_euler = resample_channels(lightdirc.rotations_euler, scale)
+		lightdirc.rotations_quat = resample_channels(lightdirc.rotations_quat, scale, True)
+
+	for lightpoint in chunk.lightpoints:
+		lightpoint.colors = resample_channels(lightpoint.colors, scale)
+		lightpoint.intensities = resample_channels(lightpoint.intensities, scale)
+		lightpoint.ranges = resample_channels(lightpoint.ranges, scale)
+		lightpoint.attenuations = resample_channels(lightpoint.attenuations, scale)
+		lightpoint.locations = resample_channels(lightpoint.locations, scale)
+
+	if chunk.ambient:
+		chunk.ambient.frame_end = int(round(chunk.ambient.frame_end * scale))
+		chunk.ambient.colors = resample_channels(chunk.ambient.colors, scale)
+
+	if chunk.fog:
+		chunk.fog.frames, chunk.fog.rows = resample_keys(chunk.fog.frames, chunk.fog.rows, scale)
+
+
+def slice_keys(frames: Sequence[float], values: np.ndarray, start: int, end: int, spherical: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Return the keys between start and end with their frames moved back by start. Keys are added on both
+	boundaries, interpolated from the keys around them, so the slice plays the same as that part of the source.
+	A single key stays a single key at frame 0.
+	"""
+	frames = np.asarray(frames, dtype=np.float64)
+	values = np.asarray(values, dtype=np.float64)
+
+	if len(frames) <= 1:
+		return np.zeros(len(frames), dtype=np.int64), values
+
+	inside = (frames > start) & (frames < end)
+	boundaries = interpolate_linear(frames, values, np.array([start, end], dtype=np.float64), spherical)
+
+	sliced_frames = np.concatenate([[start], frames[inside], [end]]) - start
+	sliced_values = np.concatenate([boundaries[:1], values[inside], boundaries[1:]])
+	return sliced_frames.astype(np.int64), sliced_values
+
+
+def slice_frame_values(frame_values: Optional[FrameValues], start: int, end: int, spherical: bool = False) -> Optional[FrameValues]:
+	if not frame_values:
+		return frame_values
+
+	frames, values = frame_value_array(frame_values)
+	sliced_frames, sliced_values = slice_keys(frames, values, start, end, spherical)
+	return dict(zip(sliced_frames.tolist(), sliced_values.tolist()))
+
+
+def slice_channels(channels: ChannelArrays, start: int, end: int, spherical: bool = False) -> ChannelArrays:
+	if not len(channels):
+		return channels
+
+	return ChannelArrays(*slice_keys(channels.frames, forward_fill(channels.values), start, end, spherical))
+
+
+def slice_table(values: np.ndarray, start: int, end: int) -> np.ndarray:
+	"""Return the values of frames start to end of a table with one value per frame, holding its last value."""
+	if not len(values):
+		return values
+
+	return values[np.minimum(np.arange(start, end + 1), len(values) - 1)]
+
+
+def slice_references(references: Dict[int, ChannelArrays], start: int, end: int) -> Dict[int, ChannelArrays]:
+	"""Return the reference samples from start to end with their frames moved back by start."""
+	sliced: Dict[int, ChannelArrays] = {}
+
+	for track_index, channels in references.items():
+		inside = (channels.frames >= start) & (channels.frames <= end)
+		sliced[track_index] = ChannelArrays(channels.frames[inside] - start, channels.values[inside])
+
+	return sliced
+
+
+def slice_chunk(source: ChunkSnapshot, name: str, path: str, is_looped: bool, start: int, end: int) -> ChunkSnapshot:
+	"""
+	Return a chunk that plays frames start to end of source, re-based to frame 0. The source is left untouched,
+	so several chunks can be sliced from one snapshot.
+	"""
+	chunk = ChunkSnapshot(name, path, is_looped, end - start)
+
+	for source_armature in source.armatures:
+		armature = copy.copy(source_armature)
+		armature.coords = []
+		armature.material_entries = []
+
+		for source_coord in source_armature.coords:
+			coord = copy.copy(source_coord)
+			coord.location = slice_frame_values(coord.location, start, end)
+			coord.rotation = slice_frame_values(coord.rotation, start, end, coord.rotation_mode == 'rotation_quaternion')
+			coord.scale = slice_frame_values(coord.scale, start, end)
+
+			if coord.opacity:
+				frames, values = zip(*coord.opacity)
+				frames, values = slice_keys(frames, np.array(values)[:, None], start, end)
+				coord.opacity = list(zip(frames.tolist(), values[:, 0].tolist()))
+
+			coord.references = slice_references(coord.references, start, end)
+			armature.coords.append(coord)
+
+		for source_material in source_armature.material_entries:
+			material = copy.copy(source_material)
+			material.tracks = [(track_index, key_format, values if key_format == 'FloatFixed' else slice_table(values, start, end))
+							   for track_index, key_format, values in source_material.tracks]
+			material.references = slice_references(material.references, start, end)
+			armature.material_entries.append(material)
+
+		chunk.armatures.append(armature)
+
+	for source_camera in source.cameras:
+		camera = copy.copy(source_camera)
+		camera.translations = slice_channels(camera.translations, start, end)
+		camera.quaternions = slice_channels(camera.quaternions, start, end, True)
+		camera.eulers = slice_channels(camera.eulers, start, end)
+		camera.lenses = slice_channels(camera.lenses, start, end)
+		camera.references = slice_references(camera.references, start, end)
+		chunk.cameras.append(camera)
+
+	for source_lightdirc in source.lightdircs:
+		lightdirc = copy.copy(source_lightdirc)
+		lightdirc.frame_end = end - start
+		lightdirc.colors = slice_channels(lightdirc.colors, start, end)
+		lightdirc.energies = slice_channels(lightdirc.energies, start, end)
+		lightdirc.rotations_euler = slice_channels(lightdirc.rotations_euler, start, end)
+		lightdirc.rotations_quat = slice_channels(lightdirc.rotations_quat, start, end, True)
+		lightdirc.references = slice_references(lightdirc.references, start, end)
+		chunk.lightdircs.append(lightdirc)
+
+	for source_lightpoint in source.lightpoints:
+		lightpoint = copy.copy(source_lightpoint)
+		lightpoint.colors = slice_channels(lightpoint.colors, start, end)
+		lightpoint.intensities = slice_channels(lightpoint.intensities, start, end)
+		lightpoint.ranges = slice_channels(lightpoint.ranges, start, end)
+		lightpoint.attenuations = slice_channels(lightpoint.attenuations, start, end)
+		lightpoint.locations = slice_channels(lightpoint.locations, start, end)
+		lightpoint.references = slice_references(lightpoint.references, start, end)
+		chunk.lightpoints.append(lightpoint)
+
+	if source.ambient:
+		chunk.ambient = copy.copy(source.ambient)
+		chunk.ambient.frame_end = end - start
+		chunk.ambient.colors = slice_channels(chunk.ambient.colors, start, end)
+		chunk.ambient.references = slice_references(chunk.ambient.references, start, end)
+
+	if source.fog:
+		chunk.fog = FogSnapshot(*slice_keys(source.fog.frames, source.fog.rows, start, end))
+
+	return chunk
+
+
+def simplify_rows(values: np.ndarray, tolerance: float, keep: Optional[np.ndarray] = None) -> np.ndarray:
+	"""
+	Return a mask of the rows of an (N, k) array to keep so that linear interpolation between the kept rows
+	stays within tolerance of every dropped row (Ramer-Douglas-Peucker on the row index).
+	Rows set in keep are always kept, and each span between them is subdivided on its own.
+	"""
+	keep = np.zeros(len(values), dtype=bool) if keep is None else keep.copy()
+	if len(values) == 0:
+		return keep
+
+	keep[[0, -1]] = True
+	kept = np.flatnonzero(keep)
+	segments = list(zip(kept[:-1].tolist(), kept[1:].tolist()))
+
+	while segments:
+		first, last = segments.pop()
+		if last - first < 2:
+			continue
+
+		t = (np.arange(first + 1, last) - first)[:, None] / (last - first)
+		line = values[first] + t * (values[last] - values[first])
+		error = np.abs(values[first + 1: last] - line).max(axis=1)
+
+		worst = int(np.argmax(error))
+		if error[worst] > tolerance:
+			split = first + 1 + worst
+			keep[split] = True
+			segments.extend([(first, split), (split, last)])
+
+	return keep
+
+
+def is_constant(values: np.ndarray, tolerance: float) -> bool:
+	return len(values) > 1 and bool(np.all(np.abs(values - values[0]) <= tolerance))
+
+
+def collapse_frame_values(frame_values: Optional[FrameValues], tolerance: float) -> Optional[FrameValues]:
+	"""Return a single key if all keys are within tolerance of the first one."""
+	if not frame_values:
+		return frame_values
+
+	frames, values = frame_value_array(frame_values)
+	if not is_constant(values, tolerance):
+		return frame_values
+
+	return {frames[0]: values[0].tolist()}
+
+
+def collapse_constant_tracks(chunk: ChunkSnapshot, tolerance: float):
+	"""
+	Reduce the bone and camera tracks whose keys all stay within tolerance of their first key, in place.
+	The fidelity references are left as read, so the error of the reduction is measured.
+	Bone tracks keep a single key, which is written as a fixed value where the format allows it.
+	Camera tracks keep their first and last key, since a camera track needs two keys to be written.
+	"""
+	for armature in chunk.armatures:
+		for coord in armature.coords:
+			coord.location = collapse_frame_values(coord.location, tolerance)
+			coord.rotation = collapse_frame_values(coord.rotation, tolerance)
+			coord.scale = collapse_frame_values(coord.scale, tolerance)
+
+			if coord.opacity and is_constant(np.array([value for _, value in coord.opacity]), tolerance):
+				coord.opacity = coord.opacity[:1]
+
+	for camera in chunk.cameras:
+		for name in ('translations', 'quaternions', 'eulers', 'lenses'):
+			channels: ChannelArrays = getattr(camera, name)
+			values = forward_fill(channels.values)
+			if len(channels) > 2 and is_constant(values, tolerance):
+				setattr(camera, name, ChannelArrays(channels.frames[[0, -1]], values[[0, -1]]))
@@ -0,0 +1,139 @@
+import json
+import numpy as np
+
+from typing import Any, Dict, List
+
+from .anm_snapshot import *
+
+
+# Bumped whenever a snapshot class changes in a way older caches cannot be read into
+CACHE_VERSION = 2
+
+# Classes that may appear in a cache, every other object is rejected
+SNAPSHOT_CLASSES = {cls.__name__: cls for cls in (
+	ChunkSnapshot, ArmatureSnapshot, CoordSnapshot, MaterialSnapshot, CameraSnapshot,
+	LightDircSnapshot, LightPointSnapshot, AmbientSnapshot, FogSnapshot, ChannelArrays,
+)}
+
+
+class SnapshotCache:
+	"""
+	Chunk snapshots as read from Blender, with the frame rate they were read at.
+	Written as a single .npz: every array of the snapshots is stored as is, and the objects holding them
+	are described by a JSON document that refers to the arrays by name.
+	"""
+
+	def __init__(self, chunks: List[ChunkSnapshot], fps: float):
+		self.chunks = chunks
+		self.fps = fps
+
+	def select(self, names: List[str]) -> List[ChunkSnapshot]:
+		"""Return the chunks named in names, in the order they were cached."""
+		missing = set(names) - {chunk.name for chunk in self.chunks}
+		if missing:
+			raise Exception(f'Animations not found in the snapshot cache: {", ".join(sorted(missing))}')
+
+		return [chunk for chunk in self.chunks if chunk.name in names]
+
+	def save(self, filepath: str):
+		writer = CacheWriter()
+		document = {
+			'version': CACHE_VERSION,
+			'fps': self.fps,
+			'chunks': [writer.encode(chunk) for chunk in self.chunks],
+		}
+
+		with open(filepath, 'wb') as f:
+			np.savez_compressed(f, document=np.array(json.dumps(document)), **writer.arrays)
+
+	@classmethod
+	def load(cls, filepath: str) -> 'SnapshotCache':
+		with np.load(filepath, allow_pickle=False) as data:
+			document = json.loads(str(data['document']))
+
+			if document['version'] != CACHE_VERSION:
+				raise Exception(f'Snapshot cache {filepath} has version {document["version"]}, expected {CACHE_VERSION}. Export it again')
+
+			reader = CacheReader(data)
+			return cls([reader.decode(chunk) for chunk in document['chunks']], document['fps'])
+
+
+class CacheWriter:
+	"""Turns snapshots into JSON values, collecting their arrays by name."""
+
+	def __init__(self):
+		self.arrays: Dict[str, np.ndarray] = {}
+
+	def add_array(self, values: np.ndarray) -> str:
+		name = f'a{len(self.arrays)}'
+		self.arrays[name] = values
+		return name
+
+	def encode(self, value: Any) -> Any:
+		if value is None or isinstance(value, (bool, int, float, str)):
+			return value
+
+		if isinstance(value, np.generic):
+			return value.item()
+
+		if isinstance(value, np.ndarray):
+			return {'array': self.add_array(value)}
+
+		if isinstance(value, tuple):
+			return {'tuple': [self.encode(item) for item in value]}
+
+		if isinstance(value, list):
+			return [self.encode(item) for item in value]
+
+		if isinstance(value, dict) and value and all(isinstance(item, ChannelArrays) for item in value.values()):
+			# Fidelity references, keyed by track index
+			return {'references': [[key, self.encode(item)] for key, item in value.items()]}
+
+		if isinstance(value, dict):
+			# FrameValues, stored as the keyed frames and their values with NaN for missing channels
+			frames = sorted(value)
+			values = np.array([[np.nan if item is None else item for item in value[frame]] for frame in frames], dtype=np.float64)
+			return {'frame_values': [self.add_array(np.array(frames, dtype=np.int64)), self.add_array(values)]}
+
+		class_name = type(value).__name__
+		if class_name not in SNAPSHOT_CLASSES:
+			raise Exception(f'Cannot cache a {class_name}')
+
+		return {'class': class_name, 'fields': {name: self.encode(field) for name, field in vars(value).items()}}
+
+
+class CacheReader:
+	"""Rebuilds the snapshots described by CacheWriter.encode."""
+
+	def __init__(self, arrays):
+		self.arrays = arrays
+
+	def decode(self, value: Any) -> Any:
+		if isinstance(value, list):
+			return [self.decode(item) for item in value]
+
+		if not isinstance(value, dict):
+			return value
+
+		if 'array' in value:
+			return self.arrays[value['array']]
+
+		if 'tuple' in value:
+			return tuple(self.decode(item) for item in value['tuple'])
+
+		if 'references' in value:
+			return {key: self.decode(item) for key, item in value['references']}
+
+		if 'frame_values' in value:
+			frames, values = (self.arrays[name] for name in value['frame_values'])
+			return {frame: [None if item != item else item for item in row] for frame, row in zip(frames.tolist(), values.tolist())}
+
+		cls = SNAPSHOT_CLASSES.get(value['class'])
+		if not cls:
+			raise Exception(f'Unknown snapshot class {value["class"]}')
+
+		# Fields are restored as saved, without running __init__
+		snapshot = cls.__new__(cls)
+		snapshot.__dict__.update({name: self.decode(field) for name, field in value['fields'].items()})
+		return snapshot
+
@@ -0,0 +1,140 @@
+import numpy as np
+
+from typing import Iterator, List, Optional, Sequence
+
+from ...xfbin.xfbin_lib import AnmCoord, AnmEntry, EntryFormat, NuccAnmKey, NuccAnmKeyFormat, Track, TrackHeader
+from .anm_snapshot import iter_blocks
+from .coordinate_converter import KeyMaker, get_key_converter
+from .export_stats import EntryStats, TrackStats, format_name
+from .fidelity import TrackFidelity, TrackSource, measure_track
+
+
+class TrackBuffer:
+	"""
+	Keys of one track, stored as an array of key frames and an (N, m) array of encoded values.
+	NuccAnmKey objects are only created by iter_keys, when the entry is assembled for writing.
+	"""
+
+	def __init__(self, track_index: int, key_format: NuccAnmKeyFormat, frames: np.ndarray, values: np.ndarray, make_key: KeyMaker):
+		self.track_index = track_index
+		self.key_format = key_format
+
+		# Key frames are in hundredths of a frame, -1 is the null key closing a linear track
+		self.frames = np.asarray(frames, dtype=np.int64)
+		self.values = values
+		self.make_key = make_key
+
+		# Scene values the keys were converted from, only set when fidelity is measured
+		self.source: Optional[TrackSource] = None
+
+	@classmethod
+	def convert(cls, track_index: int, data_path: str, key_format: NuccAnmKeyFormat, frames: Sequence[float], values: np.ndarray, **params) -> 'TrackBuffer':
+		"""
+		Encode the keys of a track. frames[i] is the frame of values[i], params are passed to the converter.
+		Long tracks are converted one block of keys at a time into a single array, so the temporaries of the
+		conversion stay bounded.
+		"""
+		converter = get_key_converter(data_path, key_format)
+		frames = np.asarray(frames, dtype=np.float64)
+		values = np.asarray(values, dtype=np.float64)
+
+		if not len(values):
+			# A property without keys, such as the location of a bone that only has rotation curves, is written as an empty track
+			return cls(track_index, key_format, np.empty(0, dtype=np.int64), np.empty((0, 0)), converter.make_key)
+
+		encoded: Optional[np.ndarray] = None
+		for block in iter_blocks(len(values)):
+			converted = converter.encode(values[block], **params)
+			if encoded is None:
+				encoded = np.empty((len(values),) + converted.shape[1:], dtype=converted.dtype)
+			encoded[block] = converted
+
+		return cls(track_index, key_format, (frames * 100).astype(np.int64), encoded, converter.make_key)
+
+	def __len__(self) -> int:
+		return len(self.frames)
+
+	def append(self, frames: np.ndarray, values: np.ndarray):
+		self.frames = np.concatenate([self.frames, frames])
+		self.values = np.concatenate([self.values, values])
+
+	def append_null_key(self):
+		"""Close a linear track with a copy of its last value at frame -1."""
+		self.append(np.array([-1]), self.values[-1:])
+
+	def duplicate_last(self, count: int = 1):
+		self.append(np.repeat(self.frames[-1:], count), np.repeat(self.values[-1:], count, axis=0))
+
+	def pad(self, multiple: int = 4):
+		"""Repeat the last key until the key count is a multiple of multiple."""
+		count = -len(self) % multiple
+		if count:
+			self.duplicate_last(count)
+
+	def make_header(self) -> TrackHeader:
+		header = TrackHeader()
+		header.track_index = self.track_index
+		header.key_format = self.key_format
+		header.frame_count = len(self)
+		return header
+
+	def iter_keys(self) -> Iterator[NuccAnmKey]:
+		for frame, value in zip(self.frames.tolist(), self.values.tolist()):
+			yield self.make_key(frame, value)
+
+	def make_stats(self) -> TrackStats:
+		return TrackStats(self.track_index, format_name(self.key_format), len(self))
+
+	def measure(self, name: str, clump: Optional[str]) -> Optional[TrackFidelity]:
+		if self.source is None:
+			return None
+		return measure_track(name, clump, self.track_index, self.key_format, self.frames, self.values, self.source)
+
+	def make_track(self) -> Track:
+		track = Track()
+		track.keys = list(self.iter_keys())
+		return track
+
+
+class EntryBuffer:
+	"""An animation entry whose tracks are still TrackBuffers."""
+
+	def __init__(self, coord: AnmCoord, entry_format: EntryFormat, name: str, clump: Optional[str] = None):
+		self.coord = coord
+		self.entry_format = entry_format
+		self.tracks: List[TrackBuffer] = []
+
+		# Bone, material, camera or light name and armature name, only used for the export statistics
+		self.name = name
+		self.clump = clump
+
+	def make_stats(self) -> EntryStats:
+		return EntryStats(self.name, format_name(self.entry_format), self.clump, [track.make_stats() for track in self.tracks])
+
+	def measure(self) -> List[TrackFidelity]:
+		"""Compare each track to the scene values it was converted from."""
+		measured = (track.measure(self.name, self.clump) for track in self.tracks)
+		return [fidelity for fidelity in measured if fidelity is not None]
+
+	def make_entry(self) -> AnmEntry:
+		"""
+		Create the AnmEntry, converting the keys of one track at a time. The buffers are released as they are converted.
+		"""
+		entry = AnmEntry()
+		entry.coord = self.coord
+		entry.entry_format = self.entry_format
+
+		while self.tracks:
+			buffer = self.tracks.pop(0)
+			entry.track_headers.append(buffer.make_header())
+			entry.tracks.append(buffer.make_track())
+
+		return entry
+
+
+def make_entries(buffers: List[EntryBuffer]) -> Iterator[AnmEntry]:
+	"""
+	Yield the AnmEntry of each buffer, dropping each buffer once its entry is made.
+	"""
+	while buffers:
+		yield buffers.pop(0).make_entry()
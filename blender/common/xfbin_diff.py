@@ -0,0 +1,384 @@
+import json
+import hashlib
+import numpy as np
+
+from os import path
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Optional, Tuple
+
+from ...xfbin.xfbin_lib import *
+from .export_stats import format_name
+from .xfbin_pages import COPY_BLOCK_SIZE, RawPage, RawXfbin
+
+
+# Largest difference between two key values that still counts as equal
+DEFAULT_TOLERANCE = 1e-4
+
+# Chunk types that do not name a page
+PAGE_CHUNK_TYPES = (b'nuccChunkNull', b'nuccChunkPage')
+
+# (clump reference, coord reference, entry format), see anm_entry_key
+EntryKey = Tuple[Optional[Tuple[str, str, str]], object, str]
+
+
+def struct_reference_key(reference: NuccStructReference) -> Tuple[str, str, str]:
+	info = reference.struct_info
+	return info.chunk_name, info.chunk_type, info.filepath
+
+
+def anm_entry_key(entry: AnmEntry, anm: NuccAnm, struct_references: List[NuccStructReference]) -> EntryKey:
+	"""
+	Return a key that identifies an entry across pages. Clumps and coords are indices into the page,
+	so the structs they point to are compared instead.
+	"""
+	if entry.coord.clump_index < 0:
+		return None, entry.coord.coord_index, str(entry.entry_format)
+
+	clump = anm.clumps[entry.coord.clump_index]
+	return (struct_reference_key(struct_references[clump.clump_index]),
+			struct_reference_key(struct_references[clump.bone_material_indices[entry.coord.coord_index]]),
+			str(entry.entry_format))
+
+
+def format_entry_key(key: EntryKey) -> str:
+	clump, coord, entry_format = key
+	if clump is None:
+		return f'{format_name(entry_format)} {coord}'
+	return f'{format_name(entry_format)} {clump[0]}/{coord[0]}'
+
+
+def key_values(key: NuccAnmKey) -> List[float]:
+	"""
+	Return the frame, if any, followed by the values of a key. Key variants expose their fields as _0, _1...
+	"""
+	values: List[float] = []
+
+	index = 0
+	while hasattr(key, f'_{index}'):
+		field = getattr(key, f'_{index}')
+		values.extend(field if isinstance(field, (tuple, list)) else [field])
+		index += 1
+
+	if not index:
+		raise Exception(f'Cannot read the values of {type(key).__name__}')
+
+	return values
+
+
+def page_name(page: RawPage, index: int) -> str:
+	"""Return the name of the first chunk of a page that is not a null or page chunk."""
+	return next((chunk_name.decode('utf-8', 'surrogateescape') for chunk_type, _, chunk_name in page.chunk_maps
+				 if chunk_type not in PAGE_CHUNK_TYPES), f'Page {index}')
+
+
+def page_digest(raw: RawXfbin, page: RawPage) -> bytes:
+	"""
+	Hash the bytes of a page along with its chunk maps and references, which the bytes refer to by index.
+	"""
+	digest = hashlib.blake2b()
+	digest.update(repr((page.chunk_maps, page.references)).encode())
+
+	with open(raw.filepath, 'rb') as f:
+		f.seek(page.offset)
+		size = page.size
+		while size > 0:
+			block = f.read(min(size, COPY_BLOCK_SIZE))
+			if not block:
+				break
+			digest.update(block)
+			size -= len(block)
+
+	return digest.digest()
+
+
+def index_pages(raw: RawXfbin) -> Dict[str, int]:
+	"""Map the name of each page to its index, numbering repeated names."""
+	pages: Dict[str, int] = {}
+
+	for index, page in enumerate(raw.pages):
+		name = base_name = page_name(page, index)
+		count = 1
+		while name in pages:
+			count += 1
+			name = f'{base_name} #{count}'
+		pages[name] = index
+
+	return pages
+
+
+def read_pages(raw: RawXfbin, page_indices: List[int]) -> List[XfbinPage]:
+	"""
+	Decode only the given pages of an XFBIN. They are extracted to the system temporary directory, so nothing
+	is written next to the compared files, which may be read-only.
+	"""
+	if not page_indices:
+		return []
+
+	with TemporaryDirectory(prefix='xfbin_diff_') as directory:
+		page_filepath = path.join(directory, path.basename(raw.filepath))
+		raw.extract_pages(page_indices, page_filepath)
+		return read_xfbin(page_filepath).pages
+
+
+class TrackDiff:
+	def __init__(self, track_index: int, message: str, max_difference: float = 0.0, first_key: Optional[int] = None):
+		self.track_index = track_index
+		self.message = message
+		self.max_difference = max_difference
+		self.first_key = first_key
+
+	def to_dict(self) -> dict:
+		return {
+			'track_index': self.track_index,
+			'message': self.message,
+			'max_difference': self.max_difference,
+			'first_key': self.first_key,
+		}
+
+
+def diff_track(track_index: int, old: Tuple[TrackHeader, Track], new: Tuple[TrackHeader, Track], tolerance: float) -> Tuple[Optional[TrackDiff], float]:
+	"""
+	Compare two tracks key by key. Return the difference, or None if they are equal within tolerance,
+	and the largest difference between their values.
+	"""
+	(old_header, old_track), (new_header, new_track) = old, new
+
+	if str(old_header.key_format) != str(new_header.key_format):
+		return TrackDiff(track_index, f'key format {format_name(old_header.key_format)} -> {format_name(new_header.key_format)}'), 0.0
+
+	if len(old_track.keys) != len(new_track.keys):
+		return TrackDiff(track_index, f'{len(old_track.keys)} -> {len(new_track.keys)} keys'), 0.0
+
+	if not old_track.keys:
+		return None, 0.0
+
+	old_values = np.array([key_values(key) for key in old_track.keys], dtype=np.float64)
+	new_values = np.array([key_values(key) for key in new_track.keys], dtype=np.float64)
+
+	if old_values.shape != new_values.shape:
+		return TrackDiff(track_index, f'key size {old_values.shape[1]} -> {new_values.shape[1]}'), 0.0
+
+	differences = np.abs(new_values - old_values).max(axis=1)
+	max_difference = float(differences.max())
+
+	if max_difference <= tolerance:
+		return None, max_difference
+
+	changed = np.flatnonzero(differences > tolerance)
+	return TrackDiff(track_index, f'{len(changed)} keys differ', max_difference, int(changed[0])), max_difference
+
+
+class EntryDiff:
+	def __init__(self, name: str, tracks: List[TrackDiff]):
+		self.name = name
+		self.tracks = tracks
+
+	def to_dict(self) -> dict:
+		return {
+			'name': self.name,
+			'tracks': [track.to_dict() for track in self.tracks],
+		}
+
+
+class PageDiff:
+	"""Differences between two decoded pages with the same name."""
+
+	def __init__(self, name: str):
+		self.name = name
+
+		# Differences of the page or animation itself, such as struct infos or the frame count
+		self.notes: List[str] = []
+
+		self.entries_added: List[str] = []
+		self.entries_removed: List[str] = []
+		self.entries_changed: List[EntryDiff] = []
+		self.entries_compared = 0
+
+		# Largest difference between the values of matched tracks, even within tolerance
+		self.max_difference = 0.0
+
+	@property
+	def changed(self) -> bool:
+		return bool(self.notes or self.entries_added or self.entries_removed or self.entries_changed)
+
+	def to_dict(self) -> dict:
+		return {
+			'name': self.name,
+			'notes': self.notes,
+			'entries_compared': self.entries_compared,
+			'entries_added': self.entries_added,
+			'entries_removed': self.entries_removed,
+			'entries_changed': [entry.to_dict() for entry in self.entries_changed],
+			'max_difference': self.max_difference,
+		}
+
+
+def diff_anms(diff: PageDiff, old_page: XfbinPage, old_anm: NuccAnm, new_page: XfbinPage, new_anm: NuccAnm, tolerance: float):
+	prefix = f'{old_anm.struct_info.chunk_name}: '
+
+	if old_anm.frame_count != new_anm.frame_count:
+		diff.notes.append(f'{prefix}frame count {old_anm.frame_count} -> {new_anm.frame_count}')
+	if old_anm.is_looped != new_anm.is_looped:
+		diff.notes.append(f'{prefix}looped {old_anm.is_looped} -> {new_anm.is_looped}')
+
+	old_entries = {anm_entry_key(entry, old_anm, old_page.struct_references): entry for entry in old_anm.entries}
+	new_entries = {anm_entry_key(entry, new_anm, new_page.struct_references): entry for entry in new_anm.entries}
+
+	diff.entries_removed.extend(format_entry_key(key) for key in old_entries if key not in new_entries)
+	diff.entries_added.extend(format_entry_key(key) for key in new_entries if key not in old_entries)
+
+	for key, old_entry in old_entries.items():
+		new_entry = new_entries.get(key)
+		if new_entry is None:
+			continue
+
+		diff.entries_compared += 1
+
+		old_tracks = {header.track_index: (header, track) for header, track in zip(old_entry.track_headers, old_entry.tracks)}
+		new_tracks = {header.track_index: (header, track) for header, track in zip(new_entry.track_headers, new_entry.tracks)}
+
+		tracks: List[TrackDiff] = []
+		for track_index in sorted(old_tracks.keys() | new_tracks.keys()):
+			if track_index not in new_tracks:
+				tracks.append(TrackDiff(track_index, 'removed'))
+			elif track_index not in old_tracks:
+				tracks.append(TrackDiff(track_index, 'added'))
+			else:
+				track_diff, max_difference = diff_track(track_index, old_tracks[track_index], new_tracks[track_index], tolerance)
+				diff.max_difference = max(diff.max_difference, max_difference)
+				if track_diff:
+					tracks.append(track_diff)
+
+		if tracks:
+			diff.entries_changed.append(EntryDiff(format_entry_key(key), tracks))
+
+
+def diff_pages(name: str, old_page: XfbinPage, new_page: XfbinPage, tolerance: float) -> PageDiff:
+	diff = PageDiff(name)
+
+	old_infos = [(info.chunk_name, info.chunk_type, info.filepath) for info in old_page.struct_infos]
+	new_infos = [(info.chunk_name, info.chunk_type, info.filepath) for info in new_page.struct_infos]
+	if old_infos != new_infos:
+		diff.notes.append(f'struct infos differ ({len(old_infos)} -> {len(new_infos)})')
+
+	old_references = [struct_reference_key(reference) for reference in old_page.struct_references]
+	new_references = [struct_reference_key(reference) for reference in new_page.struct_references]
+	if old_references != new_references:
+		diff.notes.append(f'struct references differ ({len(old_references)} -> {len(new_references)})')
+
+	old_anms = {struct.struct_info.chunk_name: struct for struct in old_page.structs if isinstance(struct, NuccAnm)}
+	new_anms = {struct.struct_info.chunk_name: struct for struct in new_page.structs if isinstance(struct, NuccAnm)}
+
+	for anm_name in old_anms.keys() - new_anms.keys():
+		diff.notes.append(f'animation {anm_name} removed')
+	for anm_name in new_anms.keys() - old_anms.keys():
+		diff.notes.append(f'animation {anm_name} added')
+
+	for anm_name in old_anms.keys() & new_anms.keys():
+		diff_anms(diff, old_page, old_anms[anm_name], new_page, new_anms[anm_name], tolerance)
+
+	return diff
+
+
+class XfbinDiff:
+	def __init__(self, old_filepath: str, new_filepath: str, tolerance: float):
+		self.old_filepath = old_filepath
+		self.new_filepath = new_filepath
+		self.tolerance = tolerance
+
+		self.pages_identical: List[str] = []
+		self.pages_added: List[str] = []
+		self.pages_removed: List[str] = []
+
+		# Pages whose bytes differ, decoded and compared entry by entry. Some may still be equal within tolerance.
+		self.pages_compared: List[PageDiff] = []
+
+	@property
+	def pages_changed(self) -> List[PageDiff]:
+		return [page for page in self.pages_compared if page.changed]
+
+	@property
+	def identical(self) -> bool:
+		return not (self.pages_added or self.pages_removed or self.pages_changed)
+
+	def to_dict(self) -> dict:
+		return {
+			'old': self.old_filepath,
+			'new': self.new_filepath,
+			'tolerance': self.tolerance,
+			'identical': self.identical,
+			'pages_identical': len(self.pages_identical),
+			'pages_added': self.pages_added,
+			'pages_removed': self.pages_removed,
+			'pages_compared': [page.to_dict() for page in self.pages_compared],
+		}
+
+	def write_json(self, json_path: str):
+		with open(json_path, 'w') as f:
+			json.dump(self.to_dict(), f, indent=2)
+
+	def summary(self, top: int = 5) -> List[str]:
+		"""
+		Return the page counts followed by the changes of each changed page, listing at most top entries per page.
+		"""
+		changed = self.pages_changed
+		lines = [f'{len(self.pages_identical)} pages identical, {len(self.pages_compared) - len(changed)} equal within {self.tolerance:g}, '
+				 f'{len(changed)} changed, {len(self.pages_added)} added, {len(self.pages_removed)} removed']
+
+		for name in self.pages_added:
+			lines.append(f'    + {name}')
+		for name in self.pages_removed:
+			lines.append(f'    - {name}')
+
+		for page in changed:
+			lines.append(f'    {page.name}: {len(page.entries_changed)} of {page.entries_compared} entries changed, '
+						 f'{len(page.entries_added)} added, {len(page.entries_removed)} removed, max difference {page.max_difference:.3g}')
+
+			for note in page.notes:
+				lines.append(f'        {note}')
+
+			for entry in page.entries_changed[:top]:
+				tracks = ', '.join(f'track {track.track_index} {track.message}' for track in entry.tracks)
+				lines.append(f'        {entry.name}: {tracks}')
+
+			if len(page.entries_changed) > top:
+				lines.append(f'        ... {len(page.entries_changed) - top} more entries')
+
+		return lines
+
+
+def diff_xfbins(old_filepath: str, new_filepath: str, tolerance: float = DEFAULT_TOLERANCE) -> XfbinDiff:
+	"""
+	Compare two XFBIN files page by page. Pages are matched by name and only decoded when their bytes differ.
+	"""
+	diff = XfbinDiff(old_filepath, new_filepath, tolerance)
+
+	old_raw = RawXfbin.read(old_filepath)
+	new_raw = RawXfbin.read(new_filepath)
+
+	old_pages = index_pages(old_raw)
+	new_pages = index_pages(new_raw)
+
+	diff.pages_removed.extend(name for name in old_pages if name not in new_pages)
+	diff.pages_added.extend(name for name in new_pages if name not in old_pages)
+
+	changed: List[str] = []
+	for name, old_index in old_pages.items():
+		new_index = new_pages.get(name)
+		if new_index is None:
+			continue
+
+		old_page, new_page = old_raw.pages[old_index], new_raw.pages[new_index]
+		if old_page.size == new_page.size and page_digest(old_raw, old_page) == page_digest(new_raw, new_page):
+			diff.pages_identical.append(name)
+		else:
+			changed.append(name)
+
+	# Decode the changed pages of each file in one read
+	old_decoded = read_pages(old_raw, [old_pages[name] for name in changed])
+	new_decoded = read_pages(new_raw, [new_pages[name] for name in changed])
+
+	for name, old_page, new_page in zip(changed, old_decoded, new_decoded):
+		diff.pages_compared.append(diff_pages(name, old_page, new_page, tolerance))
+
+	return diff
@@ -0,0 +1,316 @@
+import os
+import struct
+import hashlib
+import tempfile
+
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+
+NUCC_MAGIC = b'NUCC'
+HEADER_SIZE = 0x1C
+TABLE_SIZE_OFFSET = 0x10
+COPY_BLOCK_SIZE = 1 << 20
+
+_U32 = struct.Struct('>I')
+_TABLE_COUNTS = struct.Struct('>10I')
+_CHUNK_HEADER = struct.Struct('>IIHH')
+_PAGE_DATA = struct.Struct('>II')
+
+# (chunk type, file path, chunk name), stored as raw bytes so names round-trip exactly
+ChunkMap = Tuple[bytes, bytes, bytes]
+
+
+def _encode(text: str) -> bytes:
+	return text.encode('utf-8', 'surrogateescape')
+
+
+def _decode(data: bytes) -> str:
+	return data.decode('utf-8', 'surrogateescape')
+
+
+def _align(offset: int, alignment: int = 4) -> int:
+	return offset + (-offset % alignment)
+
+
+class RawPage:
+	"""A page of an XFBIN file that is kept as raw bytes.
+
+	The chunks inside a page only refer to the page local chunk map list, so the
+	bytes can be copied verbatim into another file as long as the chunk table is rebuilt.
+	"""
+
+	def __init__(self, source: str, offset: int, size: int, chunk_maps: List[ChunkMap], references: List[Tuple[bytes, ChunkMap]]):
+		self.source = source
+		self.offset = offset
+		self.size = size
+		self.chunk_maps = chunk_maps
+		self.references = references
+
+	@property
+	def chunk_names(self) -> List[str]:
+		return [_decode(chunk_map[2]) for chunk_map in self.chunk_maps]
+
+	def has_chunk(self, chunk_name: str) -> bool:
+		name = _encode(chunk_name)
+		return any(chunk_map[2] == name for chunk_map in self.chunk_maps)
+
+
+class XfbinLayoutError(Exception):
+	"""The chunks of an XFBIN file cannot be split into pages that are copied as they are."""
+
+
+class RawXfbin:
+	"""Chunk table and page byte ranges of an XFBIN file, without decoding any chunk data.
+
+	Every chunk has to belong to a page that ends with a nuccChunkPage chunk. Files with chunks outside of
+	a page, such as a file level nuccChunkIndex, raise XfbinLayoutError and have to be decoded in full.
+	"""
+
+	def __init__(self, filepath: str, header: bytes, table: bytes, table_size_delta: int, pages: List[RawPage]):
+		self.filepath = filepath
+		self.header = header
+		self.table = table
+		self.table_size_delta = table_size_delta
+		self.pages = pages
+
+	@classmethod
+	def read(cls, filepath: str) -> 'RawXfbin':
+		with open(filepath, 'rb') as f:
+			header = f.read(HEADER_SIZE)
+
+			if len(header) < HEADER_SIZE or header[:4] != NUCC_MAGIC:
+				raise Exception(f'Not a valid XFBIN file: {filepath}')
+
+			table_size = _U32.unpack_from(header, TABLE_SIZE_OFFSET)[0]
+			counts = _TABLE_COUNTS.unpack(f.read(_TABLE_COUNTS.size))
+			(type_count, type_size, path_count, path_size, name_count, name_size,
+			 map_count, _, index_count, reference_count) = counts
+
+			chunk_types = f.read(type_size).split(b'\0')[:type_count]
+			file_paths = f.read(path_size).split(b'\0')[:path_count]
+			chunk_names = f.read(name_size).split(b'\0')[:name_count]
+
+			f.seek(_align(f.tell()))
+
+			raw_maps = struct.unpack(f'>{map_count * 3}I', f.read(map_count * 12))
+			chunk_maps: List[ChunkMap] = [
+				(chunk_types[raw_maps[i]], file_paths[raw_maps[i + 1]], chunk_names[raw_maps[i + 2]])
+				for i in range(0, len(raw_maps), 3)
+			]
+
+			raw_references = struct.unpack(f'>{reference_count * 2}I', f.read(reference_count * 8))
+			references = [(chunk_names[raw_references[i]], chunk_maps[raw_references[i + 1]]) for i in range(0, len(raw_references), 2)]
+
+			map_indices = struct.unpack(f'>{index_count}I', f.read(index_count * 4))
+
+			chunks_start = f.tell()
+			file_size = f.seek(0, os.SEEK_END)
+
+			# Walk the chunk headers only, the chunk data itself is skipped
+			pages: List[RawPage] = []
+			page_start = offset = chunks_start
+			map_offset = reference_offset = 0
+
+			# Largest page local map index used by the chunks of the current page
+			page_map_end = 0
+
+			while offset + _CHUNK_HEADER.size <= file_size:
+				f.seek(offset)
+				size, map_index, _, _ = _CHUNK_HEADER.unpack(f.read(_CHUNK_HEADER.size))
+
+				if map_offset + map_index >= index_count:
+					raise XfbinLayoutError(f'Chunk at 0x{offset:X} of {filepath} refers to chunk map {map_offset + map_index}, '
+										   f'the chunk table only has {index_count}')
+
+				chunk_type = chunk_maps[map_indices[map_offset + map_index]][0]
+				if chunk_type == b'nuccChunkIndex':
+					raise XfbinLayoutError(f'{filepath} has a nuccChunkIndex chunk at 0x{offset:X}, which belongs to the whole file and not to a page')
+
+				offset += _CHUNK_HEADER.size + size
+				page_map_end = max(page_map_end, map_index + 1)
+
+				if chunk_type != b'nuccChunkPage':
+					continue
+
+				page_size, reference_size = _PAGE_DATA.unpack(f.read(_PAGE_DATA.size))
+
+				if page_map_end > page_size:
+					raise XfbinLayoutError(f'Page ending at 0x{offset:X} of {filepath} has {page_size} chunk maps, but its chunks use {page_map_end}')
+
+				pages.append(RawPage(
+					filepath,
+					page_start,
+					offset - page_start,
+					[chunk_maps[i] for i in map_indices[map_offset: map_offset + page_size]],
+					references[reference_offset: reference_offset + reference_size],
+				))
+
+				page_start = offset
+				map_offset += page_size
+				reference_offset += reference_size
+				page_map_end = 0
+
+			if page_start != file_size:
+				raise XfbinLayoutError(f'{filepath} has {file_size - page_start} bytes after its last page, which are not part of any page')
+
+			if (map_offset, reference_offset) != (index_count, reference_count):
+				raise XfbinLayoutError(f'The pages of {filepath} cover {map_offset} of {index_count} chunk map indices '
+									   f'and {reference_offset} of {reference_count} references')
+
+			f.seek(HEADER_SIZE)
+			table = f.read(chunks_start - HEADER_SIZE)
+
+		return cls(filepath, header, table, table_size - (chunks_start - HEADER_SIZE), pages)
+
+
+	def find_page(self, chunk_name: str) -> Optional[int]:
+		return next((i for i, page in enumerate(self.pages) if page.has_chunk(chunk_name)), None)
+
+	def check_table(self):
+		"""Raise XfbinLayoutError unless the chunk table rebuilt from the pages is the one the file has."""
+		if build_chunk_table(self.pages) != self.table:
+			raise XfbinLayoutError(f'The chunk table of {self.filepath} is laid out differently from the one rebuilt from its pages')
+
+	def extract_pages(self, page_indices: List[int], filepath: str):
+		"""Write a standalone XFBIN holding only the given pages, so they can be decoded on their own."""
+		write_pages(self.header, self.table_size_delta, [self.pages[i] for i in page_indices], filepath)
+
+
+def build_chunk_table(pages: List[RawPage]) -> bytes:
+	"""Build a chunk table that covers the given pages, in the order they will be written."""
+	string_tables: Tuple[Dict[bytes, int], Dict[bytes, int], Dict[bytes, int]] = ({}, {}, {})
+	map_table: Dict[ChunkMap, int] = {}
+	references: List[Tuple[int, int]] = []
+	map_indices: List[int] = []
+
+	def add_map(chunk_map: ChunkMap) -> int:
+		if chunk_map not in map_table:
+			for table, value in zip(string_tables, chunk_map):
+				table.setdefault(value, len(table))
+			map_table[chunk_map] = len(map_table)
+		return map_table[chunk_map]
+
+	for page in pages:
+		map_indices.extend(add_map(chunk_map) for chunk_map in page.chunk_maps)
+
+	for page in pages:
+		for name, chunk_map in page.references:
+			map_index = add_map(chunk_map)
+			references.append((string_tables[2].setdefault(name, len(string_tables[2])), map_index))
+
+	strings = [b''.join(value + b'\0' for value in table) for table in string_tables]
+
+	table = bytearray(_TABLE_COUNTS.pack(
+		len(string_tables[0]), len(strings[0]),
+		len(string_tables[1]), len(strings[1]),
+		len(string_tables[2]), len(strings[2]),
+		len(map_table), len(map_table) * 12,
+		len(map_indices), len(references),
+	))
+	for block in strings:
+		table += block
+
+	# The chunk maps are aligned relative to the start of the file
+	table += bytes(_align(HEADER_SIZE + len(table)) - (HEADER_SIZE + len(table)))
+
+	for chunk_type, file_path, chunk_name in map_table:
+		table += struct.pack('>3I', string_tables[0][chunk_type], string_tables[1][file_path], string_tables[2][chunk_name])
+	for reference in references:
+		table += struct.pack('>2I', *reference)
+	table += struct.pack(f'>{len(map_indices)}I', *map_indices)
+
+	return bytes(table)
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, offset: int, size: int):
+	src.seek(offset)
+	while size > 0:
+		block = src.read(min(size, COPY_BLOCK_SIZE))
+		if not block:
+			raise Exception(f'Unexpected end of file while copying page from {src.name}')
+		dst.write(block)
+		size -= len(block)
+
+
+def write_pages(header: bytes, table_size_delta: int, pages: List[RawPage], filepath: str):
+	"""Write the pages into a new XFBIN file, copying every page's bytes from its source file."""
+	table = build_chunk_table(pages)
+	header = bytearray(header)
+	_U32.pack_into(header, TABLE_SIZE_OFFSET, len(table) + table_size_delta)
+
+	sources: Dict[str, BinaryIO] = {}
+	try:
+		with open(filepath, 'wb') as out:
+			out.write(header)
+			out.write(table)
+			for page in pages:
+				if page.source not in sources:
+					sources[page.source] = open(page.source, 'rb')
+				_copy_range(sources[page.source], out, page.offset, page.size)
+	finally:
+		for f in sources.values():
+			f.close()
+
+
+def make_temp_path(filepath: str) -> str:
+	"""Return a new temporary file path next to filepath, so it can be renamed over it atomically."""
+	directory, filename = os.path.split(os.path.abspath(filepath))
+	fd, temp_path = tempfile.mkstemp(prefix=f'.{filename}.', suffix='.tmp', dir=directory)
+	os.close(fd)
+	return temp_path
+
+
+def file_digest(filepath: str) -> bytes:
+	digest = hashlib.blake2b()
+	with open(filepath, 'rb') as f:
+		for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+			digest.update(block)
+	return digest.digest()
+
+
+def write_if_changed(filepath: str, write: Callable[[str], None]) -> bool:
+	"""Call write with a temporary path, then move the result over filepath with an atomic rename.
+
+	If filepath already has the exact same content it is left untouched.
+	Return True if filepath was written.
+	"""
+	temp_path = make_temp_path(filepath)
+	try:
+		write(temp_path)
+
+		if (os.path.isfile(filepath) and os.path.getsize(filepath) == os.path.getsize(temp_path)
+				and file_digest(filepath) == file_digest(temp_path)):
+			os.remove(temp_path)
+			return False
+
+		os.replace(temp_path, filepath)
+		return True
+	except BaseException:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+		raise
+
+
+def splice_pages(filepath: str, new_pages: List[RawPage], page_names: List[str]) -> bool:
+	"""Splice new_pages into the XFBIN at filepath.
+
+	page_names[i] is the chunk name used to find the page that new_pages[i] replaces.
+	Pages without a match are appended. Untouched pages are copied byte for byte and the file is
+	only replaced, through an atomic rename, if its content changed. Return True if it was written.
+	Raise XfbinLayoutError if the target's chunk table cannot be rebuilt exactly, nothing is written then.
+	"""
+	if len(new_pages) != len(page_names):
+		raise Exception(f'Expected {len(page_names)} pages to inject, found {len(new_pages)}')
+
+	target = RawXfbin.read(filepath)
+	target.check_table()
+
+	pages = list(target.pages)
+	for page, name in zip(new_pages, page_names):
+		index = next((i for i, p in enumerate(pages) if p.has_chunk(name)), None)
+		if index is None:
+			pages.append(page)
+		else:
+			pages[index] = page
+
+	return write_if_changed(filepath, lambda temp_path: write_pages(target.header, target.table_size_delta, pages, temp_path))
@@ -0,0 +1,742 @@
+import io
+import numpy as np
+
+from os import remove
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..xfbin.xfbin_lib import *
+
+from .common.anm_snapshot import *
+from .common.export_stats import PageStats
+from .common.fidelity import FidelityReport, TrackSource
+from .common.memory_profiler import StageMemoryProfiler
+from .common.resampler import collapse_constant_tracks, forward_fill, frame_value_array, resample_chunk, simplify_rows
+from .common.coordinate_converter import *
+from .common.track_buffer import EntryBuffer, TrackBuffer, make_entries
+from .common.xfbin_diff import anm_entry_key, struct_reference_key
+from .common.xfbin_pages import RawXfbin, XfbinLayoutError, make_temp_path, splice_pages, write_if_changed
+
+
+class PageStructTable:
+	"""
+	Struct infos and struct references of one page, interned so each (name, type, path) is created once
+	and keeps the index it was first added at.
+	"""
+	def __init__(self):
+		self.struct_infos: List[NuccStructInfo] = []
+		self.struct_references: List[NuccStructReference] = []
+
+		self.info_indices: Dict[Tuple[str, str, str], int] = {}
+		self.reference_indices: Dict[Tuple[str, int], int] = {}
+
+	def info(self, chunk_name: str, chunk_type: str, filepath: str) -> int:
+		key = (chunk_name, chunk_type, filepath)
+		index = self.info_indices.get(key)
+
+		if index is None:
+			index = self.info_indices[key] = len(self.struct_infos)
+			self.struct_infos.append(NuccStructInfo(chunk_name, chunk_type, filepath))
+
+		return index
+
+	def reference(self, name: str, chunk_name: str, chunk_type: str, filepath: str) -> int:
+		key = (name, self.info(chunk_name, chunk_type, filepath))
+		index = self.reference_indices.get(key)
+
+		if index is None:
+			index = self.reference_indices[key] = len(self.struct_references)
+			self.struct_references.append(NuccStructReference(name, self.struct_infos[key[1]]))
+
+		return index
+
+
+class ArmatureReferences:
+	"""Struct reference indices of one armature in its page's PageStructTable."""
+
+	def __init__(self, table: PageStructTable, armature: ArmatureSnapshot):
+		path = armature.chunk_path
+
+		# Infos are added in the page order of the original format: clump, coords, models, materials
+		table.info(armature.name, "nuccChunkClump", path)
+		for bone in armature.bone_names:
+			table.info(bone, "nuccChunkCoord", path)
+		for model in armature.models:
+			table.info(model, "nuccChunkModel", path)
+		for mat in armature.materials:
+			table.info(mat, "nuccChunkMaterial", path)
+
+		self.clump = table.reference(armature.models[0] if armature.models else armature.bone_names[0], armature.name, "nuccChunkClump", path)
+		self.coords = [table.reference(bone, bone, "nuccChunkCoord", path) for bone in armature.bone_names]
+		self.materials = [table.reference(mat, mat, "nuccChunkMaterial", path) for mat in armature.materials]
+		self.models = [table.reference(model, model, "nuccChunkModel", path) for model in armature.models]
+
+		self.bone_material_indices = [*self.coords, *self.materials]
+
+		# Position of each coord and material reference in bone_material_indices, the coord index of its entries
+		self.positions: Dict[int, int] = {}
+		for position, reference in enumerate(self.bone_material_indices):
+			self.positions.setdefault(reference, position)
+
+
+# Largest difference to the sampled fog values that dropping an FCV row may cause
+FCV_TOLERANCE = 1e-4
+
+XFBIN_VERSION = 121
+
+
+def make_xfbin(pages: List[XfbinPage]) -> Xfbin:
+	xfbin = Xfbin()
+	xfbin.version = XFBIN_VERSION
+	xfbin.pages.extend(pages)
+	return xfbin
+
+
+def find_decoded_page(pages: List[XfbinPage], chunk_name: str) -> Optional[int]:
+	return next((i for i, page in enumerate(pages) if any(info.chunk_name == chunk_name for info in page.struct_infos)), None)
+
+
+class AnmXfbinEncoder:
+	"""
+	Build XFBIN pages from chunk snapshots and write them.
+	Never touches bpy, so it can run on a worker thread once the snapshots are taken.
+	"""
+	xfbin: Xfbin
+
+	def __init__(self, filepath: str, inject_to_xfbin: bool, merge_tracks: bool):
+		self.filepath = filepath
+		self.inject_to_xfbin = inject_to_xfbin
+		self.merge_tracks = merge_tracks
+
+		# Chunk table of the target XFBIN, only read when existing pages have to be decoded
+		self.target: Optional[RawXfbin] = None
+
+		# Every page of the target XFBIN, only decoded when its pages cannot be read on their own
+		self.decoded_pages: Optional[List[XfbinPage]] = None
+
+		# Whether the file on disk changed
+		self.written = False
+
+		# Messages for the user, reported by whoever runs the encoder
+		self.warnings: List[str] = []
+
+		# Set when run() fails
+		self.error: Optional[Exception] = None
+
+		# Index of the chunk being encoded
+		self.chunk_index = 0
+
+		# Tracks written to each page, filled by make_anm
+		self.stats: List[PageStats] = []
+
+		# Records memory use at each stage boundary when set
+		self.profiler: Optional[StageMemoryProfiler] = None
+
+		# Collects the reconstruction errors of every track when set
+		self.fidelity: Optional[FidelityReport] = None
+
+		# Target frame rate divided by the frame rate the chunks were read at, 1 keeps the keys as they are
+		self.frame_scale = 1.0
+
+		# Tracks whose keys stay within this of their first key are reduced to a single key when set
+		self.collapse_tolerance: Optional[float] = None
+
+
+	def end_stage(self, name: str):
+		if self.profiler:
+			self.profiler.stage(name)
+
+
+	def convert_track(self, track_index: int, data_path: str, key_format: NuccAnmKeyFormat, frames: Sequence[float], values: np.ndarray,
+					  reference: Optional[ChannelArrays] = None, **params) -> TrackBuffer:
+		"""
+		Encode the keys of a track. reference holds the samples read from the scene on every frame, before the keys
+		were simplified, resampled or collapsed. It is only kept when fidelity is measured, tracks without one are not measured.
+		"""
+		track = TrackBuffer.convert(track_index, data_path, key_format, frames, values, **params)
+		if self.fidelity and reference is not None and len(reference):
+			# References are read at the scene frame rate
+			reference_frames = np.asarray(reference.frames, dtype=np.float64) * self.frame_scale
+			track.source = TrackSource(data_path, reference_frames, forward_fill(np.asarray(reference.values, dtype=np.float64)), params)
+		return track
+
+
+	def create_keyed_track(self, channels: ChannelArrays, data_path: str, key_format: NuccAnmKeyFormat, track_index: int,
+						   reference: Optional[ChannelArrays] = None) -> TrackBuffer:
+		"""
+		Return the track of the sampled frames of a light or ambient property, with the last key written twice.
+		"""
+		track = self.convert_track(track_index, data_path, key_format, channels.frames, forward_fill(channels.values), reference)
+		track.duplicate_last()
+		return track
+
+
+	def create_default_track(self, data_path: str, key_format: NuccAnmKeyFormat, track_index: int, value: Sequence[float]) -> TrackBuffer:
+		return self.convert_track(track_index, data_path, key_format, [0], [list(value)])
+
+
+	def run(self, chunks: List[ChunkSnapshot]):
+		"""
+		Encode and write all chunks, storing any error instead of raising it. Meant as a thread target.
+		"""
+		try:
+			for _ in self.iter_encode(chunks):
+				pass
+		except Exception as e:
+			self.error = e
+
+
+	def iter_encode(self, chunks: List[ChunkSnapshot]) -> Iterator[str]:
+		"""
+		Encode the chunks one page at a time, yielding a description of each finished step.
+		The file is only written in the last step, so closing the generator early cancels the export.
+		"""
+		self.xfbin = make_xfbin([])
+
+		# Chunk names used to find the page each new page replaces when injecting
+		page_names: List[str] = []
+
+		for chunk_index, chunk in enumerate(chunks):
+			self.chunk_index = chunk_index
+
+			# Both change the snapshot in place
+			if self.frame_scale != 1:
+				resample_chunk(chunk, self.frame_scale)
+			if self.collapse_tolerance is not None:
+				collapse_constant_tracks(chunk, self.collapse_tolerance)
+
+			page, nucc_anm = self.make_page(chunk)
+			yield f'{chunk.name} encoding'
+
+			if self.merge_tracks:
+				page = self.merge_page(chunk.name, page, nucc_anm)
+				self.end_stage(f'{chunk.name} merge')
+				yield f'{chunk.name} merge'
+
+			self.xfbin.pages.append(page)
+			page_names.append(chunk.name)
+
+		if self.inject_to_xfbin:
+			self.written = self.write_injected(page_names)
+		else:
+			self.written = write_if_changed(self.filepath, lambda temp_path: write_xfbin(self.xfbin, temp_path))
+
+		self.end_stage('write_xfbin')
+
+
+	def write_injected(self, page_names: List[str]) -> bool:
+		"""
+		Encode only the new pages, then splice them into the target XFBIN.
+		Pages that are not replaced keep their original bytes and are never decoded.
+		Targets whose pages cannot be copied as they are are decoded and written in full instead.
+		Return True if the target file changed.
+		"""
+		pages_filepath = make_temp_path(self.filepath)
+
+		try:
+			write_xfbin(self.xfbin, pages_filepath)
+			return splice_pages(self.filepath, RawXfbin.read(pages_filepath).pages, page_names)
+		except XfbinLayoutError as e:
+			self.warnings.append(f'Could not splice the pages into the target XFBIN, it was decoded and written in full: {e}')
+			return self.write_decoded(page_names)
+		finally:
+			remove(pages_filepath)
+
+
+	def write_decoded(self, page_names: List[str]) -> bool:
+		"""
+		Decode the whole target XFBIN, replace or append the new pages and write it again.
+		"""
+		xfbin = read_xfbin(self.filepath)
+
+		for page, name in zip(self.xfbin.pages, page_names):
+			index = find_decoded_page(xfbin.pages, name)
+			if index is None:
+				xfbin.pages.append(page)
+			else:
+				xfbin.pages[index] = page
+
+		return write_if_changed(self.filepath, lambda temp_path: write_xfbin(xfbin, temp_path))
+
+
+	def make_page(self, chunk: ChunkSnapshot) -> Tuple[XfbinPage, NuccAnm]:
+		page = XfbinPage()
+
+		table = PageStructTable()
+		table.info("", "nuccChunkNull", "")
+
+		armature_references = [ArmatureReferences(table, armature) for armature in chunk.armatures]
+		self.end_stage(f'{chunk.name} struct tables')
+
+		page.struct_infos.extend(table.struct_infos)
+		page.struct_references.extend(table.struct_references)
+
+		for camera in chunk.cameras:
+			nucc_camera = NuccCamera()
+			nucc_camera.struct_info = NuccStructInfo(camera.name, "nuccChunkCamera", camera.path)
+
+			nucc_camera.fov = camera.fov
+			page.structs.append(nucc_camera)
+
+		for lightdirc in chunk.lightdircs:
+			nucc_lightdirc = NuccLightDirc()
+			nucc_lightdirc.struct_info = NuccStructInfo(lightdirc.name, "nuccChunkLightDirc", lightdirc.path)
+
+			nucc_lightdirc.color = list(lightdirc.color)
+			nucc_lightdirc.energy = lightdirc.energy
+			nucc_lightdirc.rotation = list(lightdirc.rotation)
+
+			page.structs.append(nucc_lightdirc)
+
+		for lightpoint in chunk.lightpoints:
+			nucc_lightpoint = NuccLightPoint()
+			nucc_lightpoint.struct_info = NuccStructInfo(lightpoint.name, "nuccChunkLightPoint", lightpoint.path)
+
+			nucc_lightpoint.color = list(lightpoint.color)
+			nucc_lightpoint.energy = lightpoint.energy
+
+			converted_value: List[int] = convert_object_value(0, "location", lightpoint.location).values
+			nucc_lightpoint.location = converted_value
+
+			nucc_lightpoint.radius = lightpoint.radius
+			nucc_lightpoint.cutoff = lightpoint.cutoff
+
+			page.structs.append(nucc_lightpoint)
+
+		if chunk.ambient:
+			nucc_ambient = NuccAmbient()
+			nucc_ambient.struct_info = NuccStructInfo(chunk.name, "nuccChunkAmbient", chunk.path)
+
+			nucc_ambient.color = list(chunk.ambient.color)
+			nucc_ambient.energy = 1.0
+
+			page.structs.append(nucc_ambient)
+
+		if chunk.fog:
+			# create fog binary chunk
+			fog_chunk = NuccBinary()
+			fog_chunk.struct_info = NuccStructInfo(f"{chunk.name}_fog", "nuccChunkBinary", f"{chunk.path[:-4]}_fog.fcv")
+
+			fog_chunk.data = self.make_fog_fcv(chunk.fog)
+
+			page.structs.append(fog_chunk)
+
+		nucc_anm = self.make_anm(chunk, armature_references, table.struct_infos)
+		page.structs.append(nucc_anm)
+
+		return page, nucc_anm
+
+
+	def make_fog_fcv(self, fog: FogSnapshot) -> bytes:
+		"""
+		Return the FCV text of the fog rows, without the rows that linear interpolation already reproduces.
+		"""
+		keep = simplify_rows(fog.rows, FCV_TOLERANCE)
+		frames, rows = fog.frames[keep], fog.rows[keep]
+
+		table = np.empty((len(rows), 8))
+		table[:, 0] = frames
+		table[:, 1] = rows[:, 0] / 100
+		table[:, 2:7] = rows[:, 1:]
+		table[:, 7] = 0
+
+		buffer = io.BytesIO()
+		buffer.write(f"FCURVE_TYPE_FOG,\nFCURVE_INTERPOLATION_LINEAR,\n{len(rows)},\n".encode('utf-8'))
+		np.savetxt(buffer, table, fmt=['%d', *['%.6f'] * 6, '%d'], delimiter=',', newline='\n')
+
+		return buffer.getvalue()
+
+
+	def read_existing_page(self, chunk_name: str) -> Optional[XfbinPage]:
+		"""
+		Decode only the page of the target XFBIN that contains chunk_name.
+		"""
+		if self.decoded_pages is not None:
+			index = find_decoded_page(self.decoded_pages, chunk_name)
+			return None if index is None else self.decoded_pages[index]
+
+		if not self.target:
+			try:
+				self.target = RawXfbin.read(self.filepath)
+			except XfbinLayoutError:
+				self.decoded_pages = read_xfbin(self.filepath).pages
+				return self.read_existing_page(chunk_name)
+
+		page_index = self.target.find_page(chunk_name)
+		if page_index is None:
+			return None
+
+		page_filepath = make_temp_path(self.filepath)
+
+		try:
+			self.target.extract_pages([page_index], page_filepath)
+			return read_xfbin(page_filepath).pages[0]
+		finally:
+			remove(page_filepath)
+
+
+	def merge_page(self, anm_chunk_name: str, page: XfbinPage, nucc_anm: NuccAnm) -> XfbinPage:
+		"""
+		Merge the tracks of nucc_anm into the existing animation with the same name.
+		Entries are matched by (clump, coord, entry_format) and tracks by track index, everything else
+		in the existing page is kept as is. Return page unchanged if the target has no such animation.
+		"""
+		existing_page = self.read_existing_page(anm_chunk_name)
+		self.end_stage(f'{anm_chunk_name} read_xfbin')
+
+		if not existing_page:
+			return page
+
+		existing_anm: NuccAnm = next((struct for struct in existing_page.structs
+									  if isinstance(struct, NuccAnm) and struct.struct_info.chunk_name == anm_chunk_name), None)
+		if not existing_anm:
+			return page
+
+		existing_references = [struct_reference_key(reference) for reference in existing_page.struct_references]
+		existing_entries = {anm_entry_key(entry, existing_anm, existing_page.struct_references): entry for entry in existing_anm.entries}
+
+		def find_coord(clump_key, coord_key) -> Optional[AnmCoord]:
+			for clump_index, clump in enumerate(existing_anm.clumps):
+				if existing_references[clump.clump_index] != clump_key:
+					continue
+
+				for coord_index, reference_index in enumerate(clump.bone_material_indices):
+					if existing_references[reference_index] == coord_key:
+						return AnmCoord(clump_index, coord_index)
+			return None
+
+		for entry in nucc_anm.entries:
+			key = anm_entry_key(entry, nucc_anm, page.struct_references)
+			existing_entry = existing_entries.get(key)
+
+			if not existing_entry:
+				coord = find_coord(*key[:2]) if key[0] else None
+				if not coord:
+					self.warnings.append(f'Could not merge entry {key[1]} into {anm_chunk_name}, it does not exist in the target XFBIN')
+					continue
+
+				entry.coord = coord
+				existing_anm.entries.append(entry)
+				existing_entries[key] = entry
+				continue
+
+			tracks = {header.track_index: (header, track) for header, track in zip(existing_entry.track_headers, existing_entry.tracks)}
+			tracks.update({header.track_index: (header, track) for header, track in zip(entry.track_headers, entry.tracks)})
+
+			existing_entry.track_headers = [tracks[index][0] for index in sorted(tracks)]
+			existing_entry.tracks = [tracks[index][1] for index in sorted(tracks)]
+
+		existing_anm.frame_count = max(existing_anm.frame_count, nucc_anm.frame_count)
+
+		return existing_page
+
+
+	def make_anm(self, chunk: ChunkSnapshot, armature_references: List[ArmatureReferences], struct_infos: List[NuccStructInfo]) -> NuccAnm:
+		"""
+		Return NuccAnm object from ChunkSnapshot object.
+		"""
+
+		anm = NuccAnm()
+		anm.struct_info = NuccStructInfo(chunk.name, "nuccChunkAnm", chunk.path)
+
+		anm.is_looped = chunk.is_looped
+		anm.frame_count = chunk.frame_count * 100
+
+		anm.clumps.extend(self.make_anm_clump(armature_references))
+		anm.coord_parents.extend(self.make_anm_coords(chunk.armatures))
+
+		# Armatures that share a clump reference write their entries to the first clump using it
+		clump_indices: Dict[int, int] = {}
+		for clump_index, references in enumerate(armature_references):
+			clump_indices.setdefault(references.clump, clump_index)
+
+		# Keys are kept as arrays until every entry is encoded, then converted one track at a time
+		entries: List[EntryBuffer] = []
+
+		for armature, references in zip(chunk.armatures, armature_references):
+			clump_index = clump_indices[references.clump]
+			positions = armature_references[clump_index].positions
+			entries.extend(self.make_coord_entries(armature, references, clump_index, positions))
+			self.end_stage(f'{chunk.name} {armature.name} coord entries')
+
+			entries.extend(self.make_material_entries(armature, references, clump_index, positions))
+			self.end_stage(f'{chunk.name} {armature.name} material entries')
+
+		for camera in chunk.cameras:
+			entries.extend(self.make_camera_entries(camera))
+			anm.other_entries_indices.append(len(struct_infos) + camera.other_index)
+		self.end_stage(f'{chunk.name} camera entries')
+
+		for lightdirc in chunk.lightdircs:
+			entries.extend(self.make_lightdirc_entries(lightdirc))
+			anm.other_entries_indices.append(len(struct_infos) + lightdirc.other_index)
+
+		for lightpoint in chunk.lightpoints:
+			entries.extend(self.make_lightpoint_entries(lightpoint))
+			anm.other_entries_indices.append(len(struct_infos) + lightpoint.other_index)
+
+		if chunk.ambient:
+			entries.extend(self.make_ambient_entries(chunk.ambient))
+			anm.other_entries_indices.append(len(struct_infos) + chunk.ambient.other_index)
+		self.end_stage(f'{chunk.name} light entries')
+
+		page_stats = PageStats(chunk.name, chunk.frame_count)
+		page_stats.entries.extend(entry.make_stats() for entry in entries)
+		self.stats.append(page_stats)
+
+		if self.fidelity:
+			self.fidelity.pages[chunk.name] = [fidelity for entry in entries for fidelity in entry.measure()]
+			self.end_stage(f'{chunk.name} fidelity')
+
+		anm.entries.extend(make_entries(entries))
+		self.end_stage(f'{chunk.name} page assembly')
+
+		return anm
+
+	def make_anm_clump(self, armature_references: List[ArmatureReferences]) -> List[AnmClump]:
+		clumps: List[AnmClump] = list()
+
+		for references in armature_references:
+			clump = AnmClump()
+
+			clump.clump_index = references.clump
+			clump.bone_material_indices = list(references.bone_material_indices)
+			clump.model_indices = list(references.models)
+
+			clumps.append(clump)
+
+		return clumps
+
+
+	def make_anm_coords(self, anm_armatures: List[ArmatureSnapshot]) -> List[CoordParent]:
+		"""
+		Return list of CoordParent objects from ArmatureSnapshot object.
+		"""
+		coord_parents: List[CoordParent] = list()
+
+		# Get list of child bones for each bone in armature
+		for armature_index, anm_armature in enumerate(anm_armatures):
+			for bone_index, parent_index in enumerate(anm_armature.bone_parents):
+				if parent_index >= 0:
+					parent = AnmCoord(armature_index, parent_index)
+					child = AnmCoord(armature_index, bone_index)
+
+					coord_parents.append(CoordParent(parent, child))
+
+		return coord_parents
+
+
+	def make_coord_entries(self, anm_armature: ArmatureSnapshot, references: ArmatureReferences, clump_index: int, positions: Dict[int, int]) -> List[EntryBuffer]:
+		def create_track(track_index, data_path, frame_values: FrameValues, linear_format, fixed_format, reference, **params) -> TrackBuffer:
+			# A single key is written as a fixed value, more keys as a linear track closed by a null key
+			is_multiple = len(frame_values) > 1
+			frames, values = frame_value_array(frame_values)
+
+			track = self.convert_track(track_index, data_path, linear_format if is_multiple else fixed_format, frames, values, reference, **params)
+			if is_multiple:
+				track.append_null_key()
+			return track
+
+		entries: List[EntryBuffer] = []
+
+		bone_references = dict(zip(anm_armature.bone_names, references.coords))
+
+		for coord in anm_armature.coords:
+			coord_index = positions[bone_references[coord.bone_name]]
+
+			entry = EntryBuffer(AnmCoord(clump_index, coord_index), EntryFormat.Coord, coord.bone_name, anm_armature.name)
+
+			rest = dict(rest_location=np.asarray(coord.rest_location), rest_rotation=np.asarray(coord.rest_rotation),
+						rest_scale=np.asarray(coord.rest_scale))
+
+			entry.tracks.append(create_track(0, 'pose.bones.location', coord.location,
+											 NuccAnmKeyFormat.Vector3Linear, NuccAnmKeyFormat.Vector3Fixed, coord.references.get(0), **rest))
+
+			if coord.rotation_mode == 'rotation_quaternion':
+				frames, values = frame_value_array(coord.rotation)
+				track = self.convert_track(1, 'pose.bones.rotation_quaternion', NuccAnmKeyFormat.QuaternionLinear, frames, values,
+										   coord.references.get(1), **rest)
+				track.append_null_key()
+				entry.tracks.append(track)
+
+			elif coord.rotation_mode == 'rotation_euler':
+				frames, values = frame_value_array(coord.rotation)
+				entry.tracks.append(self.convert_track(1, 'pose.bones.rotation_euler', NuccAnmKeyFormat.EulerXYZFixed, frames, values, coord.references.get(1)))
+
+			if coord.scale is not None:
+				entry.tracks.append(create_track(2, 'pose.bones.scale', coord.scale,
+												 NuccAnmKeyFormat.Vector3Linear, NuccAnmKeyFormat.Vector3Fixed, coord.references.get(2), **rest))
+
+			if coord.opacity is not None:
+				frames, values = zip(*coord.opacity)
+				track = self.convert_track(3, 'opacity', NuccAnmKeyFormat.FloatLinear, frames, np.array(values)[:, None], coord.references.get(3))
+				track.append_null_key()
+			else:
+				track = self.convert_track(3, 'material', NuccAnmKeyFormat.FloatFixed, [0], [[1]])
+			entry.tracks.append(track)
+
+			entries.append(entry)
+
+		return entries
+
+
+	def make_material_entries(self, anm_armature: ArmatureSnapshot, references: ArmatureReferences, clump_index: int, positions: Dict[int, int]) -> List[EntryBuffer]:
+		entries: List[EntryBuffer] = list()
+
+		material_references = dict(zip(anm_armature.materials, references.materials))
+
+		for material in anm_armature.material_entries:
+			material_index = positions[material_references[material.name]]
+
+			entry = EntryBuffer(AnmCoord(clump_index, material_index), EntryFormat.Material, material.name, anm_armature.name)
+
+			for track_index, key_format, values in material.tracks:
+				key_format = getattr(NuccAnmKeyFormat, key_format)
+
+				# Fixed tracks only keep their first value
+				if key_format == NuccAnmKeyFormat.FloatFixed:
+					values = values[:1]
+
+				entry.tracks.append(self.convert_track(track_index, 'material', key_format, np.arange(len(values)), values[:, None],
+													   material.references.get(track_index)))
+
+			entries.append(entry)
+
+		return entries
+
+
+	def make_camera_entries(self, camera: CameraSnapshot) -> List[EntryBuffer]:
+		entries: List[EntryBuffer] = []
+
+		if not camera.animated:
+			return entries
+
+		sensor_width = camera.sensor_width
+
+		def create_track(channels: ChannelArrays, data_path, key_format, track_index, reference) -> TrackBuffer:
+			track = self.convert_track(track_index, data_path, key_format, channels.frames, forward_fill(channels.values), reference,
+									   sensor_width=sensor_width)
+			track.append_null_key()
+			return track
+
+		entry = EntryBuffer(AnmCoord(-1, camera.other_index), EntryFormat.Camera, camera.name)
+
+		references = camera.references
+
+		if len(camera.translations) > 1:
+			entry.tracks.append(create_track(camera.translations, "location", NuccAnmKeyFormat.Vector3Linear, 0, references.get(0)))
+
+		if len(camera.quaternions) > 1:
+			entry.tracks.append(create_track(camera.quaternions, "rotation_quaternion", NuccAnmKeyFormat.QuaternionLinear, 1, references.get(1)))
+
+		if len(camera.eulers) > 1:
+			# The rotation reference is read from the quaternion curves when the camera has both
+			reference = references.get(1) if len(camera.quaternions) <= 1 else None
+			entry.tracks.append(create_track(camera.eulers, "rotation_euler", NuccAnmKeyFormat.QuaternionLinear, 1, reference))
+
+		if len(camera.lenses) > 1:
+			entry.tracks.append(create_track(camera.lenses, "fov", NuccAnmKeyFormat.FloatLinear, 2, references.get(2)))
+
+		entries.append(entry)
+		return entries
+
+
+	def make_lightdirc_entries(self, lightdirc: LightDircSnapshot) -> List[EntryBuffer]:
+		entries: List[EntryBuffer] = []
+
+		if not lightdirc.animated:
+			return entries
+
+		entry = EntryBuffer(AnmCoord(-1, lightdirc.other_index), EntryFormat.LightDirc, lightdirc.name)
+
+		if len(lightdirc.colors) >= 1:
+			track = self.create_keyed_track(lightdirc.colors, "xfbin_scene.lightdir_color", NuccAnmKeyFormat.ColorRGBTable, 0, lightdirc.references.get(0))
+		else:
+			# Repeat the default value on every frame
+			frame_count = int(lightdirc.frame_end)
+			track = self.convert_track(0, "xfbin_scene.lightdir_color", NuccAnmKeyFormat.ColorRGBTable, np.arange(frame_count),
+										np.tile(lightdirc.default_color, (frame_count, 1)))
+		track.pad(4)
+		entry.tracks.append(track)
+
+		if len(lightdirc.energies) >= 1:
+			entry.tracks.append(self.create_keyed_track(lightdirc.energies, "xfbin_scene.lightdir_intensity", NuccAnmKeyFormat.FloatTable, 1, lightdirc.references.get(1)))
+		else:
+			entry.tracks.append(self.create_default_track("xfbin_scene.lightdir_intensity", NuccAnmKeyFormat.FloatFixed, 1, [lightdirc.default_energy]))
+
+		if len(lightdirc.rotations_quat) >= 1:
+			entry.tracks.append(self.create_keyed_track(lightdirc.rotations_quat, "rotation_quaternion", NuccAnmKeyFormat.QuaternionShortTable, 2, lightdirc.references.get(2)))
+		elif len(lightdirc.rotations_euler) >= 1:
+			entry.tracks.append(self.create_keyed_track(lightdirc.rotations_euler, "rotation_euler", NuccAnmKeyFormat.QuaternionShortTable, 2, lightdirc.references.get(2)))
+		else:
+			entry.tracks.append(self.create_default_track("xfbin_scene.lightdir_rotation", NuccAnmKeyFormat.EulerXYZFixed, 2, lightdirc.default_euler))
+
+		entries.append(entry)
+		return entries
+
+
+	def make_lightpoint_entries(self, lightpoint: LightPointSnapshot) -> List[EntryBuffer]:
+		entries: List[EntryBuffer] = []
+
+		if not lightpoint.animated:
+			return entries
+
+		entry = EntryBuffer(AnmCoord(-1, lightpoint.other_index), EntryFormat.LightPoint, lightpoint.name)
+
+		if len(lightpoint.colors) >= 1:
+			track = self.create_keyed_track(lightpoint.colors, "xfbin_scene.lightpoint_color0", NuccAnmKeyFormat.ColorRGBTable, 0, lightpoint.references.get(0))
+			track.pad(4)
+			entry.tracks.append(track)
+		else:
+			entry.tracks.append(self.create_default_track("xfbin_scene.lightpoint_color0", NuccAnmKeyFormat.ColorRGBTable, 0, lightpoint.default_color))
+
+		if len(lightpoint.intensities) >= 1:
+			entry.tracks.append(self.create_keyed_track(lightpoint.intensities, "xfbin_scene.lightpoint_intensity0", NuccAnmKeyFormat.FloatTable, 1, lightpoint.references.get(1)))
+		else:
+			entry.tracks.append(self.create_default_track("xfbin_scene.lightpoint_intensity0", NuccAnmKeyFormat.FloatFixed, 1, [lightpoint.default_energy]))
+
+		if len(lightpoint.locations) >= 1:
+			entry.tracks.append(self.create_keyed_track(lightpoint.locations, "location", NuccAnmKeyFormat.Vector3Table, 2, lightpoint.references.get(2)))
+		else:
+			entry.tracks.append(self.create_default_track("location", NuccAnmKeyFormat.Vector3Fixed, 2, lightpoint.default_location))
+
+		if len(lightpoint.ranges) >= 1:
+			entry.tracks.append(self.create_keyed_track(lightpoint.ranges, "xfbin_scene.lightpoint_range0", NuccAnmKeyFormat.FloatTable, 4, lightpoint.references.get(4)))
+		else:
+			entry.tracks.append(self.create_default_track("xfbin_scene.lightpoint_range0", NuccAnmKeyFormat.FloatFixed, 4, [lightpoint.default_range]))
+
+		if len(lightpoint.attenuations) >= 1:
+			entry.tracks.append(self.create_keyed_track(lightpoint.attenuations, "xfbin_scene.lightpoint_attenuation0", NuccAnmKeyFormat.FloatTable, 3, lightpoint.references.get(3)))
+		else:
+			entry.tracks.append(self.create_default_track("xfbin_scene.lightpoint_attenuation0", NuccAnmKeyFormat.FloatFixed, 3, [lightpoint.default_attenuation]))
+
+		entries.append(entry)
+		return entries
+
+
+	def make_ambient_entries(self, ambient: AmbientSnapshot) -> List[EntryBuffer]:
+		entries: List[EntryBuffer] = []
+
+		if not ambient.animated:
+			return entries
+
+		frame_end = ambient.frame_end
+
+		entry = EntryBuffer(AnmCoord(-1, ambient.other_index), EntryFormat.Ambient, 'ambient')
+
+		frames = np.arange(int(frame_end))
+
+		if len(ambient.colors) >= 1:
+			colors = ambient.colors
+		else:
+			# Repeat the default value on every frame
+			colors = ChannelArrays(frames, np.tile(ambient.color, (len(frames), 1)))
+
+		track = self.create_keyed_track(colors, "xfbin_scene.ambient_color", NuccAnmKeyFormat.ColorRGBTable, 0, ambient.references.get(0))
+		track.pad(4)
+		entry.tracks.append(track)
+
+		intensities = ChannelArrays(frames, np.ones((len(frames), 1)))
+		entry.tracks.append(self.create_keyed_track(intensities, "xfbin_scene.ambient_intensity", NuccAnmKeyFormat.FloatTable, 1))
+
+		entries.append(entry)
+		return entries
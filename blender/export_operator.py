@@ -0,0 +1,477 @@
+import bpy
+
+
+from functools import partial
+from threading import Thread
+from time import perf_counter
+
+from bpy_extras.io_utils import ExportHelper
+from bpy.app.handlers import persistent
+from bpy.props import (EnumProperty, StringProperty, BoolProperty, CollectionProperty, FloatProperty, IntProperty)
+from bpy.types import Operator, PropertyGroup
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from .common.helpers import XFBIN_ANMS_OBJ
+
+if TYPE_CHECKING:
+	from .exporter import AnmXfbinExporter
+
+
+# Only the operator shell and the menu entry are loaded when the addon is registered.
+# The exporter, the XFBIN library and the conversion modules are imported the first time an export runs.
+
+# Seconds of export work done per timer event in modal mode. Blender only redraws
+# between events, so a larger budget keeps throughput close to a blocking export.
+MODAL_TIME_BUDGET = 0.2
+MODAL_TIMER_STEP = 0.01
+
+# Enum items of the exportable collections, rebuilt on the next redraw after collections or objects change.
+# Blender needs a reference to the items returned by an enum callback, the cache keeps it alive.
+collection_items: Optional[List[Tuple[str, str, str]]] = None
+
+# Owner of the msgbus subscriptions, used to clear them
+msgbus_owner = object()
+
+
+def get_collection_items() -> List[Tuple[str, str, str]]:
+	"""
+	Return the enum items of the collections that contain an XFBIN Animations object, sorted by name.
+	"""
+	global collection_items
+
+	if collection_items is None:
+		collection_items = [(c.name, c.name, '') for c in sorted(bpy.data.collections, key=lambda c: c.name)
+							if any(obj.name.startswith(XFBIN_ANMS_OBJ) for obj in c.objects)]
+
+	return collection_items
+
+
+def invalidate_collection_items(*args):
+	global collection_items
+	collection_items = None
+
+
+@persistent
+def collections_updated(scene, depsgraph):
+	# Linking, unlinking, adding and removing objects and collections all tag the collections
+	if depsgraph.id_type_updated('COLLECTION'):
+		invalidate_collection_items()
+
+
+def subscribe_renames():
+	for key in ((bpy.types.Collection, 'name'), (bpy.types.Object, 'name')):
+		bpy.msgbus.subscribe_rna(key=key, owner=msgbus_owner, args=(), notify=invalidate_collection_items)
+
+
+@persistent
+def file_loaded(*args):
+	# Loading a file drops the msgbus subscriptions and replaces all collections
+	invalidate_collection_items()
+	subscribe_renames()
+
+
+def register_collection_cache():
+	subscribe_renames()
+	bpy.app.handlers.depsgraph_update_post.append(collections_updated)
+	bpy.app.handlers.load_post.append(file_loaded)
+
+
+def unregister_collection_cache():
+	bpy.msgbus.clear_by_owner(msgbus_owner)
+	bpy.app.handlers.depsgraph_update_post.remove(collections_updated)
+	bpy.app.handlers.load_post.remove(file_loaded)
+	invalidate_collection_items()
+
+
+class ExportCollectionItem(PropertyGroup):
+	"""An exportable collection in the multiple collections list, name is the collection name."""
+
+	selected: BoolProperty(name='Export', default=False)
+
+
+class ExportAnmXfbin(Operator, ExportHelper):
+	"""Export current collection as XFBIN file"""
+	bl_idname = 'export_anm_scene.xfbin'
+	bl_label = 'Export animation XFBIN'
+
+	filename_ext = '.xfbin'
+
+	filter_glob: StringProperty(default='*.xfbin', options={'HIDDEN'})
+
+	def collection_callback(self, context):
+		return get_collection_items()
+	
+	def collection_update(self, context):
+		pass
+
+
+	collection: EnumProperty(
+		items=collection_callback,
+		name='Collection',
+		description='The collection to be exported. All animations in the collection will be converted and put in the same XFBIN.\n'
+		'Only collections with an XFBIN Animations object are listed',
+	)
+
+	multiple: BoolProperty(
+		name='Multiple Collections',
+		description='If True, will export every checked collection into the same XFBIN in one run.\n'
+		'The target is read and written once, and armatures used by several collections are only read once',
+		default=False,
+	)
+
+	collections: CollectionProperty(type=ExportCollectionItem, options={'HIDDEN'})
+
+	inject_to_xfbin: BoolProperty(
+		name='Inject to an existing XFBIN',
+		description='If True, will add (or overwrite) the exportable animations as pages in the selected XFBIN.\n'
+		'If False, will create a new XFBIN and overwrite the old file if it exists.\n\n'
+		'NOTE: If True, the selected path has to be an XFBIN file that already exists, and that file will be overwritten',
+		default=True,
+	)
+
+	"""inject_to_clump: BoolProperty(
+		name='Inject to an existing Clump',
+		description='If True, will add (or overwrite) the Clump animation(s) in the selected ANM in the XFBIN\n'
+		'If False, will create a new Clump and overwrite the old file if it exists.\n\n'
+		'NOTE: "Inject to existing XFBIN" has to be enabled for this option to take effect\n',					
+		default=True,
+	)"""
+
+	merge_tracks: BoolProperty(
+		name='Merge Tracks',
+		description='If True, will only overwrite the exported tracks of matching entries in the existing animation, and keep everything else.\n'
+		'If False, will replace the whole animation page.\n\n'
+		'NOTE: "Inject to an existing XFBIN" has to be enabled for this option to take effect',
+		default=False,
+	)
+
+	selected_only: BoolProperty(
+		name='Only Selected',
+		description='If True, will only export the selected bones and the materials of the selected objects.\n\n'
+		'NOTE: "Merge Tracks" has to be enabled for this option to take effect',
+		default=False,
+	)
+	
+	export_material_animations: BoolProperty(
+		name='Export Material Animations',
+		description='If True, will export material animations from the selected collection',
+		default=True,
+	)
+ 
+	bake_constraints: BoolProperty(
+		name='Bake Constraints',
+		description='If True, bones driven by constraints, IK or drivers, and cameras that are parented or constrained, are sampled on every frame instead of exporting their F-Curve keys.\n'
+		'Bones that need it are detected automatically, the scene is only stepped through when there are any.\n\n'
+		'NOTE: Sampling changes the current frame and the active actions of the armatures while exporting. Both are restored afterwards',
+		default=False,
+	)
+ 
+	export_ambient: BoolProperty(
+		name='Export Ambient',
+		description='If True, will export ambient data from XFBIN Scene Manager',
+		default=False,
+	)
+ 
+	export_fog: BoolProperty(
+		name='Export Fog',
+		description='If True, will export fog data from XFBIN Scene Manager',
+		default=False,
+	)
+
+	adaptive_sampling: BoolProperty(
+		name='Adaptive Sampling',
+		description='If True, will add keys between the keyframes of bone location, rotation and scale curves where linear interpolation '
+		'drifts from the curve by more than the sampling tolerance, so Bezier easing is kept without baking every frame',
+		default=False,
+	)
+
+	sampling_tolerance: FloatProperty(
+		name='Tolerance',
+		description='Largest difference allowed between a curve and the linear interpolation of its exported keys',
+		default=0.001,
+		min=0.00001,
+		soft_max=0.1,
+		precision=5,
+	)
+
+	resample: BoolProperty(
+		name='Resample',
+		description='If True, will move every key to the target frame rate, interpolating the values at their new frames '
+		'(slerp for rotations). The frame count of each animation is scaled with it',
+		default=False,
+	)
+
+	target_fps: IntProperty(
+		name='Target FPS',
+		description='Frame rate the game plays the animation at',
+		default=30,
+		min=1,
+		max=240,
+	)
+
+	collapse_constant: BoolProperty(
+		name='Collapse Constant Tracks',
+		description='If True, bone and camera tracks whose keys never change are reduced to a single key',
+		default=False,
+	)
+
+	export_mode: EnumProperty(
+		items=[
+			('BLOCKING', 'Blocking', 'Export in one go, Blender is unresponsive until the export is done'),
+			('MODAL', 'Modal', 'Export step by step while showing progress in the status bar, press Esc to cancel'),
+			('BACKGROUND', 'Background', 'Read the scene, then encode and write the file on a separate thread while Blender stays responsive'),
+		],
+		name='Export Mode',
+		description='How the export is run',
+		default='BLOCKING',
+	)
+
+	dry_run: BoolProperty(
+		name='Dry Run',
+		description='If True, will only predict the keys, size and time of the export from the F-Curve counts and frame ranges, '
+		'and flag chunks with runaway curve ranges. Nothing is written',
+		default=False,
+	)
+
+	write_stats: BoolProperty(
+		name='Export Statistics',
+		description='If True, will show the entries, tracks, keys and estimated bytes written per page, entry format, clump and entry.\n'
+		'The full report is written next to the exported file as .stats.json',
+		default=False,
+	)
+
+	verify_fidelity: BoolProperty(
+		name='Verify Fidelity',
+		description='If True, will reconstruct every track the way the game plays it and compare it to the scene values.\n'
+		'Max and RMS errors per bone and channel are written next to the exported file as .fidelity.json, '
+		'tracks over their tolerance are reported as warnings',
+		default=False,
+	)
+
+	save_snapshot: BoolProperty(
+		name='Save Snapshot Cache',
+		description='If True, will also save everything read from the scene next to the exported file as .snapshot.npz.\n'
+		'scripts/reencode.py encodes it again with other settings, without Blender',
+		default=False,
+	)
+
+	profile_memory: BoolProperty(
+		name='Profile Memory',
+		description='If True, will record Python allocations and process memory at each export stage.\n'
+		'The report is written next to the exported file as .memory.json. Exporting is slower while profiling',
+		default=False,
+	)
+
+	def draw(self, context):
+		layout = self.layout
+
+		layout.prop(self, 'multiple')
+
+		if self.multiple:
+			layout.label(text='Select the collections to export:')
+			box = layout.box()
+			for item in self.collections:
+				box.prop(item, 'selected', text=item.name)
+		else:
+			layout.label(text='Select a collection to export:')
+			layout.prop(self, 'collection', text='')
+
+		if self.get_collection_names():
+			inject_row = layout.row()
+			inject_row.prop(self, 'inject_to_xfbin')
+			#inject_row.prop(self, 'inject_to_clump')
+			if self.inject_to_xfbin:
+				merge_row = layout.row()
+				merge_row.prop(self, 'merge_tracks')
+				if self.merge_tracks:
+					merge_row.prop(self, 'selected_only')
+			row = layout.row()
+			row.prop(self, 'export_material_animations')
+			row.prop(self, 'bake_constraints')
+			row = layout.row()
+			row.prop(self, 'export_fog')
+			row.prop(self, 'export_ambient')
+			row = layout.row()
+			row.prop(self, 'adaptive_sampling')
+			if self.adaptive_sampling:
+				row.prop(self, 'sampling_tolerance')
+			row = layout.row()
+			row.prop(self, 'resample')
+			if self.resample:
+				row.prop(self, 'target_fps')
+			layout.prop(self, 'collapse_constant')
+			layout.prop(self, 'export_mode')
+			row = layout.row()
+			row.prop(self, 'write_stats')
+			row.prop(self, 'profile_memory')
+			row = layout.row()
+			row.prop(self, 'verify_fidelity')
+			row.prop(self, 'save_snapshot')
+			layout.prop(self, 'dry_run')
+		
+
+	def invoke(self, context, event):
+		# Preselect the active collection when it can be exported
+		if context.collection and any(item[0] == context.collection.name for item in get_collection_items()):
+			self.collection = context.collection.name
+
+		self.collections.clear()
+		for name, _, _ in get_collection_items():
+			item = self.collections.add()
+			item.name = name
+			item.selected = name == self.collection
+
+		return super().invoke(context, event)
+
+	def execute(self, context):
+		from .exporter import AnmXfbinExporter, background_exports
+
+		if not self.get_collection_names():
+			self.report({'ERROR'}, f'No collection with an {XFBIN_ANMS_OBJ} object to export')
+			return {'CANCELLED'}
+
+		if self.filepath in background_exports:
+			self.report({'ERROR'}, f'A background export to {self.filepath} is still running')
+			return {'CANCELLED'}
+
+		if self.dry_run:
+			return self.estimate(context)
+
+		if self.export_mode == 'MODAL':
+			return self.start_modal(context)
+
+		if self.export_mode == 'BACKGROUND':
+			return self.start_background(context)
+
+		start_time = perf_counter()
+		exporter = AnmXfbinExporter(self, self.filepath, self.get_export_settings())
+		exporter.export_collection(context)
+
+		self.report_finished(exporter, perf_counter() - start_time)
+		return {'FINISHED'}
+
+	def get_collection_names(self) -> List[str]:
+		if self.multiple:
+			return [item.name for item in self.collections if item.selected]
+		return [self.collection] if self.collection else []
+
+	def get_export_settings(self) -> dict:
+		return {**self.as_keywords(ignore=('filter_glob', 'collections')), 'collections': self.get_collection_names()}
+
+	def estimate(self, context):
+		from .exporter import AnmXfbinExporter, show_lines
+
+		exporter = AnmXfbinExporter(self, self.filepath, self.get_export_settings())
+		try:
+			estimate = exporter.estimate_export()
+		except Exception as e:
+			self.report({'ERROR'}, f'Failed estimating {exporter.name}: {e}')
+			return {'CANCELLED'}
+
+		lines = estimate.summary()
+		for line in lines:
+			self.report({'INFO'}, line)
+		for warning in estimate.warnings:
+			self.report({'WARNING'}, warning)
+
+		show_lines(f'Dry run of {exporter.name}', lines + estimate.warnings)
+		return {'FINISHED'}
+
+	def report_finished(self, exporter: 'AnmXfbinExporter', elapsed: float):
+		from .exporter import finished_message
+
+		self.report({'INFO'}, finished_message(exporter.name, exporter.written, elapsed))
+
+	def start_background(self, context):
+		from .exporter import AnmXfbinExporter, BACKGROUND_POLL_INTERVAL, background_exports, poll_background_export
+
+		start_time = perf_counter()
+		exporter = AnmXfbinExporter(self, self.filepath, self.get_export_settings())
+
+		# Everything that touches bpy happens here, the thread only gets the snapshots
+		exporter.check_target()
+		exporter.start_profiler()
+		try:
+			for _ in exporter.iter_profiled(exporter.iter_snapshot(context)):
+				pass
+		except Exception as e:
+			if exporter.profiler:
+				exporter.finish_profiler(exporter.profiler, exporter.filepath)
+			self.report({'ERROR'}, f'Failed exporting {exporter.name}: {e}')
+			return {'CANCELLED'}
+
+		encoder = exporter.make_encoder()
+		thread = Thread(target=encoder.run, args=(exporter.chunks,), name=f'Export {exporter.name}', daemon=True)
+
+		background_exports.add(encoder.filepath)
+		thread.start()
+
+		bpy.app.timers.register(partial(poll_background_export, exporter.name, encoder, thread, start_time, exporter.write_stats),
+								first_interval=BACKGROUND_POLL_INTERVAL)
+
+		self.report({'INFO'}, f'Writing {exporter.name} in the background')
+		return {'FINISHED'}
+
+	def start_modal(self, context):
+		from .exporter import AnmXfbinExporter
+
+		self.exporter = AnmXfbinExporter(self, self.filepath, self.get_export_settings())
+		self.export_steps = self.exporter.iter_export(context)
+		self.steps_done = 0
+		self.last_step = ''
+		self.steps_total = self.exporter.count_export_steps()
+		self.start_time = perf_counter()
+
+		wm = context.window_manager
+		wm.progress_begin(0, self.steps_total)
+		self.timer = wm.event_timer_add(MODAL_TIMER_STEP, window=context.window)
+		wm.modal_handler_add(self)
+
+		return {'RUNNING_MODAL'}
+
+	def modal(self, context, event):
+		if event.type == 'ESC':
+			# Nothing is written before the last step, so dropping the generator leaves the target untouched
+			self.export_steps.close()
+			self.finish_modal(context)
+			self.report({'WARNING'}, f'Cancelled exporting {self.exporter.name}, nothing was written')
+			return {'CANCELLED'}
+
+		if event.type != 'TIMER' or event.timer != self.timer:
+			return {'PASS_THROUGH'}
+
+		deadline = perf_counter() + MODAL_TIME_BUDGET
+
+		try:
+			while perf_counter() < deadline:
+				self.last_step = next(self.export_steps)
+				self.steps_done += 1
+		except StopIteration:
+			self.finish_modal(context)
+			self.report_finished(self.exporter, perf_counter() - self.start_time)
+			return {'FINISHED'}
+		except Exception as e:
+			self.finish_modal(context)
+			self.report({'ERROR'}, f'Failed exporting {self.exporter.name}: {e}')
+			return {'CANCELLED'}
+
+		done = min(self.steps_done, self.steps_total)
+		elapsed = perf_counter() - self.start_time
+		eta = elapsed / done * (self.steps_total - done) if done else 0
+
+		context.window_manager.progress_update(done)
+		context.workspace.status_text_set(
+			f'Exporting {self.exporter.name}: chunk {self.exporter.chunk_index + 1}/{self.exporter.chunk_count}, '
+			f'{self.last_step} ({done}/{self.steps_total}), ETA {eta:.0f}s. Press Esc to cancel'
+		)
+		return {'RUNNING_MODAL'}
+
+	def finish_modal(self, context):
+		wm = context.window_manager
+		wm.event_timer_remove(self.timer)
+		wm.progress_end()
+		context.workspace.status_text_set(None)
+
+
+def menu_export(self, context):
+	self.layout.operator(ExportAnmXfbin.bl_idname, text='XFBIN Animation Container (.xfbin)')
@@ -1,323 +1,306 @@
 import bpy
+import numpy as np
 
 
 from os import path
 from collections import defaultdict
-from typing import Dict, List
+from threading import Thread
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
-from bpy_extras.io_utils import ExportHelper
-from bpy.props import (EnumProperty, StringProperty, BoolProperty)
-from bpy.types import Operator, Bone, ActionGroup, FCurve
+from bpy.types import Action, Operator, FCurve
 
 
-from ..xfbin.xfbin_lib import *
-
 from .common.helpers import *
 from .common.bone_props import *
 from .common.armature_props import *
+from .common.anm_snapshot import *
 from .common.coordinate_converter import *
-from cProfile import Profile
-import pstats
+from .common.fcurve_sampler import channel_arrays, group_fcurves, keyframe_arrays, sample_channels, sample_fcurve, sample_reference, sample_table
+from .common.pose_baker import BakedBones, bake_scene, get_bones_to_bake, matrices_to_rotations, needs_evaluation
+from .common.export_estimate import ChunkEstimate, ExportEstimate
+from .common.export_stats import ExportStats
+from .common.fidelity import FidelityReport
+from .common.memory_profiler import StageMemoryProfiler
+from .common.resampler import simplify_rows, slice_chunk
+from .common.snapshot_cache import SnapshotCache
+from .encoder import AnmXfbinEncoder
 
 from time import perf_counter
 
-class ExportAnmXfbin(Operator, ExportHelper):
-	"""Export current collection as XFBIN file"""
-	bl_idname = 'export_anm_scene.xfbin'
-	bl_label = 'Export animation XFBIN'
-
-	filename_ext = '.xfbin'
-
-	filter_glob: StringProperty(default='*.xfbin', options={'HIDDEN'})
-
-	def collection_callback(self, context):
-		items = set()
-		active_col = bpy.context.collection
-
-		if active_col:
-			items.add((active_col.name, active_col.name, ''))
-
-		items.update([(c.name, c.name, '') for c in bpy.data.collections])
-
-		return list([i for i in items if i[0] != 'Collection'])
-	
-	def collection_update(self, context):
-		pass
-
-
-	collection: EnumProperty(
-		items=collection_callback,
-		name='Collection',
-		description='The collection to be exported. All animations in the collection will be converted and put in the same XFBIN',
-	)
-
-	inject_to_xfbin: BoolProperty(
-		name='Inject to an existing XFBIN',
-		description='If True, will add (or overwrite) the exportable animations as pages in the selected XFBIN.\n'
-		'If False, will create a new XFBIN and overwrite the old file if it exists.\n\n'
-		'NOTE: If True, the selected path has to be an XFBIN file that already exists, and that file will be overwritten',
-		default=True,
-	)
-
-	"""inject_to_clump: BoolProperty(
-		name='Inject to an existing Clump',
-		description='If True, will add (or overwrite) the Clump animation(s) in the selected ANM in the XFBIN\n'
-		'If False, will create a new Clump and overwrite the old file if it exists.\n\n'
-		'NOTE: "Inject to existing XFBIN" has to be enabled for this option to take effect\n',					
-		default=True,
-	)"""
-	
-	export_material_animations: BoolProperty(
-		name='Export Material Animations',
-		description='If True, will export material animations from the selected collection',
-		default=True,
-	)
- 
-	export_ambient: BoolProperty(
-		name='Export Ambient',
-		description='If True, will export ambient data from XFBIN Scene Manager',
-		default=False,
-	)
- 
-	export_fog: BoolProperty(
-		name='Export Fog',
-		description='If True, will export fog data from XFBIN Scene Manager',
-		default=False,
-	)
-
-	def draw(self, context):
-		layout = self.layout
-
-		layout.label(text='Select a collection to export:')
-		layout.prop_search(self, 'collection', bpy.data, 'collections')
-
-		if self.collection:
-			inject_row = layout.row()
-			inject_row.prop(self, 'inject_to_xfbin')
-			#inject_row.prop(self, 'inject_to_clump')
-			row = layout.row()
-			row.prop(self, 'export_material_animations')
-			row = layout.row()
-			row.prop(self, 'export_fog')
-			row.prop(self, 'export_ambient')
-		
-
-	def execute(self, context):
-		import time
-
-		start_time = time.time()
-		exporter = AnmXfbinExporter(self, self.filepath, self.as_keywords(ignore=('filter_glob',)))
-  
-		# Profile the function
-		pr = Profile()
-		pr.enable()
-		exporter.export_collection(context)
-
-		pr.disable()
-		pr.print_stats(sort='cumtime')
-  
-		elapsed_s = "{:.2f}s".format(time.time() - start_time)
-		self.report({'INFO'}, f'Finished exporting {exporter.collection.name} in {elapsed_s}')
-		return {'FINISHED'}
-	
-class AnmXfbinExporter:
-	xfbin: Xfbin
+# Largest difference to the first key of a track that still counts as constant
+COLLAPSE_TOLERANCE = 1e-6
+
+# Seconds between checks of a background export thread
+BACKGROUND_POLL_INTERVAL = 0.1
 
+# Target files of the background exports that are still running
+background_exports: Set[str] = set()
+
+class AnmXfbinExporter:
 	def __init__(self, operator: Operator, filepath: str, export_settings: dict):
 		self.operator = operator
 		self.filepath = filepath
-		self.collection: bpy.types.Collection = bpy.data.collections[export_settings.get('collection')]
+		# Every collection is exported into the same file in one run
+		collection_names = export_settings.get('collections') or [export_settings.get('collection')]
+		self.collections: List[bpy.types.Collection] = [bpy.data.collections[name] for name in collection_names]
+		self.name = ', '.join(collection.name for collection in self.collections)
 		self.inject_to_xfbin = export_settings.get('inject_to_xfbin')
 		self.export_materials = export_settings.get('export_material_animations')
+		self.bake_constraints = export_settings.get('bake_constraints', False)
 		self.export_fog = export_settings.get('export_fog')
 		self.export_ambient = export_settings.get('export_ambient')
-		
+		self.merge_tracks = self.inject_to_xfbin and export_settings.get('merge_tracks', False)
+		self.selected_only = self.merge_tracks and export_settings.get('selected_only', False)
+		self.profile_memory = export_settings.get('profile_memory', False)
+		self.write_stats = export_settings.get('write_stats', False)
+		self.verify_fidelity = export_settings.get('verify_fidelity', False)
+		self.adaptive_sampling = export_settings.get('adaptive_sampling', False)
+		self.sampling_tolerance = export_settings.get('sampling_tolerance', 1e-3)
+		self.resample = export_settings.get('resample', False)
+		self.target_fps = export_settings.get('target_fps', 30)
+		self.collapse_constant = export_settings.get('collapse_constant', False)
+		self.save_snapshot = export_settings.get('save_snapshot', False)
+
+		# Data read from bpy, filled by iter_snapshot
+		self.chunks: List[ChunkSnapshot] = []
+
+		# Whether the last export changed the file on disk
+		self.written = False
+
+		# Progress of the current export, see iter_export
+		self.chunk_index = 0
+		self.chunk_count = 0
+
+		# Set by start_profiler when profile_memory is enabled
+		self.profiler: Optional[StageMemoryProfiler] = None
+
+		# Armatures and bakes read once and shared by every chunk and collection that uses them
+		self.anm_armatures: Dict[Tuple[str, str], AnmArmature] = {}
+		self.rest_transforms: Dict[Tuple[str, str], Tuple[tuple, tuple, tuple]] = {}
+		self.baked: Dict[tuple, Dict[str, BakedBones]] = {}
+
 
-	
 	def export_collection(self, context):
-		self.xfbin = Xfbin()
-		self.xfbin.version = 121
+		for _ in self.iter_export(context):
+			pass
 
-		if self.inject_to_xfbin:
-			if not path.isfile(self.filepath):
-				raise Exception(f'Cannot inject XFBIN - File does not exist: {self.filepath}')
 
-			self.xfbin = read_xfbin(self.filepath)
-		else:
-			self.inject_to_clump = False
+	def get_anm_chunks(self) -> List[XfbinAnmChunkPropertyGroup]:
+		"""
+		Return the animation chunks of all exported collections, in order.
+		"""
+		anm_chunks = []
 
-		for obj in self.collection.objects:
-			if obj.name.startswith(XFBIN_ANMS_OBJ):
-				anm_chunks_obj = obj
+		for collection in self.collections:
+			anm_chunks_obj = None
+			for obj in collection.objects:
+				if obj.name.startswith(XFBIN_ANMS_OBJ):
+					anm_chunks_obj = obj
 
-		anm_chunks_data = anm_chunks_obj.xfbin_anm_chunks_data
-		xfbin_scene = bpy.context.scene.xfbin_scene
-  
-		#set timeline to 0
-		bpy.context.scene.frame_set(0)
-
-		for anm_chunk in anm_chunks_data.anm_chunks:
-
-			page = XfbinPage()
-			page.struct_infos.append(NuccStructInfo("", "nuccChunkNull", ""))
-
-
-			anm_chunk_name = anm_chunk.name.split(' (')[0] if ' (' in anm_chunk.name else anm_chunk.name # Remove suffix if it exists
-   
-			anm_clumps = self.make_anm_armatures(anm_chunk)
-
-			for clump in anm_clumps:
-				page.struct_infos.extend(clump.nucc_struct_infos.get_armature_info())
-				page.struct_references.extend(clump.nucc_struct_references)
-
-	
-			if anm_chunk.cameras:
-				for camera_chunk in anm_chunk.cameras:
-					camera = bpy.data.objects[camera_chunk.name]
-					camera_name = camera_chunk.name.split(' (')[0] if ' (' in camera_chunk.name else camera_chunk.name # Remove suffix if it exists
-
-					nucc_camera = NuccCamera()
-					nucc_camera.struct_info = NuccStructInfo(camera_name, "nuccChunkCamera", camera_chunk.path)
-					
-					nucc_camera.fov = fov_from_blender(camera.data.sensor_width, camera.data.lens)
-					page.structs.append(nucc_camera)
-			
-			if anm_chunk.lightdircs:
-				for light_prop in anm_chunk.lightdircs:
-					lightdirc = bpy.data.objects.get(light_prop.name)
-					if not lightdirc:
-						continue
-					lightdirc_name = light_prop.name.split(' (')[0] if ' (' in light_prop.name else light_prop.name
-
-					nucc_lightdirc = NuccLightDirc()
-					nucc_lightdirc.struct_info = NuccStructInfo(lightdirc_name, "nuccChunkLightDirc", light_prop.path)
-
-					nucc_lightdirc.color = xfbin_scene.lightdir_color
-					nucc_lightdirc.energy = xfbin_scene.lightdir_intensity
-					light_default_rot = lightdirc.matrix_world.to_quaternion().inverted()
-					nucc_lightdirc.rotation = [light_default_rot.x, light_default_rot.y, light_default_rot.z, light_default_rot.w]
-
-					page.structs.append(nucc_lightdirc)
-			
-			if anm_chunk.lightpoints:
-				for light_prop in anm_chunk.lightpoints:
-					lightpoint = bpy.data.objects.get(light_prop.name)
-					if not lightpoint:
-						continue
-					lightpoint_name = light_prop.name.split(' (')[0] if ' (' in light_prop.name else light_prop.name
+			if anm_chunks_obj:
+				anm_chunks.extend(anm_chunks_obj.xfbin_anm_chunks_data.anm_chunks)
 
-					nucc_lightpoint = NuccLightPoint()
-					nucc_lightpoint.struct_info = NuccStructInfo(lightpoint_name, "nuccChunkLightPoint", light_prop.path)
+		return anm_chunks
 
-					nucc_lightpoint.color = xfbin_scene.lightpoint_color0
-					nucc_lightpoint.energy = xfbin_scene.lightpoint_intensity0
 
-					converted_value: List[int] = convert_object_value(0, "location", lightpoint.matrix_world.to_translation().copy()[:]).values
-					nucc_lightpoint.location = converted_value
+	def count_export_steps(self) -> int:
+		"""
+		Return the number of steps iter_export is expected to yield.
+		"""
+		steps = 1
+		sources = set()
 
-					nucc_lightpoint.radius = xfbin_scene.lightpoint_range0
-					
-					nucc_lightpoint.cutoff = xfbin_scene.lightpoint_attenuation0
+		for anm_chunk in self.get_anm_chunks():
+			steps += 1 + self.merge_tracks
 
+			# Chunks sliced from an action that was already read only add the slicing step
+			if get_frame_range(anm_chunk):
+				steps += 1
+				if get_source_key(anm_chunk) in sources:
+					continue
+				sources.add(get_source_key(anm_chunk))
 
-					page.structs.append(nucc_lightpoint)
-			
-			if self.export_ambient:
-				nucc_ambient = NuccAmbient()
-				nucc_ambient.struct_info = NuccStructInfo(anm_chunk_name, "nuccChunkAmbient", anm_chunk.path)
-
-				nucc_ambient.color = xfbin_scene.ambient_color
-				nucc_ambient.energy = 1.0
-
-				page.structs.append(nucc_ambient)
-
-   
-			if self.export_fog:
-				# create fog binary chunk
-				fog_chunk = NuccBinary()
-				fog_chunk.struct_info = NuccStructInfo(f"{anm_chunk_name}_fog", "nuccChunkBinary", f"{anm_chunk.path[:-4]}_fog.fcv")
-
-				fog_data = "FCURVE_TYPE_FOG,\n"
-				fog_data += f"FCURVE_INTERPOLATION_LINEAR,\n"
-				fog_data += f'1,\n'
-				fog_data += f"0,{xfbin_scene.fog_density/100:.6f},{xfbin_scene.fog_color[0]:.6f},{xfbin_scene.fog_color[1]:.6f},{xfbin_scene.fog_color[2]:.6f},{xfbin_scene.fog_start:.6f},{xfbin_scene.fog_end:.6f},0\n"
-	
-				fog_chunk.data = fog_data.encode('utf-8')
-	
-				page.structs.append(fog_chunk)
-				
-				
-			nucc_anm: NuccAnm = self.make_anm(anm_chunk, anm_clumps, page.struct_infos)
-			page.structs.append(nucc_anm)
-			
-
-			if self.inject_to_xfbin:
-				# Add page or overwrite existing page
-				for i, p in enumerate(self.xfbin.pages):
-					if any(struct_info.chunk_name == anm_chunk_name for struct_info in p.struct_infos):
-						self.xfbin.pages[i] = page
-						break
-				else:
-					self.xfbin.pages.append(page)
-			else:
-				self.xfbin.pages.append(page)
+			steps += 1 + len(anm_chunk.anm_clumps) * (2 if self.export_materials else 1)
+			steps += len(anm_chunk.cameras) + len(anm_chunk.lightdircs) + len(anm_chunk.lightpoints)
+			steps += self.export_ambient + self.bake_constraints
 
-			
-			
-		write_xfbin(self.xfbin, self.filepath)
+		return steps + self.save_snapshot
 
 
-	def make_anm_armatures(self, anm_chunk: XfbinAnmChunkPropertyGroup) -> List[AnmArmature]:
+	def check_target(self):
+		if self.inject_to_xfbin and not path.isfile(self.filepath):
+			raise Exception(f'Cannot inject XFBIN - File does not exist: {self.filepath}')
+
+
+	def make_encoder(self) -> AnmXfbinEncoder:
+		encoder = AnmXfbinEncoder(self.filepath, self.inject_to_xfbin, self.merge_tracks)
+		encoder.profiler = self.profiler
+		if self.verify_fidelity:
+			encoder.fidelity = FidelityReport()
+		if self.resample:
+			render = bpy.context.scene.render
+			encoder.frame_scale = self.target_fps / (render.fps / render.fps_base)
+		if self.collapse_constant:
+			encoder.collapse_tolerance = COLLAPSE_TOLERANCE
+		return encoder
+
+
+	def start_profiler(self):
 		"""
-		Return list of armatures that contain animation data.
+		Start recording memory use per stage if profile_memory is enabled.
 		"""
-		anm_armatures: List[AnmArmature] = []
+		if not self.profile_memory:
+			return
 
-		for index, clump_props in enumerate(anm_chunk.anm_clumps):
-			arm_obj: Armature = bpy.data.objects.get(clump_props.name)
+		from .. import bl_info
 
-			if not arm_obj or not arm_obj.animation_data:
+		self.profiler = StageMemoryProfiler({
+			'addon_version': '.'.join(map(str, bl_info['version'])),
+			'blender_version': bpy.app.version_string,
+			'collection': self.name,
+			'filepath': self.filepath,
+		})
+		self.profiler.start()
+
+
+	def iter_profiled(self, steps: Iterator[str]) -> Iterator[str]:
+		"""
+		Pass through the steps of steps, ending a profiler stage after each one.
+		"""
+		for step in steps:
+			if self.profiler:
+				self.profiler.stage(step)
+			yield step
+
+
+	@staticmethod
+	def finish_profiler(profiler: StageMemoryProfiler, filepath: str) -> List[str]:
+		"""
+		Write the memory report next to filepath and return its summary.
+		"""
+		return profiler.finish(f'{path.splitext(filepath)[0]}.memory.json')
+
+
+	def iter_export(self, context) -> Iterator[str]:
+		"""
+		Export the collections one unit of work at a time, yielding a description of each finished unit.
+		The file is only written in the last step, so closing the generator early cancels the export.
+		"""
+		self.check_target()
+		self.start_profiler()
+
+		try:
+			yield from self.iter_profiled(self.iter_snapshot(context))
+
+			encoder = self.make_encoder()
+			try:
+				for step in encoder.iter_encode(self.chunks):
+					self.chunk_index = encoder.chunk_index
+					yield step
+
+				if self.write_stats:
+					for line in write_export_stats(encoder):
+						self.operator.report({'INFO'}, line)
+
+				if encoder.fidelity:
+					for line in write_fidelity_report(encoder):
+						self.operator.report({'INFO'}, line)
+			finally:
+				self.written = encoder.written
+
+				for warning in encoder.warnings:
+					self.operator.report({'WARNING'}, warning)
+		finally:
+			if self.profiler:
+				for line in self.finish_profiler(self.profiler, self.filepath):
+					self.operator.report({'INFO'}, line)
+
+
+	def iter_snapshot(self, context) -> Iterator[str]:
+		"""
+		Read everything the encoder needs from bpy into self.chunks, yielding after each unit of work.
+		"""
+		anm_chunks = self.get_anm_chunks()
+		xfbin_scene = bpy.context.scene.xfbin_scene
+
+		if self.selected_only:
+			self.selected_materials = {slot.material.name for obj in bpy.context.selected_objects
+									   for slot in obj.material_slots if slot.material}
+
+		self.chunks = []
+		self.chunk_count = len(anm_chunks)
+
+		chunk_names = [get_chunk_name(anm_chunk) for anm_chunk in anm_chunks]
+		for name in set(chunk_names):
+			if chunk_names.count(name) > 1:
+				raise Exception(f'Animation {name} is defined more than once in {self.name}')
+
+		# Snapshots of whole actions, shared by the chunks that play a frame range of them
+		sources: Dict[tuple, ChunkSnapshot] = {}
+
+		for chunk_index, anm_chunk in enumerate(anm_chunks):
+			self.chunk_index = chunk_index
+
+			anm_chunk_name = chunk_names[chunk_index]
+			frame_range = get_frame_range(anm_chunk)
+
+			if not frame_range:
+				chunk = ChunkSnapshot(anm_chunk_name, anm_chunk.path, anm_chunk.is_looped, anm_chunk.frame_count)
+				yield from self.iter_snapshot_chunk(anm_chunk, anm_chunk_name, chunk, xfbin_scene)
+				self.chunks.append(chunk)
 				continue
 
-			action_name = anm_chunk.name if index == 0 else arm_obj.animation_data.action.name
-			action = bpy.data.actions.get(action_name)
+			source_key = get_source_key(anm_chunk)
+			source = sources.get(source_key)
 
-			if action:
-				arm_obj.animation_data_create()
-				arm_obj.animation_data.action = action
-				anm_armatures.append(AnmArmature(arm_obj))
+			if not source:
+				# Read the action once, up to the last frame any chunk sharing it plays
+				frame_end = max(get_frame_range(other)[1] for other in anm_chunks
+								if get_frame_range(other) and get_source_key(other) == source_key)
 
-		return anm_armatures
+				source = ChunkSnapshot(anm_chunk_name, anm_chunk.path, anm_chunk.is_looped, frame_end)
+				yield from self.iter_snapshot_chunk(anm_chunk, anm_chunk_name, source, xfbin_scene)
+				sources[source_key] = source
+
+			self.chunks.append(slice_chunk(source, anm_chunk_name, anm_chunk.path, anm_chunk.is_looped, *frame_range))
+			yield f'{anm_chunk_name} frames {frame_range[0]}-{frame_range[1]}'
+
+		if self.save_snapshot:
+			# Saved before encoding, which resamples and collapses the snapshots in place
+			render = bpy.context.scene.render
+			cache_path = f'{path.splitext(self.filepath)[0]}.snapshot.npz'
+			SnapshotCache(self.chunks, render.fps / render.fps_base).save(cache_path)
+
+			self.operator.report({'INFO'}, f'Snapshot cache written to {cache_path}')
+			yield 'snapshot cache'
 
 
-	def make_anm(self, anm_chunk: XfbinAnmChunkPropertyGroup, anm_armatures, struct_infos: List[NuccStructInfo]) -> NuccAnm:
+	def iter_snapshot_chunk(self, anm_chunk: XfbinAnmChunkPropertyGroup, anm_chunk_name: str, chunk: ChunkSnapshot, xfbin_scene) -> Iterator[str]:
 		"""
-		Return NuccAnm object from AnmProp object.
+		Read the armatures, cameras, lights, ambient and fog of one chunk into chunk, yielding after each unit of work.
 		"""
+		action = get_chunk_action(anm_chunk)
 
-		anm = NuccAnm()
+		anm_armatures = self.make_anm_armatures(anm_chunk)
+		chunk.armatures.extend(self.snapshot_armature(anm_armature) for anm_armature in anm_armatures)
 
-		anm_name = anm_chunk.name.split(' (')[0] if ' (' in anm_chunk.name else anm_chunk.name
-		anm.struct_info = NuccStructInfo(f"{anm_name}", "nuccChunkAnm", anm_chunk.path)
+		yield f'{anm_chunk_name} armatures'
 
-		anm.is_looped = anm_chunk.is_looped
-		anm.frame_count = anm_chunk.frame_count * 100
+		camera_objs = [bpy.data.objects.get(camera_chunk.name) for camera_chunk in anm_chunk.cameras]
 
-		# Combined struct references from all armatures for this animation
-		struct_references: List[NuccStructReference] = [ref for armature in anm_armatures for ref in armature.nucc_struct_references]
+		baked: Dict[str, BakedBones] = {}
+		camera_matrices: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+		if self.bake_constraints:
+			baked, camera_matrices = self.bake_chunk(anm_armatures, [camera for camera in camera_objs if camera], chunk.frame_count)
+			yield f'{anm_chunk_name} bake'
 
-		anm.clumps.extend(self.make_anm_clump(anm_armatures, struct_references))
-		anm.coord_parents.extend(self.make_anm_coords(anm_armatures))
-  
-		action = bpy.data.actions.get(f'{anm_chunk.name}')
-  
 		fcurve_dict = {}
-  
+
 		for fcurve in action.fcurves:
 			if len(fcurve.data_path.split('"')) < 2:
-				continue 
+				continue
 			bone_name = fcurve.data_path.split('"')[1]
-   
+
 			if not fcurve_dict.get(bone_name):
 				fcurve_dict[bone_name] = {
 										'location': [None] * 3,
@@ -330,111 +313,249 @@ class AnmXfbinExporter:
 			if fcurve_dict[bone_name].get(property_name):
 				fcurve_dict[bone_name][property_name][fcurve.array_index] = fcurve
 
-					
-		for armature in anm_armatures:
-			anm.entries.extend(self.make_coord_entries(armature, struct_references, anm.clumps, fcurve_dict))
+		for anm_armature, armature in zip(anm_armatures, chunk.armatures):
+			armature.coords.extend(self.snapshot_coords(anm_armature, fcurve_dict, chunk.frame_count, baked.get(anm_armature.name)))
+			yield f'{anm_chunk_name} {armature.name} bones'
+
 			if self.export_materials:
-				anm.entries.extend(self.make_material_entries(armature, struct_references, anm.clumps))
+				armature.material_entries.extend(self.snapshot_materials(anm_armature))
+				yield f'{anm_chunk_name} {armature.name} materials'
+
+		for index, (camera_chunk, camera) in enumerate(zip(anm_chunk.cameras, camera_objs)):
+			if not camera:
+				continue
+			camera_name = camera_chunk.name.split(' (')[0] if ' (' in camera_chunk.name else camera_chunk.name # Remove suffix if it exists
+
+			chunk.cameras.append(self.snapshot_camera(camera, camera_name, camera_chunk.path, index, chunk.frame_count, camera_matrices.get(camera.name)))
+			yield f'{anm_chunk_name} {camera.name}'
+
+		for index, light_prop in enumerate(anm_chunk.lightdircs):
+			lightdirc = bpy.data.objects.get(light_prop.name)
+			if not lightdirc:
+				continue
+			lightdirc_name = light_prop.name.split(' (')[0] if ' (' in light_prop.name else light_prop.name
+
+			chunk.lightdircs.append(self.snapshot_lightdirc(lightdirc, lightdirc_name, light_prop.path, index + len(anm_chunk.cameras), xfbin_scene))
+			yield f'{anm_chunk_name} {lightdirc.name}'
+
+		for index, light_prop in enumerate(anm_chunk.lightpoints):
+			lightpoint = bpy.data.objects.get(light_prop.name)
+			if not lightpoint:
+				continue
+			lightpoint_name = light_prop.name.split(' (')[0] if ' (' in light_prop.name else light_prop.name
+
+			chunk.lightpoints.append(self.snapshot_lightpoint(lightpoint, lightpoint_name, light_prop.path, index + len(anm_chunk.cameras) + len(anm_chunk.lightdircs), xfbin_scene))
+			yield f'{anm_chunk_name} {lightpoint.name}'
+
+		if self.export_ambient:
+			chunk.ambient = self.snapshot_ambient(len(anm_chunk.cameras) + len(anm_chunk.lightdircs) + len(anm_chunk.lightpoints), xfbin_scene)
+			yield f'{anm_chunk_name} ambient'
+
+		if self.export_fog:
+			chunk.fog = self.snapshot_fog(xfbin_scene)
+
+
+	def estimate_export(self) -> ExportEstimate:
+		"""
+		Predict the keys, output size and time of the export from F-Curve and keyframe counts and frame ranges only.
+		No key values are read or converted and nothing is written.
+		"""
+		def curve_key_count(fcurves) -> int:
+			# Channels of one property share their keyed frames, plus the closing null key
+			return max((len(fcurve.keyframe_points) for fcurve in fcurves), default=0) + 1
+
+		scene_action = bpy.context.scene.animation_data.action if bpy.context.scene.animation_data else None
+		estimates: List[ChunkEstimate] = []
+
+		for anm_chunk in self.get_anm_chunks():
+			estimate = ChunkEstimate(anm_chunk.name, anm_chunk.frame_count)
+			estimates.append(estimate)
+
+			anm_armatures = self.make_anm_armatures(anm_chunk)
+
+			# Baked bones and evaluated cameras are read in one pass over the union of their frames, like bake_chunk
+			bake_range = get_bake_range(anm_armatures)
+			evaluated_frames: List[np.ndarray] = []
+
+			for anm_armature in anm_armatures:
+				estimate.count('clumps')
+
+				bone_fcurves: Dict[str, Dict[str, List[FCurve]]] = defaultdict(lambda: defaultdict(list))
+				for fcurve in anm_armature.action.fcurves:
+					if fcurve.data_path.startswith('pose.bones["'):
+						bone_fcurves[fcurve.data_path.split('"')[1]][fcurve.data_path.split('.')[-1]].append(fcurve)
+
+				baked = set(get_bones_to_bake(anm_armature.armature)) if self.bake_constraints else set()
+				if baked:
+					baked_frames = bake_range[1] - bake_range[0] + 1
+					evaluated_frames.append(np.arange(bake_range[0], bake_range[1] + 1))
+
+				for bone in anm_armature.armature.data.bones:
+					properties = bone_fcurves.get(bone.name)
+					if not properties and bone.name not in baked:
+						continue
+
+					estimate.count('bones')
+					estimate.add_entry()
+
+					if bone.name in baked:
+						estimate.count('baked_bones')
+						for key_format in ('Vector3Linear', 'QuaternionLinear', 'Vector3Linear'):
+							estimate.add_track(key_format, baked_frames + 1)
+					else:
+						for prop, key_format in (('location', 'Vector3Linear'), ('rotation_quaternion', 'QuaternionLinear'),
+												 ('rotation_euler', 'EulerXYZFixed'), ('scale', 'Vector3Linear')):
+							fcurves = properties.get(prop)
+							if fcurves:
+								estimate.count('fcurves', len(fcurves))
+								estimate.count('keyframes', sum(len(fcurve.keyframe_points) for fcurve in fcurves))
+								estimate.operations['keyframe_read'] += sum(len(fcurve.keyframe_points) for fcurve in fcurves)
+								estimate.add_track(key_format, curve_key_count(fcurves))
+
+					opacity = properties.get('opacity') if properties else None
+					estimate.add_track('FloatLinear' if opacity else 'FloatFixed', curve_key_count(opacity) if opacity else 1)
+
+				if not self.export_materials:
+					continue
+
+				for material_name in anm_armature.materials:
+					material = bpy.data.materials.get(material_name)
+					if not material or not material.animation_data or not material.animation_data.action:
+						continue
+
+					estimate.count('materials')
+					estimate.add_entry()
 
+					for fcurve in material.animation_data.action.fcurves:
+						estimate.count('fcurves')
+						frame_start, frame_end = fcurve.range()
+						frame_count = int(frame_end) - int(frame_start) + 1
+
+						estimate.add_sampled_range(f'material {material_name} {fcurve.data_path}[{fcurve.array_index}]', frame_count)
+						estimate.add_track('FloatTable', frame_count)
 
-		if anm_chunk.cameras:
-			for index, camera_chunk in enumerate(anm_chunk.cameras):
+			for camera_chunk in anm_chunk.cameras:
 				camera = bpy.data.objects.get(camera_chunk.name)
 				if not camera:
 					continue
-				anm.entries.extend(self.make_camera_entries(camera, index))
-				anm.other_entries_indices.append(len(struct_infos) + index)
 
-		if anm_chunk.lightdircs:
-			for index, light_prop in enumerate(anm_chunk.lightdircs):
-				lightdirc = bpy.data.objects.get(light_prop.name)
-				if not lightdirc:
-					continue
-				anm.entries.extend(self.make_lightdirc_entries(lightdirc, index + len(anm_chunk.cameras)))
-				anm.other_entries_indices.append(len(struct_infos) + index + len(anm_chunk.cameras))
-		
-		if anm_chunk.lightpoints:
-			for index, light_prop in enumerate(anm_chunk.lightpoints):
-				lightpoint = bpy.data.objects.get(light_prop.name)
-				if not lightpoint:
+				estimate.count('cameras')
+				estimate.add_entry()
+
+				if self.bake_constraints and needs_evaluation(camera):
+					evaluated_frames.append(np.arange(0, anm_chunk.frame_count + 1))
+					estimate.add_track('Vector3Linear', anm_chunk.frame_count + 2)
+					estimate.add_track('QuaternionLinear', anm_chunk.frame_count + 2)
+
+				if camera.animation_data and camera.animation_data.action:
+					fcurves = camera.animation_data.action.fcurves
+					estimate.count('fcurves', len(fcurves))
+					estimate.count('keyframes', sum(len(fcurve.keyframe_points) for fcurve in fcurves))
+					estimate.operations['keyframe_read'] += sum(len(fcurve.keyframe_points) for fcurve in fcurves)
+
+					for prop in ('location', 'rotation_quaternion', 'rotation_euler', 'lens'):
+						prop_fcurves = [fcurve for fcurve in fcurves if fcurve.data_path.endswith(prop)]
+						if prop_fcurves:
+							estimate.add_track('FloatLinear' if prop == 'lens' else 'Vector3Linear' if prop == 'location' else 'QuaternionLinear',
+											   curve_key_count(prop_fcurves))
+
+			if evaluated_frames:
+				estimate.operations['frame_evaluation'] = len(np.unique(np.concatenate(evaluated_frames)))
+
+			# Lights and ambient are sampled on every frame, one track per property, up to the same frame as the export:
+			# the later end of the scene and light action for directional lights, the light action's end for point lights
+			# that have one, and the scene action's end otherwise
+			lights = [(light_prop.name, bpy.data.objects.get(light_prop.name), 3, False) for light_prop in anm_chunk.lightdircs]
+			lights += [(light_prop.name, bpy.data.objects.get(light_prop.name), 5, True) for light_prop in anm_chunk.lightpoints]
+			if self.export_ambient:
+				lights.append(('ambient', None, 2, False))
+
+			for light_name, light, track_count, light_action_first in lights:
+				if light_name != 'ambient' and not light:
 					continue
-				anm.entries.extend(self.make_lightpoint_entries(lightpoint, index + len(anm_chunk.cameras) + len(anm_chunk.lightdircs)))
-				anm.other_entries_indices.append(len(struct_infos) + index + len(anm_chunk.cameras) + len(anm_chunk.lightdircs))
 
-		if self.export_ambient:
-			
-			anm.entries.extend(self.make_ambient_entries(index + len(anm_chunk.cameras) + len(anm_chunk.lightdircs) + len(anm_chunk.lightpoints)))
-			anm.other_entries_indices.append(len(struct_infos) + index + len(anm_chunk.cameras) + len(anm_chunk.lightdircs) + len(anm_chunk.lightpoints))
+				estimate.count('lights')
 
-		return anm
-			
-	def make_anm_clump(self, anm_armatures: List[AnmArmature], struct_references: List[NuccStructReference]) -> List[AnmClump]:
-		clumps: List[AnmClump] = list()
+				light_action = light.animation_data.action if light and light.animation_data else None
+				if light_action_first and light_action:
+					actions = [light_action]
+				else:
+					actions = [action for action in (scene_action, light_action) if action]
+				if not actions:
+					continue
 
+				frame_end = int(max(action.frame_range[1] for action in actions))
+				estimate.add_entry()
 
-		for anm_armature in anm_armatures:
-			clump = AnmClump()
+				for _ in range(track_count):
+					estimate.add_sampled_range(f'light {light_name}', frame_end + 1)
+					estimate.add_track('FloatTable', frame_end + 2)
 
-			if anm_armature.models:
-				clump.clump_index = struct_references.index(NuccStructReference(anm_armature.models[0], NuccStructInfo(anm_armature.name, "nuccChunkClump", anm_armature.chunk_path)))
-					
-			else:
-				clump.clump_index = struct_references.index(NuccStructReference(anm_armature.bones[0].name, NuccStructInfo(anm_armature.name, "nuccChunkClump", anm_armature.chunk_path)))
-					
-			bone_material_indices: List[int] = list()
+		return ExportEstimate(estimates)
 
-			
 
-			bone_indices: List[int] = [struct_references.index(NuccStructReference(bone.name, NuccStructInfo(bone.name, "nuccChunkCoord", anm_armature.chunk_path))) for bone in anm_armature.bones]
-			mat_indices: List[int] = [struct_references.index(NuccStructReference(mat, NuccStructInfo(mat, "nuccChunkMaterial", anm_armature.chunk_path))) for mat in anm_armature.materials]
-			model_indices: List[int] = [struct_references.index(NuccStructReference(model, NuccStructInfo(model, "nuccChunkModel", anm_armature.chunk_path))) for model in anm_armature.models]
+	def make_anm_armatures(self, anm_chunk: XfbinAnmChunkPropertyGroup) -> List[AnmArmature]:
+		"""
+		Return list of armatures that contain animation data.
+		"""
+		anm_armatures: List[AnmArmature] = []
 
-			bone_material_indices.extend([*bone_indices, *mat_indices])
+		for index, clump_props in enumerate(anm_chunk.anm_clumps):
+			arm_obj: Armature = bpy.data.objects.get(clump_props.name)
 
+			if not arm_obj or not arm_obj.animation_data:
+				continue
 
-			clump.bone_material_indices = bone_material_indices
-			clump.model_indices = model_indices
+			# The action is read by name and never assigned, so the scene and undo history are left untouched
+			action = get_chunk_action(anm_chunk) if index == 0 else arm_obj.animation_data.action
 
-			clumps.append(clump)
+			if action:
+				key = (arm_obj.name, action.name)
+				if key not in self.anm_armatures:
+					self.anm_armatures[key] = AnmArmature(arm_obj, action)
+				anm_armatures.append(self.anm_armatures[key])
 
-		return clumps
+		return anm_armatures
 
 
-	def make_anm_coords(self, anm_armatures: List[AnmArmature]) -> List[CoordParent]:
+	def bake_chunk(self, anm_armatures: List[AnmArmature], cameras: List[bpy.types.Object],
+				   frame_count: int) -> Tuple[Dict[str, BakedBones], Dict[str, Tuple[np.ndarray, np.ndarray]]]:
 		"""
-		Return list of CoordParent objects from AnmArmature object.
+		Sample the bones that need baking over the combined frame range of the armatures' actions and the world matrices
+		of the parented or constrained cameras over the chunk, in a single evaluation of each frame with every armature
+		playing its action in the chunk. Return the baked bones keyed by armature name and (frames, matrices) keyed by camera name.
 		"""
-		coord_parents: List[CoordParent] = list()
+		cameras = [camera for camera in cameras if needs_evaluation(camera)]
+
+		# Bones are baked once per set of armatures and actions, and shared by the chunks that play them
+		key = tuple((anm_armature.name, anm_armature.action.name) for anm_armature in anm_armatures)
+
+		bone_range = get_bake_range(anm_armatures) if key not in self.baked else None
 
-		# Get list of child bones for each bone in armature
-		for armature_index, anm_armature in enumerate(anm_armatures):
-			armature_obj = anm_armature.armature
+		camera_frames = np.arange(0, frame_count + 1)
+		baked, matrices = bake_scene(bpy.context, {anm_armature.armature: anm_armature.action for anm_armature in anm_armatures},
+									 bone_range, cameras, camera_frames)
 
-			for bone in anm_armature.armature.data.bones:
-				if bone.parent:
-					parent = AnmCoord(armature_index, anm_armature.bones.index(bone.parent))
-					child = AnmCoord(armature_index, anm_armature.bones.index(bone))
+		if bone_range:
+			self.baked[key] = baked
 
-					coord_parents.append(CoordParent(parent, child))
+		return self.baked.get(key, {}), {name: (camera_frames, camera_matrices) for name, camera_matrices in matrices.items()}
 
-				
-			# Handle case where bone has constraints
-			'''for bone in armature_obj.data.bones:
-				if ("Copy Transforms" in anm_armatures[armature_index].armature.pose.bones[bone.name].constraints):
-					target_object = anm_armatures[armature_index].armature.pose.bones[bone.name].constraints["Copy Transforms"].target
-					parent_armature = next((arm for arm in anm_armatures if arm.armature == target_object), None)
-					if parent_armature:
-						parent_clump_index = anm_armatures.index(parent_armature)
-						parent = AnmCoord(parent_clump_index, parent_armature.bones.index(armature_obj.pose.bones[bone.name].constraints["Copy Transforms"].subtarget))
-						child = AnmCoord(armature_index, anm_armature.bones.index(bone.name))
 
-						coord_parents.append(CoordParent(parent, child))'''
-			
+	def snapshot_armature(self, anm_armature: AnmArmature) -> ArmatureSnapshot:
+		bone_indices = {bone.name: i for i, bone in enumerate(anm_armature.bones)}
 
-		return coord_parents
+		return ArmatureSnapshot(
+			anm_armature.name,
+			anm_armature.chunk_path,
+			list(bone_indices),
+			[bone_indices[bone.parent.name] if bone.parent else -1 for bone in anm_armature.bones],
+			list(anm_armature.models),
+			list(anm_armature.materials),
+		)
 
 
-	def make_coord_entries(self, anm_armature: AnmArmature, struct_references: List[NuccStructReference], clumps: List[AnmClump], fcurve_dict) -> List[AnmEntry]:
+	def snapshot_coords(self, anm_armature: AnmArmature, fcurve_dict, frame_count: int, baked: Optional[BakedBones] = None) -> List[CoordSnapshot]:
 		def collect_keyframes(curves, default_values, evaluate_fn):
 			"""Collect keyframes for given curves with optimized frame processing."""
 			keyframes = defaultdict(list)
@@ -447,7 +568,7 @@ class AnmXfbinExporter:
 					frame_values = {kp.co[0]: evaluate_fn(curve, kp.co[0]) for kp in curve.keyframe_points}
 					curve_keyframe_maps.append((curve, frame_values))
 					all_frame_indices.extend(frame_values.keys())
-			
+
 			# Sort all frames only once
 			all_frames = sorted(set(all_frame_indices))
 
@@ -465,160 +586,101 @@ class AnmXfbinExporter:
 				last_values[:] = frame_values[:]
 				keyframes[int(frame)] = frame_values[:]
 
-			return keyframes
+			return dict(keyframes)
 
+		def sample_keyframes(curves, default_values):
+			"""
+			Sample the curves on every frame between their first and last keyframe, then keep the keyframes
+			and only the frames linear interpolation needs to stay within sampling_tolerance of the curves.
+			"""
+			present = [curve for curve in curves if curve and len(curve.keyframe_points)]
+			if not present:
+				return {}
 
-		def create_track_header(track_index, key_format, frame_count):
-			"""Create a track header with common properties."""
-			header = TrackHeader()
-			header.track_index = track_index
-			header.key_format = key_format
-			header.frame_count = frame_count
-			return header
+			key_frames = np.unique(np.concatenate([keyframe_arrays(curve)[0] for curve in present]).astype(np.int64))
+			frames = np.arange(key_frames[0], key_frames[-1] + 1)
 
-		entries = []
-		armature_curves = {bone.name: fcurve_dict.get(bone.name) for bone in anm_armature.armature.data.bones}
+			values = np.tile(np.asarray(default_values, dtype=np.float64), (len(frames), 1))
+			for curve in present:
+				values[:, curve.array_index] = sample_fcurve(curve, frames)
+
+			keep = simplify_rows(values, self.sampling_tolerance, np.isin(frames, key_frames))
+			return {int(frame): row for frame, row in zip(frames[keep].tolist(), values[keep].tolist())}
+
+		def add_reference(coord: CoordSnapshot, track_index: int, curves, default_values):
+			"""Sample the curves of a track on every frame of the chunk, to measure the fidelity of its keys against."""
+			if self.verify_fidelity:
+				reference = sample_reference({curve.array_index: curve for curve in curves if curve}, default_values, reference_frames)
+				if len(reference):
+					coord.references[track_index] = reference
 
-		#bone_indices = {bone.name: i for i, bone in enumerate(anm_armature.bones)}
+		reference_frames = np.arange(0, frame_count + 1)
+
+		coords: List[CoordSnapshot] = []
+		armature_curves = {bone.name: fcurve_dict.get(bone.name) for bone in anm_armature.armature.data.bones}
 
 		for bone_name, curves in armature_curves.items():
-			if not curves:
+			is_baked = baked is not None and bone_name in baked
+
+			if not curves and not is_baked:
 				continue
-			# Find clump and coordinate indices
-			clump_reference_index = struct_references.index(anm_armature.nucc_struct_references[0])
-			clump_index = next((i for i, clump in enumerate(clumps) if clump.clump_index == clump_reference_index), None)
-
-			coord_reference_index = struct_references.index(
-				NuccStructReference(bone_name, NuccStructInfo(bone_name, "nuccChunkCoord", anm_armature.chunk_path))
-			)
-			coord_index = next(
-				(i for i, coord in enumerate(clumps[clump_index].bone_material_indices) if coord == coord_reference_index), None
-			)
-
-			entry = AnmEntry()
-			entry.coord = AnmCoord(clump_index, coord_index)
-			entry.entry_format = EntryFormat.Coord
-
-			bone = anm_armature.armature.data.bones[bone_name]
-			loc, rot, scale = get_edit_matrix(anm_armature.armature, bone).decompose()
-
-			# Create location track
-			location_keyframes = collect_keyframes(curves['location'], [0, 0, 0], lambda c, f: c.evaluate(f))
-			location_frame_count = len(location_keyframes)
-			location_is_multiple = location_frame_count > 1
-			location_header = create_track_header(
-				0, NuccAnmKeyFormat.Vector3Linear if location_is_multiple else NuccAnmKeyFormat.Vector3Fixed,
-				location_frame_count + location_is_multiple
-			)
-			location_track = Track()
-			location_track.keys = [
-				convert_bone_value(loc, rot, scale, 'location', location_header, value, frame)
-				for frame, value in location_keyframes.items()
-			]
-			if location_is_multiple:
-				location_track.keys.append(NuccAnmKey.Vec3Linear(-1, location_track.keys[-1].values))
-
-			entry.tracks.append(location_track)
-			entry.track_headers.append(location_header)
-
-			# Create rotation track
-			if any(curves['rotation_quaternion']):
-				rotation_keyframes = collect_keyframes(curves['rotation_quaternion'], [1.0, 0.0, 0.0, 0.0], lambda c, f: c.evaluate(f))
-				rotation_header = create_track_header(1, NuccAnmKeyFormat.QuaternionLinear, len(rotation_keyframes) + 1)
-				rotation_track = Track()
-				rotation_track.keys = [
-					convert_bone_value(loc, rot, scale, 'rotation_quaternion', rotation_header, value, frame)
-					for frame, value in rotation_keyframes.items()
-				]
-				rotation_track.keys.append(NuccAnmKey.Vec4Linear(-1, rotation_track.keys[-1].values))
-				entry.tracks.append(rotation_track)
-				entry.track_headers.append(rotation_header)
-
-			elif any(curves['rotation_euler']):
-				rotation_keyframes = collect_keyframes(curves['rotation_euler'], [0, 0, 0], lambda c, f: c.evaluate(f))
-				rotation_header = create_track_header(1, NuccAnmKeyFormat.EulerXYZFixed, len(rotation_keyframes))
-				rotation_track = Track()
-				rotation_track.keys = [
-					convert_bone_value(loc, rot, scale, 'rotation_euler', rotation_header, value, frame)
-					for frame, value in rotation_keyframes.items()
-				]
-
-				entry.tracks.append(rotation_track)
-				entry.track_headers.append(rotation_header)
-
-			# Create scale track
-			if any(curves['scale']):
-				scale_keyframes = collect_keyframes(curves['scale'], [1, 1, 1], lambda c, f: c.evaluate(f))
-				scale_frame_count = len(scale_keyframes)
-				scale_is_multiple = scale_frame_count > 1
-				scale_header = create_track_header(
-					2, NuccAnmKeyFormat.Vector3Linear if scale_is_multiple else NuccAnmKeyFormat.Vector3Fixed,
-					scale_frame_count + scale_is_multiple
-				)
-				scale_track = Track()
-				scale_track.keys = [
-					convert_bone_value(loc, rot, scale, 'scale', scale_header, value, frame)
-					for frame, value in scale_keyframes.items()
-				]
-				if scale_is_multiple:
-					scale_track.keys.append(NuccAnmKey.Vec3Linear(-1, scale_track.keys[-1].values))
-
-				entry.tracks.append(scale_track)
-				entry.track_headers.append(scale_header)
-
-			
-			# Create opacity track
-			opacity_track = Track()
-			if curves['opacity'][0]:
-				curve = curves['opacity'][0]
-				opacity_track.keys = [NuccAnmKey.FloatLinear(int(kp.co[0] * 100), kp.co[1]) for kp in curve.keyframe_points] 
-				opacity_header = create_track_header(3, NuccAnmKeyFormat.FloatLinear, len(opacity_track.keys) + 1)
-		
-				null_key = NuccAnmKey.FloatLinear(-1, opacity_track.keys[-1].values)
-				opacity_track.keys.append(null_key)
-
-				entry.tracks.append(opacity_track)
-				entry.track_headers.append(opacity_header)
-			else:
-				opacity_header = create_track_header(3, NuccAnmKeyFormat.FloatFixed, 1)
-				opacity_track.keys = [NuccAnmKey.Float(1)]
-				entry.tracks.append(opacity_track)
-				entry.track_headers.append(opacity_header)
 
-			entries.append(entry)
+			if self.selected_only and not anm_armature.armature.data.bones[bone_name].select:
+				continue
+
+			key = (anm_armature.name, bone_name)
+			if key not in self.rest_transforms:
+				loc, rot, scale = get_edit_matrix(anm_armature.armature, anm_armature.armature.data.bones[bone_name]).decompose()
+				self.rest_transforms[key] = tuple(loc), tuple(rot), tuple(scale)
+
+			coord = CoordSnapshot(bone_name, *self.rest_transforms[key])
+
+			if is_baked:
+				# Sampled on every frame, so the keys include constraints, IK and drivers
+				coord.location = baked.frame_values(baked.locations, bone_name)
+				coord.rotation_mode = 'rotation_quaternion'
+				coord.rotation = baked.frame_values(baked.rotations, bone_name)
+				coord.scale = baked.frame_values(baked.scales, bone_name)
 
-		return entries
+				if self.verify_fidelity:
+					bone_index = baked.bone_indices[bone_name]
+					for track_index, values in enumerate((baked.locations, baked.rotations, baked.scales)):
+						coord.references[track_index] = ChannelArrays(baked.frames, values[:, bone_index])
+			else:
+				# Location, quaternion and scale keys are written as linear tracks
+				if self.adaptive_sampling:
+					collect_linear = sample_keyframes
+				else:
+					collect_linear = lambda curves, default_values: collect_keyframes(curves, default_values, lambda c, f: c.evaluate(f))
+
+				coord.location = collect_linear(curves['location'], [0, 0, 0])
+				add_reference(coord, 0, curves['location'], [0, 0, 0])
 
+				if any(curves['rotation_quaternion']):
+					coord.rotation_mode = 'rotation_quaternion'
+					coord.rotation = collect_linear(curves['rotation_quaternion'], [1.0, 0.0, 0.0, 0.0])
+					add_reference(coord, 1, curves['rotation_quaternion'], [1.0, 0.0, 0.0, 0.0])
 
-	def make_material_entries(self, anm_armature: AnmArmature, struct_references: List[NuccStructReference], clumps: List[AnmClump]) -> List[AnmEntry]:
-		context = bpy.context
+				elif any(curves['rotation_euler']):
+					coord.rotation_mode = 'rotation_euler'
+					coord.rotation = collect_keyframes(curves['rotation_euler'], [0, 0, 0], lambda c, f: c.evaluate(f))
+					add_reference(coord, 1, curves['rotation_euler'], [0, 0, 0])
 
-		entries: List[AnmEntry] = list()
+				if any(curves['scale']):
+					coord.scale = collect_linear(curves['scale'], [1, 1, 1])
+					add_reference(coord, 2, curves['scale'], [1, 1, 1])
 
-		def create_and_append_track(entry: AnmEntry, track_index: int, key_format: NuccAnmKeyFormat, values: List[float], frame_count: int = 1):
-			""" Create helper method since most material entries have the same structure """
-			track_header = TrackHeader()
-			track_header.track_index = track_index
+			if curves and curves['opacity'][0]:
+				coord.opacity = [(kp.co[0], kp.co[1]) for kp in curves['opacity'][0].keyframe_points]
+				add_reference(coord, 3, curves['opacity'], [1])
 
-			
-			track_header.key_format = key_format
-			track_header.frame_count = len(values)
+			coords.append(coord)
 
-			track = Track()
-   
-			
-   
-			if key_format == NuccAnmKeyFormat.FloatTable:
-				for f, value in values.items():
-					track.keys.append(NuccAnmKey.Float(value))
-     
-			elif key_format == NuccAnmKeyFormat.FloatFixed:
-				track.keys.append(NuccAnmKey.Float(values[0]))
+		return coords
 
-     
-			entry.tracks.append(track)
-			entry.track_headers.append(track_header)
 
+	def snapshot_materials(self, anm_armature: AnmArmature) -> List[MaterialSnapshot]:
+		materials: List[MaterialSnapshot] = list()
 
 		for material_name in anm_armature.materials:
 			material = bpy.data.materials.get(material_name)
@@ -626,37 +688,28 @@ class AnmXfbinExporter:
 			if not material:
 				continue
 
+			if self.selected_only and material_name not in self.selected_materials:
+				continue
+
 			if not material.animation_data:
 				continue
-			
+
 			if not material.animation_data.action:
 				continue
 
 
-			material_fcurves = {
-				"uvOffset0": [{}, {}, {}, {}],
-				"uvOffset1": [{}, {}, {}, {}],
-				"uvOffset2": [{}, {}, {}, {}],
-				"uvOffset3": [{}, {}, {}, {}],
-				"alpha": [{}],
-				"glare": [{}],
-				"blendRate": [{}, {}],
-				"fallOff": [{}],
-				"outlineID": [{}]
-			}
-
 			fcurve_count_dict = {
 				"uvOffset0": -1,
 				"uvOffset1": -1,
 				"uvOffset2": -1,
-				"uvOffset3": -1,	
+				"uvOffset3": -1,
 				"blendRate": -1,
 				"alpha": -1,
 				"glare": -1,
 				"fallOff": -1,
 				"outlineID": -1
 			}
-   
+
 			fcurve_index_dict = {
 				"uvOffset0": [0, 1, 8, 9],
 				"uvOffset1": [2, 3, 10, 11],
@@ -668,615 +721,455 @@ class AnmXfbinExporter:
 				"fallOff": [14],
 				"outlineID": [17]
 			}
-   
-			clump_reference_index = struct_references.index(anm_armature.nucc_struct_references[0])
-			clump_index = next((i for i, clump in enumerate(clumps) if clump.clump_index == clump_reference_index), None)
-
-			material_reference_index = struct_references.index(NuccStructReference(material_name, NuccStructInfo(material_name, "nuccChunkMaterial", anm_armature.chunk_path)))
-			material_index = next((i for i, material in enumerate(clumps[clump_index].bone_material_indices) if material == material_reference_index), None)
-   
-			entry = AnmEntry()
-			entry.coord = AnmCoord(clump_index, material_index)
-			entry.entry_format = EntryFormat.Material
-   
+
+			snapshot = MaterialSnapshot(material_name)
+
+			# Paths with at least one F-Curve, the others get fixed tracks with their default values
+			animated: Set[str] = set()
+
+			def add_fixed_track(track_index: int, value: float):
+				snapshot.tracks.append((track_index, 'FloatFixed', np.array([value], dtype=np.float64)))
+
 			for fcurve in material.animation_data.action.fcurves:
-				for path in material_fcurves.keys():
-					if fcurve.data_path.endswith(path):
-						fcurve_count_dict[path] += 1
+				for data_path in fcurve_index_dict.keys():
+					if fcurve.data_path.endswith(data_path):
+						fcurve_count_dict[data_path] += 1
 						frame_start, frame_end = fcurve.range()
-						
-						#evaluate fcurve
-						for i in range(int(frame_start), int(frame_end) + 1):
-							value = fcurve.evaluate(i)
-							material_fcurves[path][fcurve_count_dict[path]][i] = value
 
-						create_and_append_track(entry, fcurve_index_dict[path][fcurve_count_dict[path]], NuccAnmKeyFormat.FloatTable, material_fcurves[path][fcurve_count_dict[path]], frame_end)
+						values = sample_table(fcurve, int(frame_start), int(frame_end))
+						track_index = fcurve_index_dict[data_path][fcurve_count_dict[data_path]]
+						snapshot.tracks.append((track_index, 'FloatTable', values))
+
+						if self.verify_fidelity:
+							snapshot.references[track_index] = ChannelArrays(np.arange(len(values)), values[:, None])
+						animated.add(data_path)
 						break
-			
-   
+
+
 			#create and export default values
-			if material.xfbin_material_data.UV0 and not material_fcurves["uvOffset0"][0]:
-				create_and_append_track(entry, 0, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset0[0]])
-				create_and_append_track(entry, 1, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset0[1]])
-				create_and_append_track(entry, 8, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset0[2]])
-				create_and_append_track(entry, 9, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset0[3]])
-
-			if material.xfbin_material_data.UV1 and not material_fcurves["uvOffset1"][0]:
-				create_and_append_track(entry, 2, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset1[0]])
-				create_and_append_track(entry, 3, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset1[1]])
-				create_and_append_track(entry, 10, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset1[2]])
-				create_and_append_track(entry, 11, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset1[3]])
-                            
-			if material.xfbin_material_data.UV2 and not material_fcurves["uvOffset2"][0]:
-				create_and_append_track(entry, 4, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset2[0]])
-				create_and_append_track(entry, 5, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset2[1]])
-				create_and_append_track(entry, 18, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset2[2]])
-				create_and_append_track(entry, 19, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset2[3]])
-			
-			if material.xfbin_material_data.UV3 and not material_fcurves["uvOffset3"][0]:
-				create_and_append_track(entry, 6, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset3[0]])
-				create_and_append_track(entry, 7, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset3[1]])
-				create_and_append_track(entry, 20, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset3[2]])
-				create_and_append_track(entry, 21, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.uvOffset3[3]])
-            
-			if material.xfbin_material_data.blendRate and not material_fcurves["blendRate"][0]:
-				create_and_append_track(entry, 12, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.blendRate[0]])
-				create_and_append_track(entry, 13, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.blendRate[1]])
-    
-			if material.xfbin_material_data.alpha and not material_fcurves["alpha"][0]:
-				create_and_append_track(entry, 16, NuccAnmKeyFormat.FloatFixed, [round(material.xfbin_material_data.alpha * 255)])
-    
-			if material.xfbin_material_data.glare and not material_fcurves["glare"][0]:
-				create_and_append_track(entry, 15, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.glare])
-    
-			if material.xfbin_material_data.fallOff and not material_fcurves["fallOff"][0]:
-				create_and_append_track(entry, 14, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.fallOff])
-    
-			if material.xfbin_material_data.outlineID and not material_fcurves["outlineID"][0]:
-				create_and_append_track(entry, 17, NuccAnmKeyFormat.FloatFixed, [material.xfbin_material_data.outlineID])
-    
-
-			entries.append(entry)
-
-		return entries
-
-
-
-	def make_camera_entries(self, camera: bpy.types.Camera, other_index: int) -> List[AnmEntry]:
-		entries: List[AnmEntry] = []
-		
-		if not camera.animation_data or not camera.animation_data.action:
-			return entries
-
-		sensor_width = camera.data.sensor_width
-  
-		cam_fcurves = {
-			"location": [{}, {}, {}],
-			"rotation_quaternion": [{}, {}, {}, {}],
-			"rotation_euler": [{}, {}, {}],
+			material_data = material.xfbin_material_data
+
+			if material_data.UV0 and "uvOffset0" not in animated:
+				for track_index, value in zip(fcurve_index_dict["uvOffset0"], material_data.uvOffset0):
+					add_fixed_track(track_index, value)
+
+			if material_data.UV1 and "uvOffset1" not in animated:
+				for track_index, value in zip(fcurve_index_dict["uvOffset1"], material_data.uvOffset1):
+					add_fixed_track(track_index, value)
+
+			if material_data.UV2 and "uvOffset2" not in animated:
+				for track_index, value in zip(fcurve_index_dict["uvOffset2"], material_data.uvOffset2):
+					add_fixed_track(track_index, value)
+
+			if material_data.UV3 and "uvOffset3" not in animated:
+				for track_index, value in zip(fcurve_index_dict["uvOffset3"], material_data.uvOffset3):
+					add_fixed_track(track_index, value)
+
+			if material_data.blendRate and "blendRate" not in animated:
+				add_fixed_track(12, material_data.blendRate[0])
+				add_fixed_track(13, material_data.blendRate[1])
+
+			if material_data.alpha and "alpha" not in animated:
+				add_fixed_track(16, round(material_data.alpha * 255))
+
+			if material_data.glare and "glare" not in animated:
+				add_fixed_track(15, material_data.glare)
+
+			if material_data.fallOff and "fallOff" not in animated:
+				add_fixed_track(14, material_data.fallOff)
+
+			if material_data.outlineID and "outlineID" not in animated:
+				add_fixed_track(17, material_data.outlineID)
+
+
+			materials.append(snapshot)
+
+		return materials
+
+
+
+	def snapshot_camera(self, camera: bpy.types.Object, name: str, chunk_path: str, other_index: int, frame_count: int,
+						evaluated: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> CameraSnapshot:
+		snapshot = CameraSnapshot(name, chunk_path, other_index, fov_from_blender(camera.data.sensor_width, camera.data.lens), camera.data.sensor_width)
+
+		action = camera.animation_data.action if camera.animation_data else None
+
+		if not action and not evaluated:
+			return snapshot
+
+		snapshot.animated = True
+
+		cam_fcurves: Dict[str, Dict[int, FCurve]] = {
+			"location": {},
+			"rotation_quaternion": {},
+			"rotation_euler": {},
 			"lens": {}
 		}
-		
-		location_frames: Set[int] = set()
-		quat_frames: Set[int] = set()
-		euler_frames: Set[int] = set()
-		fov_frames: Set[int] = set()
-
-		fcurve_mapping = {
-			"location": (cam_fcurves["location"], location_frames),
-			"rotation_quaternion": (cam_fcurves["rotation_quaternion"], quat_frames),
-			"rotation_euler": (cam_fcurves["rotation_euler"], euler_frames),
-			"lens": (cam_fcurves["lens"], fov_frames)
-		}
 
-		for fcurve in camera.animation_data.action.fcurves:
-			for path, (target, frame_set) in fcurve_mapping.items():
-				if fcurve.data_path.endswith(path):
-					for kp in fcurve.keyframe_points:
-						if isinstance(target, list):  # For multi-axis data
-							target[fcurve.array_index][int(kp.co[0])] = kp.co[1]
-						else:  # For single-axis data like lens
-							target[int(kp.co[0])] = kp.co[1]
-						frame_set.add(int(kp.co[0]))
-					break
-
-		def create_tracks(frame_values: Dict[int, List[float]], data_path, key_format, track_index, null_key_type):
-			track_header = TrackHeader(track_index=track_index, key_format=key_format)
-			track = Track()
-			last_values = [0] * len(frame_values[next(iter(frame_values))])
-
-			for frame, values in sorted(frame_values.items()):
-				for i, val in enumerate(values):
-					if val is not None:
-						last_values[i] = val
-				converted_value = convert_object_value(sensor_width, data_path, last_values, frame)
-				track.keys.append(converted_value)
-
-			if null_key_type == "Vec3Linear":
-				null_key = NuccAnmKey.Vec3Linear(-1, track.keys[-1].values)
-			elif null_key_type == "Vec4Linear":
-				null_key = NuccAnmKey.Vec4Linear(-1, track.keys[-1].values)
-			elif null_key_type == "FloatLinear":
-				null_key = NuccAnmKey.FloatLinear(-1, track.keys[-1].values)
+		if action:
+			for fcurve in action.fcurves:
+				for data_path, channels in cam_fcurves.items():
+					if fcurve.data_path.endswith(data_path):
+						channels[fcurve.array_index] = fcurve
+						break
+
+		snapshot.lenses = channel_arrays(cam_fcurves["lens"], 1)
+
+		if evaluated:
+			# The final world transform on every frame replaces the location and rotation curves
+			frames, matrices = evaluated
+			snapshot.translations = ChannelArrays(frames, matrices[:, :3, 3])
+			snapshot.quaternions = ChannelArrays(frames, matrices_to_rotations(matrices))
+		else:
+			snapshot.translations = channel_arrays(cam_fcurves["location"], 3)
+			snapshot.quaternions = channel_arrays(cam_fcurves["rotation_quaternion"], 4)
+			snapshot.eulers = channel_arrays(cam_fcurves["rotation_euler"], 3)
+
+		if self.verify_fidelity:
+			frames = np.arange(0, frame_count + 1)
+
+			if evaluated:
+				translations, rotations = snapshot.translations, snapshot.quaternions
 			else:
-				raise ValueError("Unsupported null key type")
+				translations = sample_reference(cam_fcurves["location"], [0, 0, 0], frames)
+				rotations = sample_reference(cam_fcurves["rotation_quaternion"], [1.0, 0.0, 0.0, 0.0], frames)
+				if not len(rotations):
+					rotations = sample_reference(cam_fcurves["rotation_euler"], [0, 0, 0], frames)
 
-			track.keys.append(null_key)
-			track_header.frame_count = len(track.keys)
-			return track, track_header
+			references = {0: translations, 1: rotations, 2: sample_reference(cam_fcurves["lens"], [camera.data.lens], frames)}
+			snapshot.references = {track_index: reference for track_index, reference in references.items() if len(reference)}
 
-		translations = {
-			frame: [
-				cam_fcurves["location"][i].get(frame, None) for i in range(3)
-			] for frame in location_frames
-		}
+		return snapshot
 
-		quaternions = {
-			frame: [
-				cam_fcurves["rotation_quaternion"][i].get(frame, None) for i in range(4)
-			] for frame in quat_frames
-		}
-  
-		eulers = {
-			frame: [
-				cam_fcurves["rotation_euler"][i].get(frame, None) for i in range(3)
-			] for frame in euler_frames
-		}
 
-		fov = {
-			frame: [value] for frame, value in cam_fcurves["lens"].items()
-		}
 
-		entry = AnmEntry()
-		entry.coord = AnmCoord(-1, other_index)
-		entry.entry_format = EntryFormat.Camera
-
-		if len(location_frames) > 1:
-			track, header = create_tracks(translations, "location", NuccAnmKeyFormat.Vector3Linear, 0, "Vec3Linear")
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		if len(quat_frames) > 1:
-			track, header = create_tracks(quaternions, "rotation_quaternion", NuccAnmKeyFormat.QuaternionLinear, 1, "Vec4Linear")
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-   
-		if len(euler_frames) > 1:
-			track, header = create_tracks(eulers, "rotation_euler", NuccAnmKeyFormat.QuaternionLinear, 1, "Vec4Linear")
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		if len(fov_frames) > 1:
-			track, header = create_tracks(fov, "fov", NuccAnmKeyFormat.FloatLinear, 2, "FloatLinear")
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		entries.append(entry)
-		return entries
-
-	
-
-	def make_lightdirc_entries(self, lightdirc: bpy.types.Light, other_index: int) -> List[AnmEntry]:
-		entries: List[AnmEntry] = []
-
-		light_start, light_end = 0, 0
-		rot_start, rot_end = 0, 0
-  
+	def snapshot_lightdirc(self, lightdirc: bpy.types.Object, name: str, chunk_path: str, other_index: int, xfbin_scene) -> LightDircSnapshot:
+		light_default_rot = lightdirc.matrix_world.to_quaternion().inverted()
+
+		snapshot = LightDircSnapshot(name, chunk_path, other_index, tuple(xfbin_scene.lightdir_color), xfbin_scene.lightdir_intensity,
+									 (light_default_rot.x, light_default_rot.y, light_default_rot.z, light_default_rot.w))
+
+		snapshot.default_color = tuple(lightdirc.data.color)
+		snapshot.default_energy = lightdirc.data.energy
+		snapshot.default_euler = tuple(lightdirc.matrix_world.to_euler())
+
+		light_end = rot_end = 0
+
 		combined_fcurves = []
 
-		
+
 		#check if xfbin scene has a lightdirc color animation
 		if bpy.context.scene.get("xfbin_scene"):
-			xfbin_scene = bpy.context.scene.xfbin_scene
-   
-			if bpy.context.scene.animation_data.action:
+			if bpy.context.scene.animation_data and bpy.context.scene.animation_data.action:
 				combined_fcurves += bpy.context.scene.animation_data.action.fcurves
 
-				light_start, light_end = bpy.context.scene.animation_data.action.frame_range
-		
-		if lightdirc.animation_data.action:
+				light_end = bpy.context.scene.animation_data.action.frame_range[1]
+
+		if lightdirc.animation_data and lightdirc.animation_data.action:
 			combined_fcurves += lightdirc.animation_data.action.fcurves
 
 			rotation_action = lightdirc.animation_data.action
-  
-			rot_start, rot_end = rotation_action.frame_range
-   
-		if len(combined_fcurves) < 1:
-			return entries
-  
-		#check which action has more frames
-		frame_end = max(rot_end, light_end)
 
-		context = bpy.context
-		light_fcurves = {
-			"xfbin_scene.lightdir_color": [{}, {}, {}],
-			"xfbin_scene.lightdir_intensity": [{}],
-			"rotation_euler": [{}, {}, {}, {}],
-			"rotation_quaternion": [{}, {}, {}, {}]
-		}
+			rot_end = rotation_action.frame_range[1]
 
-		color_frames: Set[int] = set()
-		energy_frames: Set[int] = set()
-		rotation_euler_frames: Set[int] = set()
-		rotation_quat_frames: Set[int] = set()
+		if len(combined_fcurves) < 1:
+			return snapshot
 
-		fcurve_mapping = {
-			"xfbin_scene.lightdir_color": (light_fcurves["xfbin_scene.lightdir_color"], color_frames),
-			"xfbin_scene.lightdir_intensity": (light_fcurves["xfbin_scene.lightdir_intensity"], energy_frames),
-			"rotation_euler": (light_fcurves["rotation_euler"], rotation_euler_frames),
-			"rotation_quaternion": (light_fcurves["rotation_quaternion"], rotation_quat_frames)
-		}
+		snapshot.animated = True
 
-		for fcurve in combined_fcurves:
-			for path, (target, frame_set) in fcurve_mapping.items():
-				if fcurve.data_path.endswith(path):
-					for i in range(int(frame_end + 1)):
-						light_fcurves[path][fcurve.array_index][i] = fcurve.evaluate(i)
-						frame_set.add(i)
-					break
-		
-		
-
-		def create_light_tracks(frame_values: Dict[int, List[float]], data_path, key_format, track_index):
-			track_header = TrackHeader(track_index=track_index, key_format=key_format)
-			track = Track()
-			last_values = [0] * len(frame_values[next(iter(frame_values))])
-
-			for frame, values in sorted(frame_values.items()):
-				for i, val in enumerate(values):
-					if val is not None:
-						last_values[i] = val
-				converted_value = convert_light_values(data_path, last_values, key_format)
-				track.keys.append(converted_value)
-
-			#dupe last keyframe
-			converted_value = convert_light_values(data_path, last_values, key_format)
-			track.keys.append(converted_value)
-
-			track_header.frame_count = len(track.keys)
-			return track, track_header
-
-		def create_single_frame_track(data_path, key_format, track_index, value):
-			single_track_header = TrackHeader(track_index=track_index, key_format=key_format)
-			single_track = Track()
-			converted_value = convert_light_values(data_path, value, key_format)
-			single_track.keys.append(converted_value)
-			single_track_header.frame_count = 1
-			return single_track, single_track_header
-
-		colors = {frame: [light_fcurves["xfbin_scene.lightdir_color"][i].get(frame, None) for i in range(3)] for frame in color_frames}
-
-		energies = {frame: [light_fcurves["xfbin_scene.lightdir_intensity"][0].get(frame, None)] for frame in energy_frames}
-
-		rotations_euler = {
-			frame: [
-				light_fcurves["rotation_euler"][i].get(frame, None) for i in range(3)
-			] for frame in rotation_euler_frames
-		}
-  
-		rotations_quat = {
-			frame: [
-				light_fcurves["rotation_quaternion"][i].get(frame, None) for i in range(4)
-			] for frame in rotation_quat_frames
-		}
-  
+		#check which action has more frames
+		frame_end = max(rot_end, light_end)
+		snapshot.frame_end = frame_end
 
+		light_fcurves = group_fcurves(combined_fcurves, ("xfbin_scene.lightdir_color", "xfbin_scene.lightdir_intensity", "rotation_euler", "rotation_quaternion"))
 
-		entry = AnmEntry()
-		entry.coord = AnmCoord(-1, other_index)
-		entry.entry_format = EntryFormat.LightDirc
+		# Every animated property is sampled on every frame, straight into one array per property
+		frames = np.arange(0, int(frame_end) + 1)
+		snapshot.colors = sample_channels(light_fcurves["xfbin_scene.lightdir_color"], 3, frames)
+		snapshot.energies = sample_channels(light_fcurves["xfbin_scene.lightdir_intensity"], 1, frames)
+		snapshot.rotations_euler = sample_channels(light_fcurves["rotation_euler"], 3, frames)
+		snapshot.rotations_quat = sample_channels(light_fcurves["rotation_quaternion"], 4, frames)
 
-		if len(color_frames) >= 1:      
-			track, header = create_light_tracks(colors, "xfbin_scene.lightdir_color", NuccAnmKeyFormat.ColorRGBTable, 0)
-   
-			while len(track.keys) % 4 != 0:
-				track.keys.append(track.keys[-1])
+		if self.verify_fidelity:
+			# Already sampled on every frame, the references share the arrays
+			rotations = snapshot.rotations_quat if len(snapshot.rotations_quat) else snapshot.rotations_euler
+			references = {0: snapshot.colors, 1: snapshot.energies, 2: rotations}
+			snapshot.references = {track_index: reference for track_index, reference in references.items() if len(reference)}
 
-			# Update the frame count to reflect the new length	
-			header.frame_count = len(track.keys)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			# create a single keyframe and take the default value
-			track = Track()
-			track_header = TrackHeader()
-			track_header.track_index = 0
-			track_header.key_format = NuccAnmKeyFormat.ColorRGBTable
-			
-			for i in range(int(frame_end)):
-				converted_value = convert_light_values("xfbin_scene.lightdir_color", lightdirc.data.color)
-				track.keys.append(converted_value)
-    
-			while len(track.keys) % 4 != 0:
-				track.keys.append(track.keys[-1])
-   
-			track_header.frame_count = len(track.keys)
-			entry.tracks.append(track)
-			entry.track_headers.append(track_header)
-   
-		if len(energy_frames) >= 1:
-			track, header = create_light_tracks(energies, "xfbin_scene.lightdir_intensity", NuccAnmKeyFormat.FloatTable, 1)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			# create a single keyframe and take the default value
-			track, header = create_single_frame_track("xfbin_scene.lightdir_intensity", NuccAnmKeyFormat.FloatFixed, 1, [lightdirc.data.energy])
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-   
-
-		if len(rotation_quat_frames) >= 1:
-			track, header = create_light_tracks(rotations_quat, "rotation_quaternion", NuccAnmKeyFormat.QuaternionShortTable, 2)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		elif len(rotation_euler_frames) >= 1:
-			track, header = create_light_tracks(rotations_euler, "rotation_euler", NuccAnmKeyFormat.QuaternionShortTable, 2)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			# create a single keyframe and take the default value
-			track = Track()
-			track_header = TrackHeader()
-			track_header.track_index = 2
-			track_header.key_format = NuccAnmKeyFormat.EulerXYZFixed
-			
-			converted_value = NuccAnmKey.Vec3(tuple(math.radians(x) for x in lightdirc.matrix_world.to_euler()))
-			track.keys.append(converted_value)
-   
-			track_header.frame_count = len(track.keys)
-			entry.tracks.append(track)
-			entry.track_headers.append(track_header)
+		return snapshot
 
 
-		entries.append(entry)
-		return entries
+	def snapshot_lightpoint(self, lightpoint: bpy.types.Object, name: str, chunk_path: str, other_index: int, xfbin_scene) -> LightPointSnapshot:
+		location = tuple(lightpoint.matrix_world.to_translation())
 
+		snapshot = LightPointSnapshot(name, chunk_path, other_index, tuple(xfbin_scene.lightpoint_color0), xfbin_scene.lightpoint_intensity0,
+									  location, xfbin_scene.lightpoint_range0, xfbin_scene.lightpoint_attenuation0)
 
-	def make_lightpoint_entries(self, lightpoint: bpy.types.Light, other_index: int) -> List[AnmEntry]:
-		entries: List[AnmEntry] = []
+		snapshot.default_color = tuple(lightpoint.data.color)
+		snapshot.default_energy = lightpoint.data.energy
+		snapshot.default_location = location
+		snapshot.default_range = lightpoint.data.shadow_soft_size
+		snapshot.default_attenuation = lightpoint.data.cutoff_distance if lightpoint.data.use_custom_distance else 0.0
 
-		light_start, light_end = 0, 0
+		light_end = 0
 		combined_fcurves = []
 
 		# Check if xfbin scene has a lightpoint color animation
 		if bpy.context.scene.get("xfbin_scene"):
-			xfbin_scene = bpy.context.scene.xfbin_scene
-
-			if bpy.context.scene.animation_data.action:
+			if bpy.context.scene.animation_data and bpy.context.scene.animation_data.action:
 				combined_fcurves += bpy.context.scene.animation_data.action.fcurves
-				light_start, light_end = bpy.context.scene.animation_data.action.frame_range
+				light_end = bpy.context.scene.animation_data.action.frame_range[1]
 
-		if lightpoint.animation_data.action:
+		if lightpoint.animation_data and lightpoint.animation_data.action:
 			combined_fcurves += lightpoint.animation_data.action.fcurves
-			light_start, light_end = lightpoint.animation_data.action.frame_range
+			light_end = lightpoint.animation_data.action.frame_range[1]
 
 		if len(combined_fcurves) < 1:
-			return entries
+			return snapshot
+
+		snapshot.animated = True
 
 		frame_end = light_end
 
-		light_fcurves = {
-			"xfbin_scene.lightpoint_color0": [{}, {}, {}],
-			"xfbin_scene.lightpoint_intensity0": [{}],
-			"xfbin_scene.lightpoint_range0": [{}],
-			"xfbin_scene.lightpoint_attenuation0": [{}],
-			"location": [{}, {}, {}]
-		}
+		light_fcurves = group_fcurves(combined_fcurves, ("xfbin_scene.lightpoint_color0", "xfbin_scene.lightpoint_intensity0", "xfbin_scene.lightpoint_range0",
+														 "xfbin_scene.lightpoint_attenuation0", "location"))
 
-		color_frames: Set[int] = set()
-		intensity_frames: Set[int] = set()
-		range_frames: Set[int] = set()
-		attenuation_frames: Set[int] = set()
-		location_frames: Set[int] = set()
-
-		fcurve_mapping = {
-			"xfbin_scene.lightpoint_color0": (light_fcurves["xfbin_scene.lightpoint_color0"], color_frames),
-			"xfbin_scene.lightpoint_intensity0": (light_fcurves["xfbin_scene.lightpoint_intensity0"], intensity_frames),
-			"xfbin_scene.lightpoint_range0": (light_fcurves["xfbin_scene.lightpoint_range0"], range_frames),
-			"xfbin_scene.lightpoint_attenuation0": (light_fcurves["xfbin_scene.lightpoint_attenuation0"], attenuation_frames),
-			"location": (light_fcurves["location"], location_frames)
-		}
+		frames = np.arange(0, int(frame_end) + 1)
+		snapshot.colors = sample_channels(light_fcurves["xfbin_scene.lightpoint_color0"], 3, frames)
+		snapshot.intensities = sample_channels(light_fcurves["xfbin_scene.lightpoint_intensity0"], 1, frames)
+		snapshot.ranges = sample_channels(light_fcurves["xfbin_scene.lightpoint_range0"], 1, frames)
+		snapshot.attenuations = sample_channels(light_fcurves["xfbin_scene.lightpoint_attenuation0"], 1, frames)
+		snapshot.locations = sample_channels(light_fcurves["location"], 3, frames)
 
-		for fcurve in combined_fcurves:
-			for path, (target, frame_set) in fcurve_mapping.items():
-				if fcurve.data_path.endswith(path):
-					for i in range(int(frame_end + 1)):
-						light_fcurves[path][fcurve.array_index][i] = fcurve.evaluate(i)
-						frame_set.add(i)
-					break
-
-		def create_light_tracks(frame_values: Dict[int, List[float]], data_path, key_format, track_index):
-			track_header = TrackHeader(track_index=track_index, key_format=key_format)
-			track = Track()
-			last_values = [0] * len(frame_values[next(iter(frame_values))])
-
-			for frame, values in sorted(frame_values.items()):
-				for i, val in enumerate(values):
-					if val is not None:
-						last_values[i] = val
-				converted_value = convert_light_values(data_path, last_values, key_format, frame)
-				track.keys.append(converted_value)
-
-			# Dupe last keyframe
-			converted_value = convert_light_values(data_path, last_values, key_format, frame)
-			track.keys.append(converted_value)
-
-			track_header.frame_count = len(track.keys)
-			return track, track_header
-
-		def create_single_frame_track(data_path, key_format, track_index, value):
-			single_track_header = TrackHeader(track_index=track_index, key_format=key_format)
-			single_track = Track()
-			converted_value = convert_light_values(data_path, value, key_format)
-			single_track.keys.append(converted_value)
-			single_track_header.frame_count = 1
-			return single_track, single_track_header
-
-		colors = {frame: [light_fcurves["xfbin_scene.lightpoint_color0"][i].get(frame, None) for i in range(3)] for frame in color_frames}
-		intensities = {frame: [light_fcurves["xfbin_scene.lightpoint_intensity0"][0].get(frame, None)] for frame in intensity_frames}
-		ranges = {frame: [light_fcurves["xfbin_scene.lightpoint_range0"][0].get(frame, None)] for frame in range_frames}
-		attenuations = {frame: [light_fcurves["xfbin_scene.lightpoint_attenuation0"][0].get(frame, None)] for frame in attenuation_frames}
-		locations = {frame: [light_fcurves["location"][i].get(frame, None) for i in range(3)] for frame in location_frames}
-
-		entry = AnmEntry()
-		entry.coord = AnmCoord(-1, other_index)
-		entry.entry_format = EntryFormat.LightPoint
-
-		if len(color_frames) >= 1:
-			track, header = create_light_tracks(colors, "xfbin_scene.lightpoint_color0", NuccAnmKeyFormat.ColorRGBTable, 0)
-			while len(track.keys) % 4 != 0:
-				track.keys.append(track.keys[-1])
-			header.frame_count = len(track.keys)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			track, header = create_single_frame_track("xfbin_scene.lightpoint_color0", NuccAnmKeyFormat.ColorRGBTable, 0, lightpoint.data.color)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		if len(intensity_frames) >= 1:
-			track, header = create_light_tracks(intensities, "xfbin_scene.lightpoint_intensity0", NuccAnmKeyFormat.FloatTable, 1)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			track, header = create_single_frame_track("xfbin_scene.lightpoint_intensity0", NuccAnmKeyFormat.FloatFixed, 1, [lightpoint.data.energy])
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		if len(location_frames) >= 1:
-			track, header = create_light_tracks(locations, "location", NuccAnmKeyFormat.Vector3Table, 2)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			track, header = create_single_frame_track("location", NuccAnmKeyFormat.Vector3Fixed, 2, lightpoint.matrix_world.to_translation())
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		if len(range_frames) >= 1:
-			track, header = create_light_tracks(ranges, "xfbin_scene.lightpoint_range0", NuccAnmKeyFormat.FloatTable, 4)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			track, header = create_single_frame_track("xfbin_scene.lightpoint_range0", NuccAnmKeyFormat.FloatFixed, 4, [lightpoint.data.shadow_soft_size])
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-
-		if len(attenuation_frames) >= 1:
-			track, header = create_light_tracks(attenuations, "xfbin_scene.lightpoint_attenuation0", NuccAnmKeyFormat.FloatTable, 3)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-		else:
-			track, header = create_single_frame_track("xfbin_scene.lightpoint_attenuation0", NuccAnmKeyFormat.FloatFixed, 3, [lightpoint.data.cutoff_distance if lightpoint.data.use_custom_distance else 0.0])
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
+		if self.verify_fidelity:
+			references = {0: snapshot.colors, 1: snapshot.intensities, 2: snapshot.locations, 3: snapshot.attenuations, 4: snapshot.ranges}
+			snapshot.references = {track_index: reference for track_index, reference in references.items() if len(reference)}
 
-		entries.append(entry)
-		return entries
+		return snapshot
 
-	def make_ambient_entries(self, other_index: int) -> List[AnmEntry]:
-		entries: List[AnmEntry] = []
+	def snapshot_ambient(self, other_index: int, xfbin_scene) -> AmbientSnapshot:
+		snapshot = AmbientSnapshot(other_index, tuple(xfbin_scene.ambient_color))
 
-		light_start, light_end = 0, 0
+		light_end = 0
 		combined_fcurves = []
 
 		# Check if xfbin scene has an ambient color animation
-		xfbin_scene = bpy.context.scene.get("xfbin_scene")
-  
-		if not xfbin_scene:
-			return entries
+		if not bpy.context.scene.get("xfbin_scene"):
+			return snapshot
 
-		if bpy.context.scene.animation_data.action:
+		if bpy.context.scene.animation_data and bpy.context.scene.animation_data.action:
 			combined_fcurves += bpy.context.scene.animation_data.action.fcurves
-			light_start, light_end = bpy.context.scene.animation_data.action.frame_range
-   
+			light_end = bpy.context.scene.animation_data.action.frame_range[1]
+
 		if len(combined_fcurves) < 1:
-			return entries
+			return snapshot
+
+		snapshot.animated = True
 
 		frame_end = light_end
-  
-		ambient_fcurves = {
-			"xfbin_scene.ambient_color": [{}, {}, {}],
-			"xfbin_scene.ambient_intensity": [{}]
-		}
-  
-		color_frames: Set[int] = set()
-		intensity_frames: Set[int] = set()
-  
-		fcurve_mapping = {
-			"xfbin_scene.ambient_color": (ambient_fcurves["xfbin_scene.ambient_color"], color_frames),
-			"xfbin_scene.ambient_intensity": (ambient_fcurves["xfbin_scene.ambient_intensity"], intensity_frames)
+		snapshot.frame_end = frame_end
+
+		color_fcurves = group_fcurves(combined_fcurves, ("xfbin_scene.ambient_color",))["xfbin_scene.ambient_color"]
+		snapshot.colors = sample_channels(color_fcurves, 3, np.arange(0, int(frame_end) + 1))
+
+		if self.verify_fidelity and len(snapshot.colors):
+			snapshot.references[0] = snapshot.colors
+
+		return snapshot
+
+
+	def snapshot_fog(self, xfbin_scene) -> FogSnapshot:
+		"""
+		Sample the fog of the scene on every frame of the scene action, or only its current values if it is not animated.
+		"""
+		defaults = [xfbin_scene.fog_density, *xfbin_scene.fog_color, xfbin_scene.fog_start, xfbin_scene.fog_end]
+
+		# Column of each fog property in the FCV rows
+		fog_columns = {
+			"xfbin_scene.fog_density": 0,
+			"xfbin_scene.fog_color": 1,
+			"xfbin_scene.fog_start": 4,
+			"xfbin_scene.fog_end": 5,
 		}
-  
-		for fcurve in combined_fcurves:
-			for path, (target, frame_set) in fcurve_mapping.items():
-				if fcurve.data_path.endswith(path):
-					for i in range(int(frame_end + 1)):
-						ambient_fcurves[path][fcurve.array_index][i] = fcurve.evaluate(i)
-						frame_set.add(i)
-					break
- 
-		def create_ambient_tracks(frame_values: Dict[int, List[float]], data_path, key_format, track_index):
-			track_header = TrackHeader(track_index=track_index, key_format=key_format)
-			track = Track()
-			last_values = [0] * len(frame_values[next(iter(frame_values))])
-
-			for frame, values in sorted(frame_values.items()):
-				for i, val in enumerate(values):
-					if val is not None:
-						last_values[i] = val
-				converted_value = convert_light_values(data_path, last_values, key_format, frame)
-				track.keys.append(converted_value)
-
-			# Dupe last keyframe
-			converted_value = convert_light_values(data_path, last_values, key_format, frame)
-			track.keys.append(converted_value)
-
-			track_header.frame_count = len(track.keys)
-			return track, track_header
-
-		colors = {frame: [ambient_fcurves["xfbin_scene.ambient_color"][i].get(frame, None) for i in range(3)] for frame in color_frames}
-		intensities = {frame: [ambient_fcurves["xfbin_scene.ambient_intensity"][0].get(frame, None)] for frame in intensity_frames}
-  
-		entry = AnmEntry()
-		entry.coord = AnmCoord(-1, other_index)
-		entry.entry_format = EntryFormat.Ambient
-
-		if len(color_frames) >= 1:
-			track, header = create_ambient_tracks(colors, "xfbin_scene.ambient_color", NuccAnmKeyFormat.ColorRGBTable, 0)
-			while len(track.keys) % 4 != 0:
-				track.keys.append(track.keys[-1])
-			header.frame_count = len(track.keys)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-   
-			frame_values = {f: [1] for f in range(int(frame_end))}
-			track, header = create_ambient_tracks(frame_values, "xfbin_scene.ambient_intensity", NuccAnmKeyFormat.FloatTable, 1)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
 
-		else:
-			# Create a single keyframe and take the default value
-			ambient_color = bpy.context.scene.xfbin_scene.ambient_color
-			frame_values = {f: ambient_color for f in range(int(frame_end))}
-			track, header = create_ambient_tracks(frame_values, "xfbin_scene.ambient_color", NuccAnmKeyFormat.ColorRGBTable, 0)
-   
-			while len(track.keys) % 4 != 0:
-				track.keys.append(track.keys[-1])	
-			header.frame_count = len(track.keys)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-   
-			frame_values = {f: [1] for f in range(int(frame_end))}
-			track, header = create_ambient_tracks(frame_values, "xfbin_scene.ambient_intensity", NuccAnmKeyFormat.FloatTable, 1)
-			entry.tracks.append(track)
-			entry.track_headers.append(header)
-   
-		entries.append(entry)
-		return entries
-
-
-
-		
-def menu_export(self, context):
-	self.layout.operator(ExportAnmXfbin.bl_idname, text='XFBIN Animation Container (.xfbin)') 
\ No newline at end of file
+		fog_fcurves: Dict[int, FCurve] = {}
+
+		action = bpy.context.scene.animation_data.action if bpy.context.scene.animation_data else None
+		if action:
+			for fcurve in action.fcurves:
+				for data_path, column in fog_columns.items():
+					if fcurve.data_path.endswith(data_path):
+						fog_fcurves[column + fcurve.array_index] = fcurve
+						break
+
+		if not fog_fcurves:
+			return FogSnapshot(np.zeros(1, dtype=np.int64), np.array([defaults]))
+
+		frame_start, frame_end = action.frame_range
+		frames = np.arange(0, int(frame_end) + 1)
+
+		rows = np.tile(np.array(defaults, dtype=np.float64), (len(frames), 1))
+		for column, fcurve in fog_fcurves.items():
+			rows[:, column] = sample_fcurve(fcurve, frames)
+
+		return FogSnapshot(frames, rows)
+
+
+def get_chunk_name(anm_chunk: XfbinAnmChunkPropertyGroup) -> str:
+	# Remove the suffix Blender adds to repeated names, if it exists
+	return anm_chunk.name.split(' (')[0] if ' (' in anm_chunk.name else anm_chunk.name
+
+
+def get_source_action(anm_chunk: XfbinAnmChunkPropertyGroup) -> str:
+	"""
+	Return the name of the action a chunk is read from: its 'source_action' custom property, or the chunk name.
+	"""
+	return anm_chunk.get('source_action') or anm_chunk.name
+
+
+def get_chunk_action(anm_chunk: XfbinAnmChunkPropertyGroup) -> Action:
+	"""
+	Return the action a chunk is read from. Raise if it does not exist, for example after it was renamed.
+	"""
+	action_name = get_source_action(anm_chunk)
+	action = bpy.data.actions.get(action_name)
+
+	if not action:
+		raise Exception(f'Animation {get_chunk_name(anm_chunk)}: action {action_name} not found, it was renamed or deleted')
+
+	return action
+
+
+def get_bake_range(anm_armatures: List[AnmArmature]) -> Optional[Tuple[int, int]]:
+	"""
+	Return the frames baked for the armatures of a chunk, from the first start to the last end of their actions,
+	or None if there are no armatures.
+	"""
+	if not anm_armatures:
+		return None
+
+	frame_ranges = [anm_armature.action.frame_range for anm_armature in anm_armatures]
+	return int(min(start for start, _ in frame_ranges)), int(max(end for _, end in frame_ranges))
+
+
+def get_frame_range(anm_chunk: XfbinAnmChunkPropertyGroup) -> Optional[Tuple[int, int]]:
+	"""
+	Return the frames of its action a chunk plays, from its 'frame_start' and 'frame_end' custom properties,
+	or None if it plays the whole action.
+	"""
+	frame_start, frame_end = anm_chunk.get('frame_start'), anm_chunk.get('frame_end')
+	if frame_start is None or frame_end is None:
+		return None
+
+	if frame_end <= frame_start:
+		raise Exception(f'{anm_chunk.name}: frame_end ({frame_end}) must be after frame_start ({frame_start})')
+
+	return int(frame_start), int(frame_end)
+
+
+def get_source_key(anm_chunk: XfbinAnmChunkPropertyGroup) -> tuple:
+	"""
+	Return what a chunk reads from the scene. Chunks with the same key can share one snapshot of their action.
+	"""
+	return (get_source_action(anm_chunk),
+			tuple(clump.name for clump in anm_chunk.anm_clumps),
+			tuple((camera.name, camera.path) for camera in anm_chunk.cameras),
+			tuple((light.name, light.path) for light in anm_chunk.lightdircs),
+			tuple((light.name, light.path) for light in anm_chunk.lightpoints))
+
+
+def finished_message(collection_name: str, written: bool, elapsed: float) -> str:
+	elapsed_s = "{:.2f}s".format(elapsed)
+	if written:
+		return f'Finished exporting {collection_name} in {elapsed_s}'
+	return f'Finished exporting {collection_name} in {elapsed_s}, output unchanged and not written'
+
+
+def show_popup(draw, title: str, icon: str):
+	"""
+	Show a popup menu drawn by draw. Timers run without a window in the context, so the popup is opened
+	in the first window of the window manager. Without any window, as in background mode, nothing is shown.
+	"""
+	window_manager = bpy.context.window_manager
+	window = bpy.context.window or next(iter(window_manager.windows), None)
+	if not window:
+		return
+
+	with bpy.context.temp_override(window=window, screen=window.screen):
+		window_manager.popup_menu(draw, title=title, icon=icon)
+
+
+def show_message(message: str, icon: str = 'INFO'):
+	print(message)
+
+	def draw(menu, context):
+		menu.layout.label(text=message)
+
+	show_popup(draw, 'Export animation XFBIN', icon)
+
+
+def show_lines(title: str, lines: List[str]):
+	def draw(menu, context):
+		for line in lines:
+			menu.layout.label(text=line)
+
+	show_popup(draw, title, 'INFO')
+
+
+def write_export_stats(encoder: AnmXfbinEncoder) -> List[str]:
+	"""
+	Write the statistics of the pages encoded by encoder next to its file, show them in a popup and return their summary.
+	"""
+	stats = ExportStats(encoder.stats)
+	json_path = f'{path.splitext(encoder.filepath)[0]}.stats.json'
+	stats.write_json(json_path)
+
+	lines = stats.summary()
+	show_lines(f'Export statistics, written to {json_path}', lines)
+	return lines
+
+
+def write_fidelity_report(encoder: AnmXfbinEncoder) -> List[str]:
+	"""
+	Write the reconstruction errors measured by encoder next to its file and return their summary.
+	Tracks over their tolerance are added to the encoder warnings.
+	"""
+	json_path = f'{path.splitext(encoder.filepath)[0]}.fidelity.json'
+	encoder.fidelity.write_json(json_path)
+
+	for track in encoder.fidelity.failures():
+		encoder.warnings.append(f'{track.name} {track.data_path}: max error {track.error:.3g} is over the tolerance of {track.tolerance:.3g}')
+
+	return [f'Fidelity report written to {json_path}', *encoder.fidelity.summary()]
+
+
+def poll_background_export(collection_name: str, encoder: AnmXfbinEncoder, thread: Thread, start_time: float, write_stats: bool = False) -> Optional[float]:
+	"""
+	bpy.app.timers callback that reports the result of a background export once its thread is done.
+	"""
+	if thread.is_alive():
+		return BACKGROUND_POLL_INTERVAL
+
+	background_exports.discard(encoder.filepath)
+
+	if encoder.fidelity and not encoder.error:
+		for line in write_fidelity_report(encoder):
+			print(line)
+
+	for warning in encoder.warnings:
+		show_message(warning, 'ERROR')
+
+	if encoder.profiler:
+		for line in AnmXfbinExporter.finish_profiler(encoder.profiler, encoder.filepath):
+			print(line)
+
+	if encoder.error:
+		show_message(f'Failed exporting {collection_name}: {encoder.error}', 'ERROR')
+	else:
+		show_message(finished_message(collection_name, encoder.written, perf_counter() - start_time))
+
+		if write_stats:
+			for line in write_export_stats(encoder):
+				print(line)
+
+	return None
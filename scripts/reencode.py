@@ -0,0 +1,93 @@
+"""
+Encode an XFBIN from a snapshot cache saved by an export with Save Snapshot Cache, without opening the .blend.
+The cache holds everything the exporter read from the scene, so encoding settings can be changed here
+and several caches can be encoded in parallel by running one process per cache.
+
+Usage:
+	python scripts/reencode.py SNAPSHOT OUTPUT [--chunks NAME ...] [--inject] [--merge-tracks] [--target-fps FPS]
+		[--collapse TOLERANCE] [--stats] [--fidelity]
+	blender --background --factory-startup --python scripts/reencode.py -- SNAPSHOT OUTPUT [...]
+
+bpy is not used, but xfbin_lib and mathutils (pip install mathutils) have to be importable by the Python running the script,
+which is always the case for Blender's.
+"""
+import argparse
+import importlib
+import sys
+
+from os import path
+from time import perf_counter
+
+
+def main():
+	# Blender passes the script arguments after --
+	argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+
+	parser = argparse.ArgumentParser(description='Encode an XFBIN from a snapshot cache')
+	parser.add_argument('snapshot', help='.snapshot.npz written by the exporter')
+	parser.add_argument('output', help='XFBIN to write, or to inject into with --inject')
+	parser.add_argument('--chunks', nargs='+', help='Only encode these animations')
+	parser.add_argument('--inject', action='store_true', help='Replace the pages of the animations in an existing XFBIN')
+	parser.add_argument('--merge-tracks', action='store_true', help='Keep the entries and tracks of the replaced pages that are not exported, needs --inject')
+	parser.add_argument('--target-fps', type=float, help='Resample the keys to this frame rate')
+	parser.add_argument('--collapse', type=float, metavar='TOLERANCE', help='Reduce tracks whose keys stay within TOLERANCE of their first key')
+	parser.add_argument('--stats', action='store_true', help='Write the export statistics next to the output as .stats.json')
+	parser.add_argument('--fidelity', action='store_true', help='Write the reconstruction errors next to the output as .fidelity.json, '
+						'needs a cache saved with Verify Fidelity')
+	args = parser.parse_args(argv)
+
+	if args.merge_tracks and not args.inject:
+		parser.error('--merge-tracks needs --inject')
+
+	if args.inject and not path.isfile(args.output):
+		parser.error(f'Cannot inject XFBIN - File does not exist: {args.output}')
+
+	# Import the addon package from the folder that contains this repository
+	repository = path.dirname(path.dirname(path.abspath(__file__)))
+	sys.path.insert(0, path.dirname(repository))
+	package = path.basename(repository)
+	encoder_module = importlib.import_module(f'{package}.blender.encoder')
+	export_stats = importlib.import_module(f'{package}.blender.common.export_stats')
+	fidelity = importlib.import_module(f'{package}.blender.common.fidelity')
+	snapshot_cache = importlib.import_module(f'{package}.blender.common.snapshot_cache')
+
+	start_time = perf_counter()
+
+	cache = snapshot_cache.SnapshotCache.load(args.snapshot)
+	chunks = cache.select(args.chunks) if args.chunks else cache.chunks
+
+	encoder = encoder_module.AnmXfbinEncoder(args.output, args.inject, args.merge_tracks)
+	if args.target_fps:
+		encoder.frame_scale = args.target_fps / cache.fps
+	if args.collapse is not None:
+		encoder.collapse_tolerance = args.collapse
+	if args.fidelity:
+		encoder.fidelity = fidelity.FidelityReport()
+
+	for step in encoder.iter_encode(chunks):
+		print(step)
+
+	output = path.splitext(args.output)[0]
+
+	if args.stats:
+		stats = export_stats.ExportStats(encoder.stats)
+		stats.write_json(f'{output}.stats.json')
+		for line in stats.summary():
+			print(line)
+
+	if encoder.fidelity:
+		encoder.fidelity.write_json(f'{output}.fidelity.json')
+		for line in encoder.fidelity.summary():
+			print(line)
+
+	for warning in encoder.warnings:
+		print(f'WARNING: {warning}')
+
+	message = f'Finished exporting {len(chunks)} animations to {args.output} in {perf_counter() - start_time:.2f}s'
+	print(message if encoder.written else f'{message}, output unchanged and not written')
+
+	return 0 if not encoder.fidelity or encoder.fidelity.passed else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
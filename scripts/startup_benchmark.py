@@ -0,0 +1,72 @@
+"""
+Measure how long enabling the addon takes in a background Blender, with the exporter
+loaded lazily (the default) and eagerly (the exporter imported at registration, as before).
+
+Usage:
+	python scripts/startup_benchmark.py [--blender PATH] [--runs N]
+
+The addon folder has to be installed under the name given by --module (default: the folder name of this repository).
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from os import path
+
+
+PROBE = '''
+import addon_utils, importlib, json, sys
+from time import perf_counter
+
+module = {module!r}
+start = perf_counter()
+addon_utils.enable(module, default_set=False)
+if {eager!r}:
+	importlib.import_module(module + '.blender.exporter')
+elapsed = perf_counter() - start
+
+loaded = [name for name in (module + '.blender.exporter', module + '.blender.encoder') if name in sys.modules]
+loaded += [name for name in sys.modules if name.endswith('xfbin_lib')]
+print('STARTUP_BENCHMARK ' + json.dumps({{'elapsed': elapsed, 'loaded': loaded}}))
+addon_utils.disable(module)
+'''
+
+
+def run_probe(blender: str, module: str, eager: bool) -> dict:
+	args = [blender, '--background', '--factory-startup', '--python-exit-code', '1',
+			'--python-expr', PROBE.format(module=module, eager=eager)]
+	output = subprocess.run(args, capture_output=True, text=True, check=True).stdout
+
+	for line in output.splitlines():
+		if line.startswith('STARTUP_BENCHMARK '):
+			return json.loads(line[len('STARTUP_BENCHMARK '):])
+
+	raise Exception(f'Blender did not report a result:\n{output}')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Compare addon registration time with lazy and eager exporter imports')
+	parser.add_argument('--blender', default='blender', help='Path to the Blender executable')
+	parser.add_argument('--module', default=path.basename(path.dirname(path.dirname(path.abspath(__file__)))),
+						help='Module name the addon is installed as')
+	parser.add_argument('--runs', type=int, default=5, help='Blender launches per mode, each one is a cold import')
+	args = parser.parse_args()
+
+	results = {}
+	for mode, eager in (('lazy', False), ('eager', True)):
+		probes = [run_probe(args.blender, args.module, eager) for _ in range(args.runs)]
+		results[mode] = probes
+
+		times = [probe['elapsed'] * 1000 for probe in probes]
+		print(f'{mode:>5}: median {statistics.median(times):.1f} ms, min {min(times):.1f} ms over {args.runs} runs, '
+			  f'loaded: {", ".join(probes[-1]["loaded"]) or "nothing"}')
+
+	lazy = statistics.median(probe['elapsed'] for probe in results['lazy'])
+	eager = statistics.median(probe['elapsed'] for probe in results['eager'])
+	print(f'Lazy registration saves {(eager - lazy) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Compare two exported XFBIN files and summarize what changed, page by page and entry by entry.
+Pages with identical bytes are only hashed, the others are decoded and their tracks compared key by key.
+Exits with 1 if the files differ beyond the tolerance, so it can gate regression tests.
+
+Usage:
+	python scripts/xfbin_diff.py OLD NEW [--tolerance T] [--json PATH]
+	blender --background --factory-startup --python scripts/xfbin_diff.py -- OLD NEW [--tolerance T] [--json PATH]
+
+xfbin_lib has to be importable by the Python running the script, which is always the case for Blender's.
+"""
+import argparse
+import importlib
+import sys
+
+from os import path
+
+
+def main():
+	# Blender passes the script arguments after --
+	argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+
+	parser = argparse.ArgumentParser(description='Compare two XFBIN files with numeric tolerances')
+	parser.add_argument('old', help='Reference XFBIN')
+	parser.add_argument('new', help='XFBIN to compare to the reference')
+	parser.add_argument('--tolerance', type=float, default=None, help='Largest difference between two key values that counts as equal')
+	parser.add_argument('--top', type=int, default=5, help='Changed entries listed per page')
+	parser.add_argument('--json', help='Also write the full report to this path')
+	args = parser.parse_args(argv)
+
+	# Import the addon package from the folder that contains this repository
+	repository = path.dirname(path.dirname(path.abspath(__file__)))
+	sys.path.insert(0, path.dirname(repository))
+	xfbin_diff = importlib.import_module(f'{path.basename(repository)}.blender.common.xfbin_diff')
+
+	tolerance = xfbin_diff.DEFAULT_TOLERANCE if args.tolerance is None else args.tolerance
+	diff = xfbin_diff.diff_xfbins(args.old, args.new, tolerance)
+
+	for line in diff.summary(args.top):
+		print(line)
+
+	if args.json:
+		diff.write_json(args.json)
+
+	return 0 if diff.identical else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,93 @@
+import pytest
+
+PACKAGE = __package__.rpartition('.')[0]
+
+# The encoder needs xfbin_lib and mathutils, which are importable from Blender's Python
+xfbin_lib = pytest.importorskip(f'{PACKAGE}.xfbin.xfbin_lib')
+encoder = pytest.importorskip(f'{PACKAGE}.blender.encoder')
+anm_snapshot = pytest.importorskip(f'{PACKAGE}.blender.common.anm_snapshot')
+xfbin_pages = pytest.importorskip(f'{PACKAGE}.blender.common.xfbin_pages')
+
+
+def make_armature(coord):
+	armature = anm_snapshot.ArmatureSnapshot('armature', 'c/test/armature.max', [coord.bone_name], [-1], ['model'], [])
+	armature.coords.append(coord)
+	return armature
+
+
+def make_rotation_only_coord(angle: float = 1.0):
+	coord = anm_snapshot.CoordSnapshot('bone', (0, 0, 0), (1, 0, 0, 0), (1, 1, 1))
+	coord.rotation_mode = 'rotation_quaternion'
+	coord.rotation = {0: [1.0, 0.0, 0.0, 0.0], 10: [0.0, angle, 0.0, 0.0]}
+	return coord
+
+
+def make_chunk(name: str, angle: float = 1.0):
+	chunk = anm_snapshot.ChunkSnapshot(name, f'c/test/{name}.max', False, 10)
+	chunk.armatures.append(make_armature(make_rotation_only_coord(angle)))
+	return chunk
+
+
+def export(filepath: str, chunks, inject: bool = False):
+	anm_encoder = encoder.AnmXfbinEncoder(filepath, inject, False)
+	for _ in anm_encoder.iter_encode(chunks):
+		pass
+	return anm_encoder
+
+
+def read_bytes(filepath: str) -> bytes:
+	with open(filepath, 'rb') as f:
+		return f.read()
+
+
+def test_rotation_only_bone_gets_empty_location_track():
+	armature = make_armature(make_rotation_only_coord())
+	table = encoder.PageStructTable()
+	references = encoder.ArmatureReferences(table, armature)
+
+	anm_encoder = encoder.AnmXfbinEncoder('anm.xfbin', False, False)
+	entries = anm_encoder.make_coord_entries(armature, references, 0, references.positions)
+
+	location, rotation, opacity = entries[0].tracks
+	assert (location.track_index, location.key_format, len(location)) == (0, xfbin_lib.NuccAnmKeyFormat.Vector3Fixed, 0)
+	assert (rotation.track_index, len(rotation)) == (1, 3)
+	assert opacity.track_index == 3
+
+	entry = entries[0].make_entry()
+	assert [header.frame_count for header in entry.track_headers] == [0, 3, 1]
+
+
+def test_export_rotation_only_bone(tmp_path):
+	filepath = str(tmp_path / 'anm.xfbin')
+	export(filepath, [make_chunk('idle')])
+
+	anm = next(struct for struct in xfbin_lib.read_xfbin(filepath).pages[0].structs if isinstance(struct, xfbin_lib.NuccAnm))
+	assert [header.frame_count for header in anm.entries[0].track_headers] == [0, 3, 1]
+
+
+def test_inject_into_exported_file(tmp_path):
+	# The target is written by the exporter itself, so it has whatever chunk table layout xfbin_lib writes
+	filepath = str(tmp_path / 'anm.xfbin')
+	export(filepath, [make_chunk('idle'), make_chunk('run')])
+	data = read_bytes(filepath)
+
+	if b'nuccChunkIndex' in data:
+		# Files with an index chunk are decoded and written in full instead of spliced
+		with pytest.raises(xfbin_pages.XfbinLayoutError):
+			xfbin_pages.RawXfbin.read(filepath)
+	else:
+		raw = xfbin_pages.RawXfbin.read(filepath)
+		raw.check_table()
+		assert [page.has_chunk(name) for page, name in zip(raw.pages, ['idle', 'run'])] == [True, True]
+
+	anm_encoder = export(filepath, [make_chunk('run', 0.5), make_chunk('walk')], inject=True)
+	assert anm_encoder.written
+
+	expected_path = str(tmp_path / 'expected.xfbin')
+	export(expected_path, [make_chunk('idle'), make_chunk('run', 0.5), make_chunk('walk')])
+
+	def anm_keys(path):
+		return [(anm.struct_info.chunk_name, [[key.values for key in track.keys] for entry in anm.entries for track in entry.tracks])
+				for page in xfbin_lib.read_xfbin(path).pages for anm in page.structs if isinstance(anm, xfbin_lib.NuccAnm)]
+
+	assert anm_keys(filepath) == anm_keys(expected_path)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+PACKAGE = __package__.rpartition('.')[0]
+
+# The key converters need xfbin_lib and mathutils, which are importable from Blender's Python
+xfbin_lib = pytest.importorskip(f'{PACKAGE}.xfbin.xfbin_lib')
+fidelity = pytest.importorskip(f'{PACKAGE}.blender.common.fidelity')
+track_buffer = pytest.importorskip(f'{PACKAGE}.blender.common.track_buffer')
+
+
+def measure(data_path, key_format, key_frames, key_values, reference_frames, reference_values):
+	track = track_buffer.TrackBuffer.convert(0, data_path, key_format, key_frames, key_values)
+	source = fidelity.TrackSource(data_path, np.asarray(reference_frames, dtype=np.float64), np.asarray(reference_values, dtype=np.float64), {})
+	return fidelity.measure_track('bone', 'armature', 0, key_format, track.frames, track.values, source)
+
+
+def test_measure_track_between_keys():
+	frames = np.arange(11)
+
+	measured = measure('opacity', xfbin_lib.NuccAnmKeyFormat.FloatLinear, [0, 10], [[0.0], [1.0]], frames, frames[:, None] / 10)
+
+	assert measured.error < 1e-6
+	assert measured.error <= measured.tolerance
+
+
+def test_measure_track_finds_dropped_peak():
+	reference = np.zeros((11, 1))
+	reference[5] = 1.0
+
+	measured = measure('opacity', xfbin_lib.NuccAnmKeyFormat.FloatLinear, [0, 10], [[0.0], [0.0]], np.arange(11), reference)
+
+	assert measured.error == pytest.approx(1)
+	assert measured.worst_frames[0] == (5.0, pytest.approx(1))
+	assert measured.error > measured.tolerance
+
+
+def test_measure_track_on_resampled_frames():
+	# Keys at twice the frame rate of the reference, compared at the reference times scaled to the keys' frames
+	frames = np.arange(11)
+	values = np.sin(frames / 10)[:, None]
+	key_frames = np.arange(21)
+
+	measured = measure('opacity', xfbin_lib.NuccAnmKeyFormat.FloatLinear, key_frames, np.sin(key_frames / 20)[:, None], frames * 2, values)
+
+	assert measured.error < 1e-6
+
+
+def test_measure_track_quantized_color_table():
+	colors = np.random.default_rng(0).random((12, 3))
+
+	measured = measure('xfbin_scene.lightdir_color', xfbin_lib.NuccAnmKeyFormat.ColorRGBTable, np.arange(12), colors, np.arange(12), colors)
+
+	assert 0 < measured.error <= measured.tolerance
+
+
+def test_report_failures():
+	reference = np.zeros((11, 1))
+	reference[5] = 1.0
+
+	report = fidelity.FidelityReport()
+	report.pages['anm'] = [measure('opacity', xfbin_lib.NuccAnmKeyFormat.FloatLinear, [0, 10], [[0.0], [0.0]], np.arange(11), reference)]
+
+	assert not report.passed
+	assert report.to_dict()['failures'] == 1
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from ..blender.common.anm_snapshot import ChannelArrays
+from ..blender.common.resampler import (forward_fill, frame_value_array, interpolate_linear, resample_channels, resample_keys, resample_table,
+										simplify_rows, slice_keys, slice_references, slice_table)
+
+
+@pytest.mark.parametrize('scale, count', [(30 / 24, 31), (2, 49), (0.5, 13)])
+def test_resample_table_covers_every_target_frame(scale, count):
+	values = np.linspace(0, 24, 25)
+
+	resampled = resample_table(values, scale)
+
+	assert len(resampled) == round((len(values) - 1) * scale) + 1 == count
+	np.testing.assert_allclose(resampled, np.arange(count) / scale)
+
+
+def test_resample_per_frame_channels_fills_gaps():
+	channels = ChannelArrays(np.arange(10, 35), np.linspace(0, 1, 25)[:, None])
+
+	resampled = resample_channels(channels, 2)
+
+	np.testing.assert_array_equal(resampled.frames, np.arange(20, 69))
+
+
+def test_resample_sparse_keys_keeps_key_count():
+	frames, values = resample_keys([0, 10, 24], np.array([[0.0], [1.0], [0.0]]), 30 / 24)
+
+	np.testing.assert_array_equal(frames, [0, 12, 30])
+	np.testing.assert_allclose(values[:, 0], [0, 12 / 12.5, 0])
+
+
+def test_resample_quaternions_stay_normalized():
+	quaternions = np.array([[1.0, 0.0, 0.0, 0.0], [np.sqrt(0.5), 0.0, 0.0, np.sqrt(0.5)]])
+
+	frames, values = resample_keys([0, 1], quaternions, 4, spherical=True)
+
+	assert len(frames) == 5
+	np.testing.assert_allclose(np.linalg.norm(values, axis=1), 1)
+	np.testing.assert_allclose(values[2], [np.cos(np.pi / 8), 0, 0, np.sin(np.pi / 8)])
+
+
+def test_forward_fill_holds_last_value_per_column():
+	values = np.array([[np.nan, 1.0], [2.0, np.nan], [np.nan, np.nan], [3.0, 4.0]])
+
+	np.testing.assert_array_equal(forward_fill(values), [[0, 1], [2, 1], [2, 1], [3, 4]])
+
+
+def test_frame_value_array_without_keys():
+	# The location of a bone that only has rotation curves
+	frames, values = frame_value_array({})
+
+	assert frames == []
+	assert values.shape == (0, 0)
+
+
+def test_interpolate_linear_holds_ends():
+	times = np.array([0.0, 10.0])
+	values = np.array([[0.0, 10.0], [10.0, 0.0]])
+
+	result = interpolate_linear(times, values, np.array([-5.0, 0.0, 2.5, 10.0, 15.0]), spherical=False)
+
+	np.testing.assert_allclose(result, [[0, 10], [0, 10], [2.5, 7.5], [10, 0], [10, 0]])
+
+
+def test_interpolate_linear_takes_shortest_arc():
+	# -q is the same rotation as q, so the path from the identity to it must not pass through a half turn
+	quaternion = np.array([np.sqrt(0.5), 0.0, 0.0, np.sqrt(0.5)])
+	values = np.array([[1.0, 0.0, 0.0, 0.0], -quaternion])
+
+	result = interpolate_linear(np.array([0.0, 1.0]), values, np.array([0.5]), spherical=True)
+
+	np.testing.assert_allclose(np.abs(result[0]), [np.cos(np.pi / 8), 0, 0, np.sin(np.pi / 8)])
+
+
+def test_simplify_rows_drops_rows_on_a_line():
+	values = np.stack([np.arange(10.0), np.zeros(10)], axis=1)
+
+	np.testing.assert_array_equal(np.flatnonzero(simplify_rows(values, 1e-6)), [0, 9])
+
+
+def test_simplify_rows_keeps_peaks_and_forced_rows():
+	values = np.zeros((11, 1))
+	values[5] = 1.0
+	keep = np.zeros(11, dtype=bool)
+	keep[2] = True
+
+	kept = np.flatnonzero(simplify_rows(values, 0.1, keep))
+
+	assert set(kept) >= {0, 2, 5, 10}
+	np.testing.assert_allclose(interpolate_linear(kept.astype(np.float64), values[kept], np.arange(11.0), False), values)
+
+
+def test_slice_keys_adds_boundary_keys():
+	frames, values = slice_keys([0, 10, 20], np.array([[0.0], [10.0], [0.0]]), 5, 15)
+
+	np.testing.assert_array_equal(frames, [0, 5, 10])
+	np.testing.assert_allclose(values[:, 0], [5, 10, 5])
+
+
+def test_slice_keys_moves_single_key_to_frame_zero():
+	frames, values = slice_keys([7], np.array([[1.0, 2.0, 3.0]]), 5, 15)
+
+	np.testing.assert_array_equal(frames, [0])
+	np.testing.assert_array_equal(values, [[1, 2, 3]])
+
+
+def test_slice_table_holds_last_value():
+	np.testing.assert_array_equal(slice_table(np.arange(5.0), 3, 6), [3, 4, 4, 4])
+
+
+def test_slice_references_rebases_frames():
+	references = {0: ChannelArrays(np.arange(0, 11), np.arange(11.0)[:, None])}
+
+	sliced = slice_references(references, 4, 6)
+
+	np.testing.assert_array_equal(sliced[0].frames, [0, 1, 2])
+	np.testing.assert_array_equal(sliced[0].values[:, 0], [4, 5, 6])
@@ -0,0 +1,44 @@
+import pytest
+
+from .xfbin_fixtures import write_xfbin
+
+PACKAGE = __package__.rpartition('.')[0]
+
+# Changed pages are decoded with xfbin_lib, which is importable from Blender's Python
+xfbin_diff = pytest.importorskip(f'{PACKAGE}.blender.common.xfbin_diff')
+
+
+@pytest.fixture
+def old_path(tmp_path):
+	filepath = str(tmp_path / 'old.xfbin')
+	write_xfbin(filepath, {'idle': b'idle data', 'run': b'run data'})
+	return filepath
+
+
+def test_same_file_is_identical(old_path):
+	diff = xfbin_diff.diff_xfbins(old_path, old_path)
+
+	assert diff.identical
+	assert diff.pages_identical == ['idle', 'run']
+	assert diff.summary()[0].startswith('2 pages identical')
+
+
+def test_added_and_removed_pages(old_path, tmp_path):
+	new_path = str(tmp_path / 'new.xfbin')
+	write_xfbin(new_path, {'idle': b'idle data', 'walk': b'walk data'})
+
+	diff = xfbin_diff.diff_xfbins(old_path, new_path)
+
+	assert not diff.identical
+	assert diff.pages_identical == ['idle']
+	assert diff.pages_removed == ['run']
+	assert diff.pages_added == ['walk']
+	assert diff.pages_compared == []
+	assert diff.to_dict()['pages_added'] == ['walk']
+
+
+def test_pages_are_matched_by_name_not_position(old_path, tmp_path):
+	new_path = str(tmp_path / 'new.xfbin')
+	write_xfbin(new_path, {'run': b'run data', 'idle': b'idle data'})
+
+	assert xfbin_diff.diff_xfbins(old_path, new_path).identical
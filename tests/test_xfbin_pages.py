@@ -0,0 +1,150 @@
+import pytest
+
+from ..blender.common.xfbin_pages import RawXfbin, XfbinLayoutError, build_chunk_table, splice_pages, write_if_changed, write_pages
+from .xfbin_fixtures import HEADER, write_xfbin
+
+
+@pytest.fixture
+def xfbin_path(tmp_path):
+	filepath = str(tmp_path / 'anm.xfbin')
+	write_xfbin(filepath, {'idle': b'idle data', 'run': b'run data, longer'})
+	return filepath
+
+
+def read_bytes(filepath: str) -> bytes:
+	with open(filepath, 'rb') as f:
+		return f.read()
+
+
+def test_read_pages(xfbin_path):
+	raw = RawXfbin.read(xfbin_path)
+
+	assert [page.chunk_names for page in raw.pages] == [['', 'idle', 'Page0'], ['', 'run', 'Page0']]
+	assert raw.find_page('run') == 1
+	assert raw.find_page('walk') is None
+	assert [name for page in raw.pages for name, _ in page.references] == [b'idle_ref', b'run_ref']
+
+
+def test_round_trip_is_byte_identical(xfbin_path, tmp_path):
+	raw = RawXfbin.read(xfbin_path)
+	data = read_bytes(xfbin_path)
+
+	table = build_chunk_table(raw.pages)
+	assert table == data[HEADER.size: HEADER.size + len(table)]
+
+	copy_path = str(tmp_path / 'copy.xfbin')
+	write_pages(raw.header, raw.table_size_delta, raw.pages, copy_path)
+	assert read_bytes(copy_path) == data
+
+
+def test_splice_pages_replaces_and_appends(xfbin_path, tmp_path):
+	pages_path = str(tmp_path / 'pages.xfbin')
+	write_xfbin(pages_path, {'run': b'new run', 'walk': b'walk data'})
+
+	assert splice_pages(xfbin_path, RawXfbin.read(pages_path).pages, ['run', 'walk'])
+
+	expected_path = str(tmp_path / 'expected.xfbin')
+	write_xfbin(expected_path, {'idle': b'idle data', 'run': b'new run', 'walk': b'walk data'})
+	assert read_bytes(xfbin_path) == read_bytes(expected_path)
+
+	# Splicing the same pages again leaves the file untouched
+	assert not splice_pages(xfbin_path, RawXfbin.read(pages_path).pages, ['run', 'walk'])
+
+
+def test_write_if_changed_skips_identical_content(xfbin_path):
+	data = read_bytes(xfbin_path)
+
+	def write(temp_path):
+		with open(temp_path, 'wb') as f:
+			f.write(data)
+
+	assert not write_if_changed(xfbin_path, write)
+	assert read_bytes(xfbin_path) == data
+
+
+@pytest.mark.parametrize('layout, message', [
+	(dict(index_chunk=True), 'nuccChunkIndex'),
+	(dict(trailing=bytes(8)), 'after its last page'),
+])
+def test_read_rejects_chunks_outside_pages(tmp_path, layout, message):
+	filepath = str(tmp_path / 'anm.xfbin')
+	write_xfbin(filepath, {'idle': b'idle data'}, **layout)
+
+	with pytest.raises(XfbinLayoutError, match=message):
+		RawXfbin.read(filepath)
+
+
+def test_splice_rejects_tables_it_cannot_rebuild(tmp_path):
+	filepath = str(tmp_path / 'anm.xfbin')
+	write_xfbin(filepath, {'idle': b'idle data'}, unused_map=True)
+	data = read_bytes(filepath)
+
+	pages_path = str(tmp_path / 'pages.xfbin')
+	write_xfbin(pages_path, {'walk': b'walk data'})
+
+	with pytest.raises(XfbinLayoutError, match='laid out differently'):
+		splice_pages(filepath, RawXfbin.read(pages_path).pages, ['walk'])
+	assert read_bytes(filepath) == data
+
+
+def test_read_rejects_other_files(tmp_path):
+	filepath = tmp_path / 'not.xfbin'
+	filepath.write_bytes(b'not an xfbin file at all')
+
+	with pytest.raises(Exception, match='Not a valid XFBIN'):
+		RawXfbin.read(str(filepath))
+
+
+def write_binary_pages(xfbin_lib, filepath: str, pages):
+	"""Write an XFBIN with xfbin_lib, holding one binary chunk per page like xfbin_fixtures.write_xfbin."""
+	xfbin = xfbin_lib.Xfbin()
+	xfbin.version = 121
+
+	for name, data in pages.items():
+		page = xfbin_lib.XfbinPage()
+		page.struct_infos.append(xfbin_lib.NuccStructInfo("", "nuccChunkNull", ""))
+
+		binary = xfbin_lib.NuccBinary()
+		binary.struct_info = xfbin_lib.NuccStructInfo(name, "nuccChunkBinary", f'test/{name}.bin')
+		binary.data = data
+		page.structs.append(binary)
+
+		xfbin.pages.append(page)
+
+	xfbin_lib.write_xfbin(xfbin, filepath)
+
+
+def binary_chunks(xfbin_lib, filepath: str):
+	return [[(struct.struct_info.chunk_name, bytes(struct.data)) for struct in page.structs if isinstance(struct, xfbin_lib.NuccBinary)]
+			for page in xfbin_lib.read_xfbin(filepath).pages]
+
+
+def test_round_trip_of_xfbin_lib_output(tmp_path):
+	# Splicing relies on the chunk table layout xfbin_lib writes, which is only importable from Blender's Python
+	xfbin_lib = pytest.importorskip(f'{__package__.rpartition(".")[0]}.xfbin.xfbin_lib')
+
+	filepath = str(tmp_path / 'anm.xfbin')
+	write_binary_pages(xfbin_lib, filepath, {'idle': b'idle data', 'run': b'run data, longer'})
+
+	raw = RawXfbin.read(filepath)
+	assert raw.find_page('run') == 1
+
+	copy_path = str(tmp_path / 'copy.xfbin')
+	write_pages(raw.header, raw.table_size_delta, raw.pages, copy_path)
+	assert read_bytes(copy_path) == read_bytes(filepath)
+
+
+def test_splice_matches_full_rewrite_of_xfbin_lib_output(tmp_path):
+	xfbin_lib = pytest.importorskip(f'{__package__.rpartition(".")[0]}.xfbin.xfbin_lib')
+
+	filepath = str(tmp_path / 'anm.xfbin')
+	write_binary_pages(xfbin_lib, filepath, {'idle': b'idle data', 'run': b'run data'})
+
+	pages_path = str(tmp_path / 'pages.xfbin')
+	write_binary_pages(xfbin_lib, pages_path, {'run': b'new run', 'walk': b'walk data'})
+
+	assert splice_pages(filepath, RawXfbin.read(pages_path).pages, ['run', 'walk'])
+
+	expected_path = str(tmp_path / 'expected.xfbin')
+	write_binary_pages(xfbin_lib, expected_path, {'idle': b'idle data', 'run': b'new run', 'walk': b'walk data'})
+	assert binary_chunks(xfbin_lib, filepath) == binary_chunks(xfbin_lib, expected_path)
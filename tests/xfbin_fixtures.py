@@ -0,0 +1,62 @@
+import struct
+
+from typing import Dict, List, Tuple
+
+# Written without xfbin_pages, so the tests do not check its output against itself. It lays out pages the way
+# RawXfbin expects though, files written by xfbin_lib are checked in test_encoder and test_xfbin_pages
+
+HEADER = struct.Struct('>4sI8xI8x')
+VERSION = 121
+
+
+def page_maps(name: str) -> List[Tuple[bytes, bytes, bytes]]:
+	"""Chunk maps of a fixture page: a null chunk, a binary chunk called name and the page chunk."""
+	return [(b'nuccChunkNull', b'', b''), (b'nuccChunkBinary', f'test/{name}.bin'.encode(), name.encode()), (b'nuccChunkPage', b'', b'Page0')]
+
+
+def chunk(map_index: int, data: bytes) -> bytes:
+	return struct.pack('>IIHH', len(data), map_index, VERSION, 0) + data
+
+
+def write_xfbin(filepath: str, pages: Dict[str, bytes], index_chunk: bool = False, trailing: bytes = b'', unused_map: bool = False):
+	"""
+	Write an XFBIN with one page per item of pages, holding a binary chunk with that name and data.
+	Each page also refers to its binary chunk under the name '<name>_ref'.
+	index_chunk adds a nuccChunkIndex chunk before the first page that no page counts, trailing is written after the last page
+	and unused_map adds a chunk map that no chunk or reference uses.
+	"""
+	strings: Tuple[Dict[bytes, int], Dict[bytes, int], Dict[bytes, int]] = ({}, {}, {})
+	maps: Dict[Tuple[bytes, bytes, bytes], int] = {}
+
+	def add_map(chunk_map) -> int:
+		if chunk_map not in maps:
+			for table, value in zip(strings, chunk_map):
+				table.setdefault(value, len(table))
+			maps[chunk_map] = len(maps)
+		return maps[chunk_map]
+
+	map_indices = [add_map((b'nuccChunkIndex', b'', b''))] if index_chunk else []
+	map_indices += [add_map(chunk_map) for name in pages for chunk_map in page_maps(name)]
+	references = [(strings[2].setdefault(f'{name}_ref'.encode(), len(strings[2])), add_map(page_maps(name)[1])) for name in pages]
+	if unused_map:
+		add_map((b'nuccChunkBinary', b'test/unused.bin', b'unused'))
+
+	string_blocks = [b''.join(value + b'\0' for value in table) for table in strings]
+	table = struct.pack('>10I', len(strings[0]), len(string_blocks[0]), len(strings[1]), len(string_blocks[1]),
+						len(strings[2]), len(string_blocks[2]), len(maps), len(maps) * 12, len(map_indices), len(references))
+	table += b''.join(string_blocks)
+	table += bytes(-(HEADER.size + len(table)) % 4)
+	table += b''.join(struct.pack('>3I', *(strings[i][value] for i, value in enumerate(chunk_map))) for chunk_map in maps)
+	table += b''.join(struct.pack('>2I', *reference) for reference in references)
+	table += struct.pack(f'>{len(map_indices)}I', *map_indices)
+
+	with open(filepath, 'wb') as f:
+		f.write(HEADER.pack(b'NUCC', VERSION, len(table)))
+		f.write(table)
+		if index_chunk:
+			f.write(chunk(0, b''))
+		for data in pages.values():
+			f.write(chunk(0, b''))
+			f.write(chunk(1, data))
+			f.write(chunk(2, struct.pack('>II', 3, 1)))
+		f.write(trailing)